@@ -2,105 +2,709 @@ import streamlit as st
 import pandas as pd
 import sqlite3
 import os
-import gdown
 import plotly.express as px
+import glob
+import json
+import re
+import time
+import math
+import queue
+import threading
+import logging
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import aquisicao
+import colunar
+import dados
+import relatorios
+
+# Eleições exibidas no painel e a origem dos dados de cada uma (caminho local ou URL file://,
+# http(s):// ou do Google Drive; pode ser o .zip do TSE). A variável de ambiente URL_DADOS substitui
+# a origem de 2024, e URL_DADOS_<ano> acrescenta ou substitui a de qualquer ano
+ORIGENS_DADOS = {
+    2024: os.environ.get('URL_DADOS', "https://drive.google.com/uc?export=download&id=1FGFxhoqU75l_9aPo6akxZjN7UNlj1Onb"),
+    **{int(nome[len('URL_DADOS_'):]): url for nome, url in os.environ.items() if re.fullmatch(r'URL_DADOS_\d{4}', nome)},
+}
+# SHA-256 esperado do arquivo de dados de cada ano (SHA256_DADOS para 2024, SHA256_DADOS_<ano> para
+# os demais), conferido antes da ingestão; sem ele, o hash calculado apenas é registrado
+SHA256_DADOS = {
+    2024: os.environ.get('SHA256_DADOS'),
+    **{int(nome[len('SHA256_DADOS_'):]): sha for nome, sha in os.environ.items() if re.fullmatch(r'SHA256_DADOS_\d{4}', nome)},
+}
+# Nomes de arquivos de cada ano: cada eleição tem seu próprio CSV e cópia Parquet, além do banco (dados.ARQUIVO_DB)
+ARQUIVO_CSV = "despesa_anual_{ano}_BRASIL.csv"
+DIRETORIO_PARQUET = 'parquet'
+
+# Motores aceitos em MOTOR_CONSULTAS
+MOTORES_CONSULTA = ('sqlite', 'parquet')
+# Motor das consultas do painel, lido da variável de ambiente MOTOR_CONSULTAS: 'sqlite' (padrão) ou
+# 'parquet' (exige pyarrow; exporta o banco na primeira carga)
+MOTOR_CONSULTAS = os.environ.get('MOTOR_CONSULTAS', 'sqlite').strip().lower()
+
+# Intervalo (em segundos) durante o qual um banco já carregado é reutilizado sem consultar a origem
+INTERVALO_VERIFICACAO = 6 * 60 * 60
+# Intervalo (em segundos) entre as atualizações do andamento de uma carga em segundo plano
+INTERVALO_PROGRESSO = 2
+# Mensagens da última carga guardadas para exibição
+LIMITE_MENSAGENS_CARGA = 50
+# Descrição de cada etapa da carga no painel de andamento
+FASES_CARGA = {
+    'verificacao': 'Verificando a origem dos dados',
+    'download': 'Baixando o arquivo de dados',
+    'hash': 'Conferindo o arquivo baixado',
+    'copia': 'Copiando a versão atual do banco',
+    'carga': 'Lendo e inserindo os registros',
+    'resumos': 'Atualizando as tabelas de resumo',
+    'busca': 'Indexando fornecedores e municípios para a busca',
+    'validacao': 'Resumindo a validação dos dados',
+    'verificacao_planos': 'Conferindo os planos das consultas',
+}
+
+# Limites do cache de resultados de consultas: memória total e validade de cada entrada
+LIMITE_CACHE_MB = 256
+VALIDADE_CACHE = 60 * 60
+
+# Conexões somente leitura mantidas por processo; execuções além desse número esperam uma livre
+TAMANHO_POOL = 8
+
+# Opções de linhas por página no explorador de tabelas
+TAMANHOS_PAGINA = [50, 100, 500]
+
+# Valores aceitos nas variáveis de ambiente que ligam ou desligam uma opção do painel
+VALORES_OPCAO = {'1': True, 'true': True, 'sim': True, 'on': True, '0': False, 'false': False, 'nao': False, 'não': False, 'off': False}
+# Exibe a aba de diagnóstico com os tempos medidos de cada consulta, gráfico e etapa da carga; lido
+# da variável de ambiente PAINEL_DIAGNOSTICO (desligado por padrão, None se o valor for inválido)
+PAINEL_DIAGNOSTICO = VALORES_OPCAO.get(os.environ.get('PAINEL_DIAGNOSTICO', '0').strip().lower())
+# Medições de desempenho mantidas em memória: de todas as sessões e de cada sessão
+LIMITE_MEDICOES = 5000
+LIMITE_MEDICOES_SESSAO = 1000
+# Arquivo JSON Lines que recebe cada medição, para o monitoramento; sem a variável, elas ficam só em memória
+ARQUIVO_LOG_DESEMPENHO = os.environ.get('ARQUIVO_LOG_DESEMPENHO')
+
+log_desempenho = logging.getLogger('painel.desempenho')
+log_carga = logging.getLogger('painel.carga')
+
+class AvisosCarga(logging.Handler):
+    """Guarda as mensagens de uma carga dos dados, que roda fora das sessões, para exibi-las na página.
+
+    Só guarda as mensagens emitidas pela thread da carga, para não misturar as cargas de anos diferentes.
+    """
+
+    def __init__(self, thread):
+        super().__init__()
+        self.thread = thread
+        self.mensagens = deque(maxlen=LIMITE_MENSAGENS_CARGA)
+
+    def emit(self, record):
+        if record.threadName == self.thread:
+            self.mensagens.append((record.levelno, self.format(record)))
+
+def exibir_avisos(mensagens):
+    """Exibe mensagens de log na página, com o destaque do nível."""
+    for nivel, texto in mensagens:
+        if nivel >= logging.ERROR:
+            st.error(texto)
+        elif nivel >= logging.WARNING:
+            st.warning(texto)
+        else:
+            st.info(texto)
 
-# URL e nomes de arquivos
-URL_DADOS = "https://drive.google.com/uc?export=download&id=1FGFxhoqU75l_9aPo6akxZjN7UNlj1Onb"
-ARQUIVO_CSV = "despesa_anual_2024_BRASIL.csv"
-ARQUIVO_DB = 'database.db'
-
-def baixar_csv(url, output):
-    """Baixa o arquivo CSV do Google Drive."""
-    st.info("Iniciando o download do arquivo de dados. Isso pode levar um momento.")
-    gdown.download(url, output, quiet=False)
-    if os.path.exists(output):
-        st.success("Arquivo de dados baixado com sucesso!")
-        return True
-    st.error(f"Falha ao baixar o arquivo: {output}")
-    return False
-
-def processar_dataframe(caminho_csv):
-    """Lê e limpa o arquivo CSV, retornando um DataFrame."""
+@st.cache_resource
+def configurar_avisos():
+    """Configura os loggers uma única vez por processo, e não a cada execução do script."""
+    dados.log.setLevel(logging.INFO)
+    aquisicao.log.setLevel(logging.INFO)
+    log_carga.setLevel(logging.INFO)
+    log_desempenho.setLevel(logging.INFO)
+    if ARQUIVO_LOG_DESEMPENHO:
+        arquivo = logging.FileHandler(ARQUIVO_LOG_DESEMPENHO, encoding='utf-8')
+        arquivo.setFormatter(logging.Formatter('%(message)s'))
+        log_desempenho.addHandler(arquivo)
+        log_desempenho.propagate = False
+
+def novo_caminho_banco(db_file):
+    """Arquivo para uma nova versão do banco, ao lado das anteriores e com nome único."""
+    base, extensao = os.path.splitext(db_file)
+    return f"{base}.{time.time_ns()}{extensao}"
+
+def remover_versoes(db_file, manter=()):
+    """Apaga as versões do banco que não estão em manter, com seus arquivos -wal e -shm."""
+    base, extensao = os.path.splitext(db_file)
+    manter = {os.path.abspath(caminho) for caminho in manter}
+    for caminho in glob.glob(f"{glob.escape(base)}.*{extensao}") + [db_file]:
+        if os.path.abspath(caminho) in manter:
+            continue
+        remover_banco(caminho)
+
+def remover_banco(caminho):
+    """Apaga um arquivo do banco com seus -wal e -shm.
+
+    Um arquivo ainda aberto por outro processo (no Windows, onde não pode ser apagado) fica para
+    a próxima limpeza.
+    """
+    for arquivo in (caminho, caminho + '-wal', caminho + '-shm'):
+        try:
+            os.remove(arquivo)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            log_carga.info(f"Versão antiga do banco mantida por enquanto: {e}")
+
+def banco_valido(db_file, manifesto):
+    """Confere se o banco existente corresponde ao manifesto (versão do schema e contagens)."""
+    caminho = dados.caminho_banco(db_file, manifesto or {})
+    if caminho is None or manifesto.get('versao_schema') != dados.VERSAO_SCHEMA or not os.path.exists(caminho):
+        return False
     try:
-        df = pd.read_csv(
-            caminho_csv, encoding='ISO-8859-1', sep=';', on_bad_lines='skip',
-            dtype={'NR_CPF_CNPJ_FORNECEDOR': str, 'CD_TP_DOCUMENTO': 'Int64', 'NM_MUNICIPIO': str},
-            na_values=["#NULO#"]
-        )
-        df['CD_MUNICIPIO'] = df['CD_MUNICIPIO'].replace(-1, None)
-        df['VR_PAGAMENTO'] = df['VR_PAGAMENTO'].str.replace(',', '.', regex=False).astype(float)
-        df['DT_PAGAMENTO'] = pd.to_datetime(df['DT_PAGAMENTO'].str.strip(), format='%d/%m/%Y', errors='coerce').dt.strftime('%Y-%m-%d')
+        conn = dados.conectar_leitura(caminho)
+        try:
+            return dados.contar_registros(conn) == manifesto.get('contagens')
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+
+class CacheConsultas:
+    """Cache LRU de resultados de consultas, limitado em memória e com validade por entrada.
+
+    As entradas são indexadas pela consulta (SQL normalizado ou nome no motor colunar), pelos
+    parâmetros e pela versão dos dados lidos: os arquivos de banco da consulta, um por ano envolvido.
+    Quando uma nova versão de um ano é publicada, só as entradas que liam a versão anterior dele são
+    descartadas; as dos outros anos continuam válidas. Os DataFrames devolvidos são compartilhados
+    entre sessões e não devem ser modificados.
+    """
+
+    def __init__(self, limite_bytes, validade):
+        self.limite_bytes = limite_bytes
+        self.validade = validade
+        self.versoes = frozenset()
+        self.entradas = OrderedDict()
+        self.bytes_ocupados = 0
+        self.acertos = 0
+        self.falhas = 0
+        self.lock = threading.Lock()
+
+    def definir_versoes(self, versoes):
+        """Registra as versões publicadas, descartando as entradas que leem alguma outra."""
+        versoes = frozenset(versoes)
+        with self.lock:
+            if versoes != self.versoes:
+                self.versoes = versoes
+                for chave in [chave for chave in self.entradas if not versoes.issuperset(chave[1])]:
+                    self._remover(chave)
+
+    def _remover(self, chave):
+        _, _, tamanho = self.entradas.pop(chave)
+        self.bytes_ocupados -= tamanho
+
+    def obter(self, chave, versao, calcular):
+        """Retorna o resultado em cache para a chave e a versão (arquivos de banco lidos), calculando-o com calcular() apenas na falta."""
+        chave = (chave, tuple(versao))
+        agora = time.monotonic()
+        with self.lock:
+            if chave in self.entradas:
+                df, criado_em, _ = self.entradas[chave]
+                if agora - criado_em < self.validade:
+                    self.entradas.move_to_end(chave)
+                    self.acertos += 1
+                    return df
+                self._remover(chave)
+            self.falhas += 1
+        df = calcular()
+        tamanho = int(df.memory_usage(index=True, deep=True).sum())
+        with self.lock:
+            if tamanho <= self.limite_bytes and self.versoes.issuperset(chave[1]):
+                if chave in self.entradas:
+                    self._remover(chave)
+                self.entradas[chave] = (df, agora, tamanho)
+                self.bytes_ocupados += tamanho
+                while self.bytes_ocupados > self.limite_bytes:
+                    self._remover(next(iter(self.entradas)))
         return df
-    except Exception as e:
-        st.error(f"Erro ao processar o arquivo CSV: {e}")
-        return None
-
-def criar_tabelas(conn):
-    """Cria o schema do banco de dados SQLite."""
-    with conn:
-        conn.execute("PRAGMA foreign_keys = ON;")
-        conn.executescript('''
-            CREATE TABLE IF NOT EXISTS Local ( CD_MUNICIPIO INTEGER PRIMARY KEY, NM_MUNICIPIO TEXT, SG_UF TEXT );
-            CREATE TABLE IF NOT EXISTS Partido ( SG_PARTIDO TEXT PRIMARY KEY, NM_PARTIDO TEXT, DS_TP_ESFERA_PARTIDARIA TEXT );
-            CREATE TABLE IF NOT EXISTS Prestador ( NR_CNPJ_PRESTADOR_CONTA TEXT PRIMARY KEY, CD_MUNICIPIO INTEGER, SG_PARTIDO TEXT, FOREIGN KEY (CD_MUNICIPIO) REFERENCES Local(CD_MUNICIPIO), FOREIGN KEY (SG_PARTIDO) REFERENCES Partido(SG_PARTIDO) );
-            CREATE TABLE IF NOT EXISTS Fornecedor ( NR_CPF_CNPJ_FORNECEDOR TEXT PRIMARY KEY, NM_FORNECEDOR TEXT, DS_TP_FORNECEDOR TEXT );
-            CREATE TABLE IF NOT EXISTS Documento ( NR_CNPJ_PRESTADOR_CONTA TEXT NOT NULL, NR_DOCUMENTO TEXT NOT NULL, CD_TP_DOCUMENTO INTEGER, DS_TP_DOCUMENTO TEXT, PRIMARY KEY (NR_CNPJ_PRESTADOR_CONTA, NR_DOCUMENTO), FOREIGN KEY (NR_CNPJ_PRESTADOR_CONTA) REFERENCES Prestador(NR_CNPJ_PRESTADOR_CONTA) );
-            CREATE TABLE IF NOT EXISTS Despesa ( NR_CNPJ_PRESTADOR_CONTA TEXT NOT NULL, NR_CPF_CNPJ_FORNECEDOR TEXT NOT NULL, DT_PAGAMENTO DATE NOT NULL, VR_PAGAMENTO REAL, PRIMARY KEY (NR_CNPJ_PRESTADOR_CONTA, NR_CPF_CNPJ_FORNECEDOR, DT_PAGAMENTO), FOREIGN KEY (NR_CNPJ_PRESTADOR_CONTA) REFERENCES Prestador(NR_CNPJ_PRESTADOR_CONTA), FOREIGN KEY (NR_CPF_CNPJ_FORNECEDOR) REFERENCES Fornecedor(NR_CPF_CNPJ_FORNECEDOR) );
-        ''')
-
-def inserir_dados(conn, df):
-    """Insere os dados do DataFrame nas tabelas do banco de dados."""
+
+    def estatisticas(self):
+        """Contadores de acertos e falhas, número de entradas e memória ocupada."""
+        with self.lock:
+            return {'acertos': self.acertos, 'falhas': self.falhas, 'entradas': len(self.entradas), 'bytes': self.bytes_ocupados}
+
+@st.cache_resource
+def obter_cache_consultas():
+    """Instância única do cache de consultas, compartilhada por todas as sessões."""
+    return CacheConsultas(LIMITE_CACHE_MB << 20, VALIDADE_CACHE)
+
+@st.cache_resource(show_spinner=False)
+def obter_medicoes():
+    """Últimas medições de desempenho de todas as sessões, compartilhadas pelo processo."""
+    return deque(maxlen=LIMITE_MEDICOES)
+
+def registrar_medicao(registro):
+    """Guarda uma medição na memória do processo e da sessão e a envia ao log estruturado."""
+    sessao = get_script_run_ctx(suppress_warning=True) is not None # A carga em segundo plano não pertence a nenhuma sessão
+    registro = {
+        'instante': time.time(),
+        'execucao': st.session_state.get('execucao_medicao') if sessao else None,
+        'visao': st.session_state.get('visao_medicao') if sessao else None,
+        **registro,
+    }
+    obter_medicoes().append(registro)
+    if sessao:
+        if 'medicoes' not in st.session_state:
+            st.session_state['medicoes'] = deque(maxlen=LIMITE_MEDICOES_SESSAO)
+        st.session_state['medicoes'].append(registro)
+    log_desempenho.info(json.dumps(registro, ensure_ascii=False, default=str))
+
+@contextmanager
+def medir(etapa, **campos):
+    """Mede o tempo do bloco e registra a medição; o bloco pode acrescentar campos ao registro."""
+    registro = dict(campos)
+    inicio = time.perf_counter()
     try:
-        with conn:
-            df[['CD_MUNICIPIO', 'NM_MUNICIPIO', 'SG_UF']].drop_duplicates('CD_MUNICIPIO').dropna(subset=['CD_MUNICIPIO']).to_sql('Local', conn, if_exists='replace', index=False)
-            df[['SG_PARTIDO', 'NM_PARTIDO', 'DS_TP_ESFERA_PARTIDARIA']].drop_duplicates('SG_PARTIDO').dropna(subset=['SG_PARTIDO']).to_sql('Partido', conn, if_exists='replace', index=False)
-            df[['NR_CPF_CNPJ_FORNECEDOR', 'NM_FORNECEDOR', 'DS_TP_FORNECEDOR']].drop_duplicates('NR_CPF_CNPJ_FORNECEDOR').dropna(subset=['NR_CPF_CNPJ_FORNECEDOR']).to_sql('Fornecedor', conn, if_exists='replace', index=False)
-            df[['NR_CNPJ_PRESTADOR_CONTA', 'CD_MUNICIPIO', 'SG_PARTIDO']].drop_duplicates('NR_CNPJ_PRESTADOR_CONTA').dropna(subset=['NR_CNPJ_PRESTADOR_CONTA']).to_sql('Prestador', conn, if_exists='replace', index=False)
-            df[['NR_CNPJ_PRESTADOR_CONTA', 'NR_DOCUMENTO', 'CD_TP_DOCUMENTO', 'DS_TP_DOCUMENTO']].dropna(subset=['NR_DOCUMENTO', 'NR_CNPJ_PRESTADOR_CONTA']).drop_duplicates(['NR_CNPJ_PRESTADOR_CONTA', 'NR_DOCUMENTO']).to_sql('Documento', conn, if_exists='replace', index=False)
-            df[['NR_CNPJ_PRESTADOR_CONTA', 'NR_CPF_CNPJ_FORNECEDOR', 'DT_PAGAMENTO', 'VR_PAGAMENTO']].dropna().drop_duplicates(['NR_CNPJ_PRESTADOR_CONTA', 'NR_CPF_CNPJ_FORNECEDOR', 'DT_PAGAMENTO']).to_sql('Despesa', conn, if_exists='replace', index=False)
-    except Exception as e:
-        st.error(f"Erro ao inserir dados no banco de dados: {e}")
+        yield registro
+    finally:
+        registro.update(etapa=etapa, segundos=time.perf_counter() - inicio)
+        registrar_medicao(registro)
+
+def criar_grafico(consulta, funcao, *args, **kwargs):
+    """Monta um gráfico do Plotly Express registrando o tempo de construção."""
+    with medir('grafico', consulta=consulta):
+        return funcao(*args, **kwargs)
+
+def executar_consulta(conn, sql, params=(), nome=None):
+    """Executa uma consulta de leitura através do cache compartilhado, medindo o tempo e as linhas."""
+    chave = (' '.join(sql.split()), tuple(params))
+    with medir('sql', consulta=nome or chave[0][:80]) as medicao:
+        medicao['cache'] = True
+        def calcular():
+            medicao['cache'] = False
+            return pd.read_sql_query(sql, conn, params=list(params))
+        df = obter_cache_consultas().obter(chave, dados.arquivos_banco(conn), calcular)
+        medicao['linhas'] = len(df)
+    return df
 
 @st.cache_resource
-def carregar_dados(url, csv_file, db_file):
-    """Função para baixar, processar e carregar os dados, com cache."""
-    if os.path.exists(db_file):
-         os.remove(db_file) # Garante dados sempre atualizados
-            
-    if baixar_csv(url, csv_file):
-        df = processar_dataframe(csv_file)
-        if df is not None:
-            conn = sqlite3.connect(db_file, check_same_thread=False)
-            criar_tabelas(conn)
-            inserir_dados(conn, df)
-            return conn
-    st.error("Não foi possível carregar os dados. A aplicação não pode continuar.")
-    return None
+def carregar_colunar(caminho, diretorio):
+    """Exporta a versão do banco em caminho para Parquet, se a gravada no diretório é outra, e abre os conjuntos colunares."""
+    versao = os.path.basename(caminho)
+    if colunar.versao_exportada(diretorio) != versao:
+        inicio = time.perf_counter()
+        conn = dados.conectar_leitura(caminho)
+        try:
+            colunar.exportar_parquet(conn, diretorio, versao)
+        finally:
+            conn.close()
+        st.info(f"Conjunto Parquet exportado em {time.perf_counter() - inicio:.1f} s")
+    return colunar.abrir_conjuntos(diretorio)
+
+def executar_analise(conn, nome, params=()):
+    """Executa uma das consultas do painel no motor configurado em MOTOR_CONSULTAS, com cache."""
+    params = list(params)
+    if MOTOR_CONSULTAS == 'parquet' and colunar.disponivel():
+        # Cada ano tem sua cópia Parquet, num subdiretório com o nome do seu banco
+        versao = dados.arquivos_banco(conn)[:1]
+        diretorio = os.path.join(DIRETORIO_PARQUET, os.path.basename(versao[0]).split('.')[0])
+        conjuntos = carregar_colunar(versao[0], diretorio)
+        with medir('parquet', consulta=nome) as medicao:
+            medicao['cache'] = True
+            def calcular():
+                medicao['cache'] = False
+                return colunar.executar(conjuntos, nome, params)
+            df = obter_cache_consultas().obter(('parquet', nome, tuple(params)), versao, calcular)
+            medicao['linhas'] = len(df)
+        return df
+    return executar_consulta(conn, dados.montar_consulta(nome, len(params) - dados.CONSULTAS[nome].count('?')), params, nome=nome)
+
+def condicao_filtro(filtro):
+    """Traduz o filtro (coluna, operador, valor) do explorador em condição SQL e parâmetros."""
+    coluna, operador, valor = filtro
+    if operador == 'contém':
+        return f"{coluna} LIKE ?", [f"%{valor}%"]
+    return f"{coluna} = ?", [valor]
+
+def consultas_pagina(tabela, chave, decrescente, filtro, cursor, tamanho):
+    """Monta as consultas de uma página do explorador com paginação por chave (keyset).
+
+    chave são as colunas que ordenam a tabela de forma única, na ordem de um índice
+    (dados.chaves_ordenacao), ou só o rowid; o cursor guarda os valores delas na última linha da
+    página anterior. A página seguinte é lida com a comparação de row values (chave) > (cursor),
+    que o SQLite resolve como uma busca por faixa no índice, já na ordem dele, em vez de um OFFSET
+    ou de uma ordenação. Como a comparação nunca vale para NULL, as linhas com a primeira coluna
+    nula (antes das demais na ordem crescente e depois na decrescente) vêm de outra consulta, pelo
+    restante da chave. Devolve as consultas (SQL e parâmetros) na ordem da página; cada uma busca
+    uma linha a mais que o tamanho da página, para saber se existe uma próxima.
+    """
+    colunas, _ = dados.TABELAS[tabela]
+    condicoes, params = [], []
+    if filtro is not None:
+        condicao, params = condicao_filtro(filtro)
+        condicoes.append(condicao)
+    direcao, comparacao = ('DESC', '<') if decrescente else ('ASC', '>')
+    c, resto = chave[0], chave[1:]
+
+    def depois_de(colunas_chave, valores):
+        return f"({', '.join(colunas_chave)}) {comparacao} ({', '.join('?' for _ in valores)})"
+
+    if not resto:  # rowid: nunca é nulo
+        trechos = [([depois_de(chave, cursor)], list(cursor)) if cursor is not None else ([], [])]
+    elif cursor is None:
+        valores, nulos = ([f"{c} IS NOT NULL"], []), ([f"{c} IS NULL"], [])
+        # NULL vem antes de qualquer valor na ordem crescente do SQLite e depois na decrescente
+        trechos = [valores, nulos] if decrescente else [nulos, valores]
+    elif cursor[0] is None:
+        nulos = ([f"{c} IS NULL", depois_de(resto, cursor[1:])], list(cursor[1:]))
+        trechos = [nulos] if decrescente else [nulos, ([f"{c} IS NOT NULL"], [])]
+    else:
+        valores = ([depois_de(chave, cursor)], list(cursor))
+        trechos = [valores, ([f"{c} IS NULL"], [])] if decrescente else [valores]
+    ordem = ', '.join(f"{coluna} {direcao}" for coluna in chave)
+    consultas = []
+    for condicoes_trecho, params_trecho in trechos:
+        todas = condicoes + condicoes_trecho
+        where = f"WHERE {' AND '.join(todas)}" if todas else ""
+        consultas.append((
+            f"SELECT rowid AS _rowid, {', '.join(colunas)} FROM {tabela} {where} ORDER BY {ordem} LIMIT ?",
+            params + params_trecho + [tamanho + 1],
+        ))
+    return consultas
+
+class PoolConexoes:
+    """Conexões somente leitura com uma versão do banco, emprestadas a uma execução do script por vez.
+
+    Cada sessão consulta com sua própria conexão, sem cursores intercalados com as de outras
+    sessões. As conexões são abertas sob demanda até o limite; acima dele, a execução espera uma
+    conexão ser devolvida. Depois de fechar(), as conexões devolvidas são fechadas em vez de voltar
+    ao pool, e vazio() indica quando a última foi fechada e o arquivo pode ser apagado.
+    """
+
+    def __init__(self, caminho, tamanho):
+        self.caminho = caminho
+        self.tamanho = tamanho
+        self.livres = queue.LifoQueue()
+        self.abertas = 0
+        self.esperando = 0
+        self.fechado = False
+        self.trava = threading.Lock()
+
+    @contextmanager
+    def conexao(self):
+        """Empresta uma conexão durante o bloco e a devolve ao pool ao final (ou a fecha, se o pool foi fechado)."""
+        with self.trava:
+            conn = None if self.fechado or self.livres.empty() else self.livres.get_nowait()
+            # Fechado o pool, ninguém mais espera por uma devolução: abre uma conexão avulsa
+            abrir = conn is None and (self.fechado or self.abertas < self.tamanho)
+            esperar = conn is None and not abrir
+            self.abertas += abrir
+            self.esperando += esperar
+        if esperar:
+            conn = self.livres.get()
+            with self.trava:
+                self.esperando -= 1
+                abrir = conn is None # Sinal de fechar() para quem já esperava
+                self.abertas += abrir
+        if abrir:
+            try:
+                conn = dados.conectar_leitura(self.caminho)
+            except Exception:
+                with self.trava:
+                    self.abertas -= 1
+                raise
+        try:
+            yield conn
+        finally:
+            with self.trava:
+                if self.fechado:
+                    conn.close()
+                    self.abertas -= 1
+                else:
+                    self.livres.put(conn)
+
+    def fechar(self):
+        """Fecha as conexões livres e faz as emprestadas serem fechadas quando devolvidas."""
+        with self.trava:
+            self.fechado = True
+            while not self.livres.empty():
+                self.livres.get_nowait().close()
+                self.abertas -= 1
+            for _ in range(self.esperando):
+                self.livres.put(None)
+
+    def vazio(self):
+        """Indica se o pool foi fechado e nenhuma conexão com o arquivo segue aberta."""
+        with self.trava:
+            return self.fechado and self.abertas == 0
+
+def abrir_banco(caminho):
+    """Cria o pool de conexões de leitura com a versão do banco já carregada."""
+    return PoolConexoes(caminho, TAMANHO_POOL)
+
+class ProgressoCarga:
+    """Andamento de uma carga, atualizado pela thread da carga e lido pelas sessões."""
+
+    def __init__(self, csv_file):
+        self.csv_file = csv_file
+        self.fase = 'verificacao'
+        self.bytes_total = None
+        self.linhas_lidas = 0
+        self.linhas_tabela = {}
+        self.inicio = time.time()
+
+    def bytes_baixados(self):
+        """Bytes já gravados pelo download, medidos no arquivo parcial (.part) do download em andamento."""
+        base = os.path.splitext(self.csv_file)[0]
+        caminhos = glob.glob(glob.escape(base) + '*.part')
+        return max((os.path.getsize(caminho) for caminho in caminhos if os.path.exists(caminho)), default=0)
+
+    def registrar_bloco(self, linhas, linhas_tabela):
+        """Recebe de dados.inserir_dados_em_blocos as linhas lidas e inseridas até o bloco atual."""
+        self.linhas_lidas = linhas
+        self.linhas_tabela = dict(linhas_tabela)
+
+@contextmanager
+def etapa_carga(progresso, etapas, fase):
+    """Mede uma etapa da carga, guardando a duração em etapas e exibindo-a no andamento."""
+    if progresso is not None:
+        progresso.fase = fase
+    with medir('etl', fase=fase) as medicao:
+        yield medicao
+    etapas[fase] = medicao['segundos']
+
+def carregar_dados(url, csv_file, db_file, progresso=None, sha256_esperado=None):
+    """Função para baixar, processar e carregar os dados.
+
+    Um manifesto gravado ao lado do banco (hash, tamanho e ETag da origem, versão do schema e
+    contagens por tabela) permite reaproveitar o banco existente sem novo download e, quando a
+    origem muda, aplicar apenas as diferenças em vez de reconstruir todas as tabelas. O tempo de
+    cada etapa de uma nova carga é registrado nas medições e guardado no manifesto.
+
+    Cada carga grava uma nova versão do banco em outro arquivo (partindo de uma cópia da atual,
+    quando só as diferenças são aplicadas) e a publica trocando o manifesto de uma vez. Quem ainda
+    lê a versão anterior não é bloqueado nem vê uma carga pela metade. O arquivo não é
+    renomeado por cima do anterior porque os arquivos -wal e -shm do modo WAL acompanham o nome.
+    Retorna um pool de conexões somente leitura com a versão publicada. Roda na thread de
+    CargaDados, que acompanha o andamento por progresso; as mensagens vão para log_carga. Com
+    sha256_esperado, um arquivo de dados com outro hash é recusado.
+    """
+    manifesto = dados.ler_manifesto(db_file)
+    if not banco_valido(db_file, manifesto):
+        manifesto = None
+        remover_versoes(db_file) # Schema antigo ou carga interrompida: reconstrói do zero
+    atual = dados.caminho_banco(db_file, manifesto) if manifesto is not None else None
+
+    if manifesto is not None:
+        if time.time() - manifesto['verificado_em'] < INTERVALO_VERIFICACAO:
+            return abrir_banco(atual)
+        origem = aquisicao.consultar(url)
+        if origem is not None and origem['etag'] and origem['etag'] == manifesto['origem'].get('etag'):
+            manifesto['verificado_em'] = time.time()
+            dados.gravar_manifesto(db_file, manifesto)
+            return abrir_banco(atual)
+    else:
+        origem = aquisicao.consultar(url)
 
-conn = carregar_dados(URL_DADOS, ARQUIVO_CSV, ARQUIVO_DB)
+    etapas = {}
+    if progresso is not None and origem is not None:
+        progresso.bytes_total = origem['tamanho']
+    try:
+        with etapa_carga(progresso, etapas, 'download'):
+            arquivo = aquisicao.obter(url, csv_file)
+        with etapa_carga(progresso, etapas, 'hash'):
+            sha256 = aquisicao.verificar(arquivo, sha256_esperado)
+    except aquisicao.ErroAquisicao as e:
+        log_carga.error(f"Falha ao obter o arquivo de dados: {e}")
+        arquivo = None
+    if arquivo is not None:
+        info_origem = {
+            'url': url,
+            'etag': origem['etag'] if origem else None,
+            'tamanho': os.path.getsize(arquivo),
+            'sha256': sha256,
+        }
+        if manifesto is not None and manifesto['origem'].get('sha256') == sha256:
+            manifesto.update(origem=info_origem, verificado_em=time.time())
+            dados.gravar_manifesto(db_file, manifesto)
+            return abrir_banco(atual)
+
+        novo = novo_caminho_banco(db_file)
+        conn = sqlite3.connect(novo)
+        if atual is not None:
+            with etapa_carga(progresso, etapas, 'copia'):
+                origem_copia = sqlite3.connect(atual)
+                try:
+                    origem_copia.backup(conn)
+                finally:
+                    origem_copia.close()
+        conn.execute("PRAGMA foreign_keys = ON")
+        dados.criar_tabelas(conn)
+        registrar_bloco = progresso.registrar_bloco if progresso is not None else None
+        # O CSV de dentro de um .zip é lido em fluxo, em sequência; a leitura paralela exige o CSV em disco
+        with etapa_carga(progresso, etapas, 'carga') as medicao, aquisicao.abrir_csv(arquivo) as fluxo:
+            if dados.PROCESSOS_LEITURA > 1 and not aquisicao.compactado(arquivo):
+                contagens = dados.inserir_dados_em_blocos(conn, dados.processar_em_paralelo(arquivo, dados.PROCESSOS_LEITURA), registrar_bloco)
+            elif dados.TAMANHO_BLOCO:
+                contagens = dados.inserir_dados_em_blocos(conn, dados.processar_em_blocos(fluxo, dados.TAMANHO_BLOCO), registrar_bloco)
+            else:
+                df = dados.processar_dataframe(fluxo)
+                contagens = dados.inserir_dados(conn, df) if df is not None else None
+            medicao['linhas'] = contagens['Despesa'] if contagens else None
+        if contagens is not None:
+            with etapa_carga(progresso, etapas, 'resumos'):
+                dados.atualizar_resumos(conn)
+            with etapa_carga(progresso, etapas, 'busca'):
+                dados.atualizar_busca(conn)
+            with etapa_carga(progresso, etapas, 'validacao'):
+                validacao = dados.resumir_validacao(conn)
+            if validacao['atipicas']:
+                log_carga.info(f"{validacao['atipicas']:,} pagamentos fora da faixa típica do partido e da UF (visão Despesa_Atipica)")
+            with etapa_carga(progresso, etapas, 'verificacao_planos'):
+                violacoes = dados.verificar_planos(conn)
+            if violacoes:
+                log_carga.warning("Consultas sem índice adequado em Despesa: " + "; ".join(f"{c}: {d}" for c, d in violacoes.items()))
+            conn.close()
+            agora = time.time()
+            dados.gravar_manifesto(db_file, {
+                'versao_schema': dados.VERSAO_SCHEMA,
+                'arquivo': os.path.basename(novo),
+                'origem': info_origem,
+                'contagens': contagens,
+                'validacao': validacao,
+                'etapas': etapas,
+                'criado_em': agora,
+                'verificado_em': agora,
+            })
+            # As versões anteriores são apagadas por CargaDados, quando os pools que as leem esvaziam
+            return abrir_banco(novo)
+        conn.close()
+        remover_banco(novo)
+
+    if manifesto is not None:
+        log_carga.warning("Não foi possível atualizar os dados; exibindo a última versão carregada.")
+        return abrir_banco(atual)
+    log_carga.error("Não foi possível carregar os dados. A aplicação não pode continuar.")
+    return None
 
-st.set_page_config(layout="wide")
+class CargaDados:
+    """Carga dos dados em segundo plano, que publica cada nova versão do banco sem bloquear a página.
 
-st.title("Análise Interativa de Prestações de Contas Eleitorais - 2024")
-st.markdown("Navegue pelas abas abaixo para explorar as despesas políticas sob diversas perspectivas. Use o **Painel de Controle** na barra lateral para aplicar filtros.")
+    Ao ser criada, publica a última versão válida do banco, se houver, para que as análises
+    apareçam de imediato. A carga roda numa thread; a cada execução do script, as sessões leem o
+    pool e a versão publicados e passam à nova versão assim que a carga termina. O pool anterior
+    é fechado ao publicar o novo: as conexões livres são fechadas na hora e as emprestadas quando
+    devolvidas. O arquivo de uma versão substituída só é apagado depois que o pool dela esvazia
+    (veja remover_anteriores). Cada eleição tem a sua carga, com banco e thread próprios, e é
+    recarregada independentemente das outras.
+    """
 
-st.sidebar.title("Painel de Controle e Filtros")
+    def __init__(self, url, csv_file, db_file, sha256=None):
+        self.url = url
+        self.csv_file = csv_file
+        self.db_file = db_file
+        self.sha256 = sha256
+        self.pool = None
+        self.versao = None
+        self.anteriores = []
+        self.progresso = None
+        self.ultima_execucao = None
+        self.trava = threading.Lock()
+        self.thread = f"carga-{os.path.splitext(os.path.basename(db_file))[0]}"
+        self.avisos = AvisosCarga(self.thread)
+        dados.log.addHandler(self.avisos)
+        aquisicao.log.addHandler(self.avisos)
+        log_carga.addHandler(self.avisos)
+        manifesto = dados.ler_manifesto(db_file)
+        if banco_valido(db_file, manifesto):
+            caminho = dados.caminho_banco(db_file, manifesto)
+            remover_versoes(db_file, manter=[caminho]) # Sobras de execuções anteriores do painel
+            self.publicar(abrir_banco(caminho))
+
+    def publicar(self, pool):
+        """Passa as sessões para um novo pool, junto com a versão dos dados que ele serve (o arquivo do banco)."""
+        with self.trava:
+            if self.pool is not None:
+                self.pool.fechar()
+                self.anteriores.append(self.pool)
+            self.pool, self.versao = pool, os.path.realpath(pool.caminho)
+
+    def remover_anteriores(self):
+        """Apaga as versões do banco cujos pools já esvaziaram; as que ainda são lidas ficam para depois.
+
+        A última versão substituída também fica até a próxima publicação, para uma execução do
+        script que leu o pool ou o caminho dela pouco antes da troca (a comparação entre eleições
+        anexa o arquivo pelo caminho). Só roda fora de uma carga, para não apagar a versão que ela
+        está gravando.
+        """
+        with self.trava:
+            if self.progresso is not None or len(self.anteriores) < 2:
+                return
+            self.anteriores = [pool for pool in self.anteriores[:-1] if not pool.vazio()] + self.anteriores[-1:]
+            remover_versoes(self.db_file, [self.pool.caminho] + [pool.caminho for pool in self.anteriores])
+
+    def atual(self):
+        """Pool e versão publicados, lidos juntos para o cache nunca misturar duas versões."""
+        with self.trava:
+            return self.pool, self.versao
+
+    def iniciar(self):
+        """Dispara a carga se nenhuma estiver em andamento e o intervalo de verificação já passou."""
+        self.remover_anteriores()
+        with self.trava:
+            if self.progresso is not None or (
+                self.ultima_execucao is not None and time.time() - self.ultima_execucao < INTERVALO_VERIFICACAO
+            ):
+                return
+            self.progresso = ProgressoCarga(self.csv_file)
+        self.avisos.mensagens.clear()
+        threading.Thread(target=self.executar, name=self.thread, daemon=True).start()
+
+    def executar(self):
+        """Executa carregar_dados e publica o pool devolvido, se ele servir outra versão do banco."""
+        try:
+            pool = carregar_dados(self.url, self.csv_file, self.db_file, self.progresso, self.sha256)
+            if pool is not None and (self.pool is None or pool.caminho != self.pool.caminho):
+                self.publicar(pool)
+        except Exception as e:
+            log_carga.error(f"Erro na carga dos dados: {e}")
+        finally:
+            with self.trava:
+                self.progresso = None
+                self.ultima_execucao = time.time()
+            self.remover_anteriores()
 
-if conn is not None:
-    tab_titles = [
-        "C1: Partidos e Fornecedores", "C2: Prestadores por UF", "C3: Despesa por Tipo Fornecedor", 
-        "C4: Prestadores por Partido (BR)", "C5: Top Municípios (Prestadores)", "C6: Gasto Médio por Partido",
-        "C7: Contratos por Partido", "C8: Maiores Despesas (Fornecedor)", "C9: Despesas em MG (Jan/24)",
-        "C10: Top Municípios (Despesa)", "Explorar Tabelas"
-    ]
-    tabs = st.tabs(tab_titles)
+@st.cache_resource
+def obter_cargas():
+    """Carga em segundo plano de cada eleição (ano -> CargaDados), compartilhadas por todas as sessões.
 
-with tabs[0]:
+    As cargas só começam quando um ano é consultado pela primeira vez (CargaDados.iniciar).
+    """
+    return {
+        ano: CargaDados(url, ARQUIVO_CSV.format(ano=ano), dados.ARQUIVO_DB.format(ano=ano), SHA256_DADOS.get(ano))
+        for ano, url in sorted(ORIGENS_DADOS.items(), reverse=True)
+    }
+
+@st.fragment(run_every=INTERVALO_PROGRESSO)
+def exibir_progresso(carga, versao_exibida):
+    """Mostra o andamento da carga e recarrega a página quando ela termina."""
+    progresso = carga.progresso
+    if progresso is None or carga.atual()[1] != versao_exibida:
+        st.rerun()
+    st.caption(f"{FASES_CARGA.get(progresso.fase, progresso.fase)} ({time.time() - progresso.inicio:.0f} s)")
+    if progresso.fase == 'download':
+        baixados = progresso.bytes_baixados()
+        if progresso.bytes_total:
+            st.progress(min(baixados / progresso.bytes_total, 1.0), text=f"{baixados / (1 << 20):,.1f} de {progresso.bytes_total / (1 << 20):,.1f} MB")
+        else:
+            st.caption(f"{baixados / (1 << 20):,.1f} MB baixados")
+    if progresso.linhas_lidas:
+        st.caption(f"{progresso.linhas_lidas:,} linhas lidas")
+        st.caption(", ".join(f"{tabela} {linhas:,}" for tabela, linhas in progresso.linhas_tabela.items()))
+    exibir_avisos(list(carga.avisos.mensagens))
+
+def consulta_1(conn, ano):
+    """Consulta 1: partidos nacionais e fornecedores por faixa de valor."""
     st.header("Consulta 1: Partidos com Fornecedores por Faixa de Valor")
-    
+
     st.sidebar.subheader("Filtros da Consulta 1") 
-    
+
     col1, col2 = st.sidebar.columns(2)
     with col1:
         valor_minimo_c1 = st.number_input(
@@ -119,117 +723,71 @@ with tabs[0]:
             step=1000
         )
 
-    query1 = """
-    SELECT 
-        f.NM_FORNECEDOR, 
-        dp.VR_PAGAMENTO 
-    FROM 
-        Partido p 
-        NATURAL JOIN Prestador pr 
-        NATURAL JOIN Despesa dp 
-        NATURAL JOIN Fornecedor f 
-    WHERE 
-        p.DS_TP_ESFERA_PARTIDARIA = 'Nacional' 
-        AND dp.VR_PAGAMENTO BETWEEN ? AND ?
-    """
-    
-    df1 = pd.read_sql_query(query1, conn, params=[valor_minimo_c1, valor_maximo_c1])
+    df1 = executar_analise(conn, 'C1', [valor_minimo_c1, valor_maximo_c1])
 
     if not df1.empty:
-        df_grafico1 = df1.groupby("NM_FORNECEDOR")["VR_PAGAMENTO"].sum().nlargest(10).reset_index()
-        
-        fig1 = px.bar(
-            df_grafico1, 
-            y="NM_FORNECEDOR", 
-            x="VR_PAGAMENTO",
-            orientation='h', 
-            title=f"Top 10 Fornecedores com Pagamentos entre R${valor_minimo_c1:,.2f} e R${valor_maximo_c1:,.2f}",
-            labels={'VR_PAGAMENTO': 'Montante Total (R$)', 'NM_FORNECEDOR': 'Fornecedor'},
-            text_auto='.2s'
-        )
-        fig1.update_layout(yaxis={'categoryorder':'total ascending'})
+        with medir('agregacao', consulta='C1'):
+            df_grafico1 = dados.top_fornecedores(df1)
+
+        fig1 = criar_grafico('C1', relatorios.figura_c1, df_grafico1, valor_minimo_c1, valor_maximo_c1)
         st.plotly_chart(fig1, use_container_width=True)
-        
+
         with st.expander("Visualizar dados tabulares da consulta"): 
             st.dataframe(df1)
     else: 
         st.warning("Nenhum dado encontrado para a faixa de valores selecionada.")
 
-    with tabs[1]:
+def consulta_2(conn, ano):
+    """Consulta 2: prestadores por partido no estado selecionado."""
+    st.header("Consulta 2: Análise de Prestadores por Partido e UF")
 
-        st.header("Consulta 2: Análise de Prestadores por Partido e UF")
+    st.sidebar.subheader("Filtros da Consulta 2") 
 
-        st.sidebar.subheader("Filtros da Consulta 2") 
+    df2_base = executar_analise(conn, 'C2')
 
-        df2_base = pd.read_sql_query("SELECT P.NM_PARTIDO, L.SG_UF FROM Prestador Pr NATURAL JOIN Partido P NATURAL JOIN Local L", conn)
-        
-        if not df2_base.empty:
-            estados_disponiveis = sorted(df2_base['SG_UF'].unique())
-            estado_selecionado = st.sidebar.selectbox("C2: Selecione o Estado", estados_disponiveis, index=estados_disponiveis.index('SP'))
-            df2_filtrado = df2_base[df2_base['SG_UF'] == estado_selecionado]
-            
-            if not df2_filtrado.empty:
-                df_grafico2 = df2_filtrado.groupby("NM_PARTIDO").size().reset_index(name='Numero_Prestadores').sort_values('Numero_Prestadores', ascending=False)
-                fig2 = px.bar(df_grafico2, x='NM_PARTIDO', y='Numero_Prestadores', title=f"Número de Prestadores por Partido em {estado_selecionado}", labels={'NM_PARTIDO': 'Partido', 'Numero_Prestadores': 'Número de Prestadores'})
-                st.plotly_chart(fig2, use_container_width=True)
-                with st.expander("Visualizar dados tabulares da consulta"): st.dataframe(df2_filtrado)
-            else: st.warning(f"Nenhum dado encontrado para o estado {estado_selecionado}.")
-        else: st.warning("Não foi possível carregar os dados para esta consulta.")
+    if not df2_base.empty:
+        estados_disponiveis = sorted(df2_base['SG_UF'].unique())
+        estado_selecionado = st.sidebar.selectbox("C2: Selecione o Estado", estados_disponiveis, index=estados_disponiveis.index('SP'))
+        df2_filtrado = df2_base[df2_base['SG_UF'] == estado_selecionado]
 
+        if not df2_filtrado.empty:
+            with medir('agregacao', consulta='C2'):
+                df_grafico2 = dados.prestadores_por_partido(df2_filtrado)
+            fig2 = criar_grafico('C2', relatorios.figura_c2, df_grafico2, estado_selecionado)
+            st.plotly_chart(fig2, use_container_width=True)
+            with st.expander("Visualizar dados tabulares da consulta"): st.dataframe(df2_filtrado)
+        else: st.warning(f"Nenhum dado encontrado para o estado {estado_selecionado}.")
+    else: st.warning("Não foi possível carregar os dados para esta consulta.")
 
-
-with tabs[2]:
+def consulta_3(conn, ano):
+    """Consulta 3: despesas por tipo de fornecedor."""
     st.header("Consulta 3: Análise de Despesas por Tipo de Fornecedor")
 
     st.sidebar.subheader("Filtros da Consulta 3")
-    
+
     tipo_fornecedor = st.sidebar.radio(
         "Selecione o Tipo de Fornecedor para detalhar:",
         options=['PESSOA JURÍDICA', 'PESSOA FÍSICA'],
         index=0  
     )
 
-    
+
     st.subheader("Visão Geral: Distribuição de Pagamentos")
-    df3_geral = pd.read_sql_query("SELECT F.DS_TP_FORNECEDOR, SUM(D.VR_PAGAMENTO) AS VR_TOTAL FROM Fornecedor F NATURAL JOIN Despesa D GROUP BY F.DS_TP_FORNECEDOR", conn)
+    df3_geral = executar_analise(conn, 'C3_geral')
     if not df3_geral.empty:
-        fig3_pie = px.pie(df3_geral, names='DS_TP_FORNECEDOR', values='VR_TOTAL', title="Distribuição de Pagamentos por Tipo de Fornecedor", hole=.3)
+        fig3_pie = criar_grafico('C3_geral', relatorios.figura_c3_geral, df3_geral)
         st.plotly_chart(fig3_pie, use_container_width=True)
     else:
         st.warning("Nenhum dado encontrado para a visão geral.")
 
-    
+
     st.subheader(f"Top 10 Fornecedores do Tipo: {tipo_fornecedor}")
-    
-    
-    query3_detalhe = """
-        SELECT 
-            F.NM_FORNECEDOR, 
-            SUM(D.VR_PAGAMENTO) as Total_Recebido
-        FROM 
-            Fornecedor F 
-            NATURAL JOIN Despesa D
-        WHERE 
-            F.DS_TP_FORNECEDOR = ?
-        GROUP BY 
-            F.NM_FORNECEDOR
-        ORDER BY 
-            Total_Recebido DESC
-        LIMIT 10
-    """
-    df3_detalhe = pd.read_sql_query(query3_detalhe, conn, params=[tipo_fornecedor])
+
+
+    df3_detalhe = executar_analise(conn, 'C3', [tipo_fornecedor])
 
     if not df3_detalhe.empty:
-        fig3_bar = px.bar(
-            df3_detalhe,
-            x='Total_Recebido',
-            y='NM_FORNECEDOR',
-            orientation='h',
-            title=f"Top 10 Fornecedores ({tipo_fornecedor}) por Valor Recebido",
-            labels={'NM_FORNECEDOR': 'Fornecedor', 'Total_Recebido': 'Total Recebido (R$)'},
-            text_auto='.2s'
-        )
-        fig3_bar.update_layout(yaxis={'categoryorder': 'total ascending'})
+        fig3_bar = criar_grafico('C3', relatorios.figura_c3, df3_detalhe, tipo_fornecedor)
         st.plotly_chart(fig3_bar, use_container_width=True)
 
         with st.expander("Visualizar dados detalhados da consulta"):
@@ -237,15 +795,15 @@ with tabs[2]:
     else:
         st.warning(f"Nenhum fornecedor do tipo '{tipo_fornecedor}' encontrado nos dados.")
 
-
-with tabs[3]:
+def consulta_4(conn, ano):
+    """Consulta 4: número de prestadores por partido nos estados selecionados."""
     st.header("Consulta 4: Número de Prestadores por Partido")
 
     st.markdown("Análise do número de prestadores de contas por partido, com filtro geográfico.")
 
     st.sidebar.subheader("Filtros da Consulta 4")
-    
-    df_estados = pd.read_sql_query("SELECT DISTINCT SG_UF FROM Local ORDER BY SG_UF", conn)
+
+    df_estados = executar_consulta(conn, "SELECT DISTINCT SG_UF FROM Local ORDER BY SG_UF")
     lista_estados = df_estados['SG_UF'].tolist()
 
     estados_selecionados = st.sidebar.multiselect(
@@ -257,43 +815,19 @@ with tabs[3]:
     if not estados_selecionados:
         st.warning("Por favor, selecione ao menos um estado no painel de filtros.")
     else:
-        
-        placeholders = ', '.join('?' for _ in estados_selecionados)
-        
-        query4 = f"""
-            SELECT 
-                P.SG_PARTIDO, 
-                COUNT(Pr.NR_CNPJ_PRESTADOR_CONTA) AS Numero_Prestadores 
-            FROM 
-                Prestador Pr 
-                NATURAL JOIN Partido P 
-                NATURAL JOIN Local L
-            WHERE 
-                L.SG_UF IN ({placeholders})
-            GROUP BY 
-                P.SG_PARTIDO 
-            ORDER BY 
-                Numero_Prestadores DESC
-        """
-        
-        df4 = pd.read_sql_query(query4, conn, params=estados_selecionados)
+
+        df4 = executar_analise(conn, 'C4', estados_selecionados)
 
         if not df4.empty:
-           
+
             if len(estados_selecionados) == len(lista_estados):
-                titulo_grafico = "Número de Prestadores por Partido (Brasil)"
+                regiao = "Brasil"
             elif len(estados_selecionados) > 1:
-                titulo_grafico = f"Número de Prestadores por Partido ({len(estados_selecionados)} estados selecionados)"
+                regiao = f"{len(estados_selecionados)} estados selecionados"
             else:
-                titulo_grafico = f"Número de Prestadores por Partido ({estados_selecionados[0]})"
-
-            fig4 = px.bar(
-                df4, 
-                x='SG_PARTIDO', 
-                y='Numero_Prestadores', 
-                title=titulo_grafico, 
-                labels={'SG_PARTIDO': 'Partido', 'Numero_Prestadores': 'Número de Prestadores'}
-            )
+                regiao = estados_selecionados[0]
+
+            fig4 = criar_grafico('C4', relatorios.figura_c4, df4, regiao)
             st.plotly_chart(fig4, use_container_width=True)
 
             with st.expander("Visualizar dados tabulares da consulta"):
@@ -301,33 +835,33 @@ with tabs[3]:
         else:
             st.warning("Nenhum dado encontrado para os filtros selecionados.")
 
-    with tabs[4]:
+def consulta_5(conn, ano):
+    """Consulta 5: municípios com maior número de prestadores."""
+    st.header("Consulta 5: Municípios com Maior Número de Prestadores")
 
-        st.header("Consulta 5: Municípios com Maior Número de Prestadores")
-        
-        st.sidebar.subheader("Filtros da Consulta 5")
+    st.sidebar.subheader("Filtros da Consulta 5")
 
-        top_n_c5 = st.sidebar.slider("Quantos municípios exibir?", 5, 50, 10)
+    top_n_c5 = st.sidebar.slider("Quantos municípios exibir?", 5, 50, 10)
 
-        df5 = pd.read_sql_query(f"SELECT L.NM_MUNICIPIO, COUNT(Pr.NR_CNPJ_PRESTADOR_CONTA) AS n FROM Prestador Pr NATURAL JOIN Local L GROUP BY L.NM_MUNICIPIO ORDER BY n DESC LIMIT {top_n_c5}", conn)
-        if not df5.empty:
-            fig5 = px.bar(df5, x='n', y='NM_MUNICIPIO', orientation='h', title=f'Top {top_n_c5} Municípios com Mais Prestadores', labels={'NM_MUNICIPIO': 'Município', 'n': 'Número de Prestadores'})
-            fig5.update_layout(yaxis={'categoryorder':'total ascending'})
-            st.plotly_chart(fig5, use_container_width=True)
-            with st.expander("Visualizar dados tabulares"): st.dataframe(df5)
-        else: st.warning("Nenhum dado encontrado.")
+    df5 = executar_analise(conn, 'C5', [top_n_c5])
+    if not df5.empty:
+        fig5 = criar_grafico('C5', relatorios.figura_c5, df5, top_n_c5)
+        st.plotly_chart(fig5, use_container_width=True)
+        with st.expander("Visualizar dados tabulares"): st.dataframe(df5)
+    else: st.warning("Nenhum dado encontrado.")
 
-with tabs[5]:
+def consulta_6(conn, ano):
+    """Consulta 6: valor médio de pagamento por partido."""
     st.header("Consulta 6: Valor Médio de Pagamento por Partido")
 
     st.markdown("Análise da média de gastos por partido, com filtros geográficos e temporais.")
 
     st.sidebar.subheader("Filtros da Consulta 6")
 
-    df_estados_c6 = pd.read_sql_query("SELECT DISTINCT SG_UF FROM Local ORDER BY SG_UF", conn)
+    df_estados_c6 = executar_consulta(conn, "SELECT DISTINCT SG_UF FROM Local ORDER BY SG_UF")
     lista_estados_c6 = df_estados_c6['SG_UF'].tolist()
-    
-    datas_disponiveis = pd.read_sql_query("SELECT MIN(DT_PAGAMENTO) as min_date, MAX(DT_PAGAMENTO) as max_date FROM Despesa", conn)
+
+    datas_disponiveis = executar_consulta(conn, "SELECT MIN(DT_PAGAMENTO) as min_date, MAX(DT_PAGAMENTO) as max_date FROM Despesa")
     min_data = pd.to_datetime(datas_disponiveis['min_date'].iloc[0])
     max_data = pd.to_datetime(datas_disponiveis['max_date'].iloc[0])
 
@@ -351,40 +885,12 @@ with tabs[5]:
         st.warning("Por favor, selecione um intervalo de datas válido (início e fim).")
     else:
         data_inicio, data_fim = data_selecionada_c6
-        
-        placeholders_estados = ', '.join('?' for _ in estados_selecionados_c6)
-        query6 = f"""
-            SELECT 
-                PT.SG_PARTIDO, 
-                AVG(D.VR_PAGAMENTO) AS Media_Gastos 
-            FROM 
-                Despesa D 
-                NATURAL JOIN Prestador P 
-                NATURAL JOIN Partido PT 
-                NATURAL JOIN Local L
-            WHERE 
-                L.SG_UF IN ({placeholders_estados}) 
-                AND D.DT_PAGAMENTO BETWEEN ? AND ?
-            GROUP BY 
-                PT.SG_PARTIDO 
-            ORDER BY 
-                Media_Gastos DESC
-        """
-        
-        params = estados_selecionados_c6 + [data_inicio.strftime('%Y-%m-%d'), data_fim.strftime('%Y-%m-%d')]
-        df6 = pd.read_sql_query(query6, conn, params=params)
+
+        periodo = [data_inicio.strftime('%Y-%m-%d'), data_fim.strftime('%Y-%m-%d')]
+        df6 = executar_analise(conn, 'C6', estados_selecionados_c6 + periodo)
 
         if not df6.empty:
-            titulo_grafico = f"Média de Gastos por Partido ({len(estados_selecionados_c6)} Estados)"
-            
-            fig6 = px.bar(
-                df6, 
-                x='SG_PARTIDO', 
-                y='Media_Gastos', 
-                title=titulo_grafico, 
-                labels={'SG_PARTIDO': 'Partido', 'Media_Gastos': 'Média de Gastos (R$)'}, 
-                text_auto='.2s'
-            )
+            fig6 = criar_grafico('C6', relatorios.figura_c6, df6, estados_selecionados_c6, *periodo)
             st.plotly_chart(fig6, use_container_width=True)
 
             with st.expander("Visualizar dados tabulares da consulta"):
@@ -392,46 +898,42 @@ with tabs[5]:
         else:
             st.warning("Nenhum dado encontrado para os filtros selecionados.")
 
+def consulta_7(conn, ano):
+    """Consulta 7: quantidade de contratos por partido."""
+    st.header("Consulta 7: Quantidade de Contratos Firmados por Partido")
 
-    with tabs[6]:
-
-        st.header("Consulta 7: Quantidade de Contratos Firmados por Partido")
-
-        st.sidebar.subheader("Filtros da Consulta 7")
-
-        top_n_c7 = st.sidebar.slider("Quantos partidos exibir?", 5, 30, 10)
-        df7 = pd.read_sql_query(f"SELECT P.SG_PARTIDO, COUNT(D.NR_CPF_CNPJ_FORNECEDOR) AS n FROM Despesa D NATURAL JOIN Prestador P GROUP BY P.SG_PARTIDO ORDER BY n DESC LIMIT {top_n_c7}", conn)
-        if not df7.empty:
-            fig7 = px.bar(df7, x='n', y='SG_PARTIDO', orientation='h', title=f"Top {top_n_c7} Partidos com Mais Contratos", labels={'SG_PARTIDO': 'Partido', 'n': 'Quantidade de Contratos'})
-            fig7.update_layout(yaxis={'categoryorder':'total ascending'})
-            st.plotly_chart(fig7, use_container_width=True)
-            with st.expander("Visualizar dados tabulares"): st.dataframe(df7)
-        else: st.warning("Nenhum dado encontrado.")
-
-    with tabs[7]:
+    st.sidebar.subheader("Filtros da Consulta 7")
 
-        st.header("Consulta 8: Fornecedores com Maior Volume de Despesas em 2024")
+    top_n_c7 = st.sidebar.slider("Quantos partidos exibir?", 5, 30, 10)
+    df7 = executar_analise(conn, 'C7', [top_n_c7])
+    if not df7.empty:
+        fig7 = criar_grafico('C7', relatorios.figura_c7, df7, top_n_c7)
+        st.plotly_chart(fig7, use_container_width=True)
+        with st.expander("Visualizar dados tabulares"): st.dataframe(df7)
+    else: st.warning("Nenhum dado encontrado.")
 
-        st.sidebar.subheader("Filtros da Consulta 8")
+def consulta_8(conn, ano):
+    """Consulta 8: fornecedores com maior volume de despesas."""
+    st.header(f"Consulta 8: Fornecedores com Maior Volume de Despesas em {ano}")
 
-        top_n_c8 = st.sidebar.slider("Quantos fornecedores exibir?", 5, 50, 10)
-        df8 = pd.read_sql_query(f"SELECT F.NM_FORNECEDOR, SUM(D.VR_PAGAMENTO) AS Total FROM Despesa D NATURAL JOIN Fornecedor F WHERE D.DT_PAGAMENTO BETWEEN '2024-01-01' AND '2024-12-31' GROUP BY F.NM_FORNECEDOR ORDER BY Total DESC LIMIT {top_n_c8}", conn)
-        if not df8.empty:
-            fig8 = px.bar(df8, x='Total', y='NM_FORNECEDOR', orientation='h', title=f"Top {top_n_c8} Maiores Despesas por Fornecedor (2024)", labels={'NM_FORNECEDOR': 'Fornecedor', 'Total': 'Despesa Total (R$)'}, text_auto='.2s')
-            fig8.update_layout(yaxis={'categoryorder':'total ascending'})
-            st.plotly_chart(fig8, use_container_width=True)
-            with st.expander("Visualizar dados tabulares"): st.dataframe(df8)
-        else: st.warning("Nenhum dado encontrado.")
+    st.sidebar.subheader("Filtros da Consulta 8")
 
+    top_n_c8 = st.sidebar.slider("Quantos fornecedores exibir?", 5, 50, 10)
+    df8 = executar_analise(conn, 'C8', [str(ano), top_n_c8])
+    if not df8.empty:
+        fig8 = criar_grafico('C8', relatorios.figura_c8, df8, ano, top_n_c8)
+        st.plotly_chart(fig8, use_container_width=True)
+        with st.expander("Visualizar dados tabulares"): st.dataframe(df8)
+    else: st.warning("Nenhum dado encontrado.")
 
-with tabs[8]:
-
+def consulta_9(conn, ano):
+    """Consulta 9: total de despesas por partido no estado e período."""
     st.header("Consulta 9: Total de Despesas por Partido")
     st.markdown("Análise de despesas partidárias, com filtros por estado e período.")
 
     st.sidebar.subheader("Filtros da Consulta 9")
 
-    df_estados_c9 = pd.read_sql_query("SELECT DISTINCT SG_UF FROM Local ORDER BY SG_UF", conn)
+    df_estados_c9 = executar_consulta(conn, "SELECT DISTINCT SG_UF FROM Local ORDER BY SG_UF")
     lista_estados_c9 = df_estados_c9['SG_UF'].tolist()
 
     default_ix_c9 = lista_estados_c9.index('MG') if 'MG' in lista_estados_c9 else 0
@@ -443,7 +945,7 @@ with tabs[8]:
 
     data_selecionada_c9 = st.sidebar.date_input(
         "Selecione o Período:",
-        value=(pd.to_datetime("2024-01-01"), pd.to_datetime("2024-01-31")),
+        value=(pd.to_datetime(f"{ano}-01-01"), pd.to_datetime(f"{ano}-01-31")),
         format="DD/MM/YYYY"
     )
 
@@ -451,41 +953,12 @@ with tabs[8]:
         st.warning("Por favor, selecione um intervalo de datas válido (início e fim).")
     else:
         data_inicio_c9, data_fim_c9 = data_selecionada_c9
-        
-        query9 = """
-            SELECT 
-                Pt.NM_PARTIDO, 
-                SUM(D.VR_PAGAMENTO) AS Total_Despesas
-            FROM 
-                Despesa D 
-                NATURAL JOIN Prestador P 
-                NATURAL JOIN Local L 
-                NATURAL JOIN Partido Pt
-            WHERE 
-                L.SG_UF = ? 
-                AND D.DT_PAGAMENTO BETWEEN ? AND ?
-            GROUP BY 
-                Pt.NM_PARTIDO
-            ORDER BY 
-                Total_Despesas DESC
-        """
-        
+
         params_c9 = [estado_selecionado_c9, data_inicio_c9.strftime('%Y-%m-%d'), data_fim_c9.strftime('%Y-%m-%d')]
-        df9 = pd.read_sql_query(query9, conn, params=params_c9)
+        df9 = executar_analise(conn, 'C9', params_c9)
 
         if not df9.empty:
-
-            titulo_grafico = f"Total de Despesas em {estado_selecionado_c9} ({data_inicio_c9.strftime('%d/%m/%Y')} a {data_fim_c9.strftime('%d/%m/%Y')})"
-            
-            fig9 = px.bar(
-                df9, 
-                x='Total_Despesas', 
-                y='NM_PARTIDO', 
-                orientation='h', 
-                title=titulo_grafico, 
-                labels={'NM_PARTIDO': 'Partido', 'Total_Despesas': 'Total de Despesas (R$)'}
-            )
-            fig9.update_layout(yaxis={'categoryorder': 'total ascending'})
+            fig9 = criar_grafico('C9', relatorios.figura_c9, df9, *params_c9)
             st.plotly_chart(fig9, use_container_width=True)
 
             with st.expander("Visualizar dados tabulares da consulta"):
@@ -493,27 +966,307 @@ with tabs[8]:
         else:
             st.warning("Nenhum dado encontrado para os filtros selecionados.")
 
-    with tabs[9]:
+def consulta_10(conn, ano):
+    """Consulta 10: municípios com maior total de despesas."""
+    st.header(f"Consulta 10: Municípios com Maior Total de Despesas em {ano}")
+
+    st.sidebar.subheader("Filtros da Consulta 10")
+
+    top_n_c10 = st.sidebar.slider("Quantos municípios exibir?", 3, 15, 5)
+    df10 = executar_analise(conn, 'C10', [str(ano), top_n_c10])
+    if not df10.empty:
+        fig10 = criar_grafico('C10', relatorios.figura_c10, df10, ano, top_n_c10)
+        st.plotly_chart(fig10, use_container_width=True)
+        with st.expander("Visualizar dados tabulares"): st.dataframe(df10)
+    else: st.warning("Nenhum dado encontrado.")
+
+def buscar(conn, ano):
+    """Busca textual por fornecedores e municípios, com o total pago por partido e mês do resultado escolhido."""
+    st.header("Busca de Fornecedores e Municípios")
+    texto = st.text_input("Nome ou CPF/CNPJ do fornecedor, ou nome do município", placeholder="Ex.: gráfica, 12345678000190, belo horizonte")
+    termos = dados.termos_busca(texto)
+    if termos is None:
+        st.info("Digite parte de um nome ou de um CPF/CNPJ; cada palavra é buscada como prefixo e os acentos são ignorados.")
+        return
+    try:
+        resultados = executar_consulta(conn, dados.SQL_BUSCA, [termos, dados.LIMITE_BUSCA], nome='Busca')
+    except pd.errors.DatabaseError:
+        st.error("A busca está indisponível: o índice de busca não foi criado nesta carga (o SQLite precisa do módulo FTS5).")
+        return
+    if resultados.empty:
+        st.warning(f"Nenhum fornecedor ou município encontrado para \"{texto}\".")
+        return
+
+    rotulos = [
+        f"Fornecedor: {r.NOME} ({r.DOCUMENTO})" if r.TIPO == 'fornecedor' else f"Município: {r.NOME} - {r.SG_UF}"
+        for r in resultados.itertuples()
+    ]
+    escolhido = st.selectbox(f"{len(resultados)} resultados, do mais ao menos relevante", options=range(len(resultados)), format_func=rotulos.__getitem__)
+    resultado = resultados.iloc[escolhido]
+
+    detalhe = executar_consulta(conn, dados.DETALHES_BUSCA[resultado['TIPO']], [int(resultado['ID'])], nome=f"Busca_{resultado['TIPO']}")
+    if detalhe.empty:
+        st.warning("Nenhuma despesa registrada para o resultado escolhido.")
+        return
+    col1, col2 = st.columns(2)
+    col1.metric("Total pago (R$)", f"{detalhe['VR_TOTAL'].sum():,.2f}")
+    col2.metric("Despesas", f"{detalhe['N_DESPESAS'].sum():,}")
+    fig = criar_grafico('Busca', px.bar, detalhe, x='MES', y='VR_TOTAL', color='SG_PARTIDO', title=f"Total Pago por Partido e Mês - {resultado['NOME']}", labels={'MES': 'Mês', 'VR_TOTAL': 'Total Pago (R$)', 'SG_PARTIDO': 'Partido'})
+    st.plotly_chart(fig, use_container_width=True)
+    with st.expander("Visualizar dados tabulares"):
+        st.dataframe(detalhe.pivot_table(index='SG_PARTIDO', columns='MES', values='VR_TOTAL', aggfunc='sum', fill_value=0))
+
+def comparar_eleicoes(conn, ano):
+    """Comparação entre eleições: total pago, número de despesas e valor médio por partido ou UF em cada ano.
+
+    Os bancos dos outros anos são anexados à conexão só durante a consulta, que lê o resumo diário
+    de cada um numa única instrução.
+    """
+    st.header("Comparação entre Eleições")
+
+    st.sidebar.subheader("Filtros da Comparação")
+
+    cargas = obter_cargas()
+    anos = st.sidebar.multiselect("Eleições comparadas:", options=list(cargas), default=list(cargas))
+    agrupamento = st.sidebar.radio("Agrupar por:", options=list(dados.COLUNAS_COMPARACAO))
+    medidas = {'Total Pago (R$)': 'VR_TOTAL', 'Número de Despesas': 'N_DESPESAS', 'Valor Médio (R$)': 'VR_MEDIO'}
+    medida = st.sidebar.radio("Medida:", options=list(medidas))
+
+    caminhos = {}
+    for ano_comparado in anos:
+        cargas[ano_comparado].iniciar()  # Um ano ainda não consultado começa a ser carregado aqui
+        pool = cargas[ano_comparado].atual()[0]
+        if pool is not None:
+            caminhos[ano_comparado] = pool.caminho
+        else:
+            st.info(f"Os dados de {ano_comparado} estão sendo carregados; o ano entra na comparação assim que a carga terminar.")
+    if not caminhos:
+        st.warning("Por favor, selecione ao menos uma eleição com os dados já carregados.")
+        return
+
+    coluna = dados.COLUNAS_COMPARACAO[agrupamento]
+    with dados.anexar_bancos(conn, caminhos) as esquemas:
+        df = executar_consulta(conn, dados.montar_comparacao(esquemas.values(), coluna), [str(a) for a in esquemas], nome='Comparacao')
+    if df.empty:
+        st.warning("Nenhum dado encontrado para as eleições selecionadas.")
+        return
+    with medir('agregacao', consulta='Comparacao'):
+        df = df.assign(VR_MEDIO=df['VR_TOTAL'] / df['N_DESPESAS'])
+        tabela = df.pivot_table(index=coluna, columns='ANO', values=medidas[medida], aggfunc='sum')
+
+    fig = criar_grafico('Comparacao', px.bar,
+        df,
+        x=coluna,
+        y=medidas[medida],
+        color='ANO',
+        barmode='group',
+        title=f"{medida} por {agrupamento} em cada Eleição",
+        labels={coluna: agrupamento, medidas[medida]: medida, 'ANO': 'Eleição'}
+    )
+    fig.update_layout(xaxis={'categoryorder': 'total descending'})
+    st.plotly_chart(fig, use_container_width=True)
 
-        st.header("Consulta 10: Municípios com Maior Total de Despesas em 2024")
+    with st.expander("Visualizar dados tabulares da comparação"):
+        st.dataframe(tabela)
 
-        st.sidebar.subheader("Filtros da Consulta 10")
+def explorar_tabelas(conn, ano):
+    """Explorador das tabelas do banco de dados, paginado e ordenado no servidor."""
+    st.header("Explorador de Tabelas do Banco de Dados")
+    tabela_selecionada = st.selectbox("Selecione uma tabela para explorar", options=list(dados.TABELAS))
+    colunas = dados.TABELAS[tabela_selecionada][0]
 
-        top_n_c10 = st.sidebar.slider("Quantos municípios exibir?", 3, 15, 5)
-        df10 = pd.read_sql_query(f"SELECT L.NM_MUNICIPIO, SUM(D.VR_PAGAMENTO) AS Total FROM Despesa D NATURAL JOIN Prestador P NATURAL JOIN Local L WHERE D.DT_PAGAMENTO BETWEEN '2024-01-01' AND '2024-12-31' GROUP BY L.NM_MUNICIPIO ORDER BY Total DESC LIMIT {top_n_c10}", conn)
-        if not df10.empty:
-            fig10 = px.pie(df10, values='Total', names='NM_MUNICIPIO', title=f'Distribuição de Despesas entre os Top {top_n_c10} Municípios (2024)')
-            st.plotly_chart(fig10, use_container_width=True)
-            with st.expander("Visualizar dados tabulares"): st.dataframe(df10)
-        else: st.warning("Nenhum dado encontrado.")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        # Só as colunas com índice: as demais exigiriam ordenar a tabela inteira a cada página
+        chaves = dados.chaves_ordenacao(conn, tabela_selecionada)
+        coluna_ordem = st.selectbox("Ordenar por", options=['(ordem de carga)'] + list(chaves))
+    with col2:
+        tamanho = st.selectbox("Linhas por página", options=TAMANHOS_PAGINA, index=1)
+    with col3:
+        decrescente = st.checkbox("Ordem decrescente")
+
+    col4, col5, col6 = st.columns(3)
+    with col4:
+        coluna_filtro = st.selectbox("Filtrar pela coluna", options=['(nenhuma)'] + colunas)
+    with col5:
+        operador = st.selectbox("Operador", options=['contém', 'igual a'])
+    with col6:
+        valor_filtro = st.text_input("Valor do filtro")
+    filtro = (coluna_filtro, operador, valor_filtro) if coluna_filtro != '(nenhuma)' and valor_filtro else None
+
+    chave = ['rowid'] if coluna_ordem == '(ordem de carga)' else chaves[coluna_ordem]
+    # A pilha guarda o cursor inicial de cada página visitada e recomeça quando os filtros mudam
+    assinatura = (tabela_selecionada, tuple(chave), decrescente, tamanho, filtro)
+    estado = st.session_state.setdefault('explorador', {})
+    if estado.get('assinatura') != assinatura:
+        estado.update(assinatura=assinatura, pilha=[None])
+    pilha = estado['pilha']
+
+    partes = []
+    for sql, params in consultas_pagina(tabela_selecionada, chave, decrescente, filtro, pilha[-1], tamanho):
+        partes.append(executar_consulta(conn, sql, params))
+        if sum(len(parte) for parte in partes) > tamanho:
+            break
+    pagina = pd.concat([parte for parte in partes if len(parte)] or partes[:1], ignore_index=True).head(tamanho + 1)
+    ha_proxima = len(pagina) > tamanho
+    pagina = pagina.head(tamanho)
+
+    if filtro is None:
+        total = (dados.ler_manifesto(dados.ARQUIVO_DB.format(ano=ano)) or {}).get('contagens', {}).get(tabela_selecionada)
+    else:
+        condicao, params_total = condicao_filtro(filtro)
+        total = int(executar_consulta(conn, f"SELECT COUNT(*) AS n FROM {tabela_selecionada} WHERE {condicao}", params_total)['n'].iloc[0])
+
+    st.dataframe(pagina.drop(columns='_rowid'), hide_index=True)
+
+    nav1, nav2, nav3 = st.columns([1, 1, 4])
+    with nav1:
+        if st.button("Anterior", disabled=len(pilha) == 1):
+            pilha.pop()
+            st.rerun()
+    with nav2:
+        if st.button("Próxima", disabled=not ha_proxima):
+            pilha.append(next(dados.registros(pagina[[coluna if coluna != 'rowid' else '_rowid' for coluna in chave]].tail(1))))
+            st.rerun()
+    with nav3:
+        if total is not None:
+            st.caption(f"Página {len(pilha)} de {max(math.ceil(total / tamanho), 1)}")
+
+    if filtro is not None:
+        st.info(f"Registros da tabela `{tabela_selecionada}` que atendem ao filtro: {total}")
+    elif total is not None:
+        st.info(f"Total de registros na tabela `{tabela_selecionada}`: {total}")
+
+def resumir_medicoes(medicoes):
+    """Agrega as medições por visão, consulta e etapa com contagem, percentis e taxa de acerto do cache."""
+    df = pd.DataFrame(list(medicoes))
+    for coluna in ('visao', 'consulta', 'fase', 'linhas', 'cache'):
+        if coluna not in df:
+            df[coluna] = None
+    df['ms'] = df['segundos'] * 1000
+    df['cache'] = df['cache'].astype(float)
+    chaves = ['visao', 'consulta', 'etapa']
+    df[chaves] = df[chaves].fillna('-')
+    df.loc[df['etapa'] == 'etl', 'consulta'] = df['fase']
+    return df.groupby(chaves).agg(
+        execucoes=('ms', 'size'),
+        p50_ms=('ms', 'median'),
+        p95_ms=('ms', lambda ms: ms.quantile(0.95)),
+        max_ms=('ms', 'max'),
+        linhas_media=('linhas', 'mean'),
+        taxa_cache=('cache', 'mean'),
+    ).reset_index().sort_values('p95_ms', ascending=False)
+
+def diagnostico(conn, ano):
+    """Tempos medidos das consultas, do pós-processamento, dos gráficos e das etapas da carga."""
+    st.header("Diagnóstico de Desempenho")
+
+    manifesto = dados.ler_manifesto(dados.ARQUIVO_DB.format(ano=ano)) or {}
+    etapas = manifesto.get('etapas')
+    if etapas:
+        st.subheader("Última carga dos dados")
+        st.dataframe(pd.DataFrame({'Etapa': list(etapas), 'Segundos': list(etapas.values())}), hide_index=True)
+    validacao = manifesto.get('validacao')
+    if validacao:
+        st.subheader("Validação da última carga")
+        quarentena = validacao['quarentena']
+        st.dataframe(pd.DataFrame({
+            'Motivo': [{**dados.MOTIVOS_REJEICAO, **dados.MOTIVOS_ALERTA}.get(motivo, motivo) for motivo in quarentena],
+            'Linhas em quarentena': list(quarentena.values()),
+        }), hide_index=True)
+        st.info(f"{validacao['atipicas']:,} pagamentos fora da faixa típica do partido e da UF (visão Despesa_Atipica).")
+
+    escopo = st.radio("Medições", options=['Esta sessão', 'Todas as sessões'], horizontal=True)
+    medicoes = list(st.session_state.get('medicoes', [])) if escopo == 'Esta sessão' else list(obter_medicoes())
+    if not medicoes:
+        st.info("Nenhuma medição registrada ainda. Navegue pelas análises para coletar tempos.")
+        return
+
+    st.subheader("Resumo por consulta")
+    st.dataframe(resumir_medicoes(medicoes), hide_index=True)
+    st.subheader("Medições mais recentes")
+    st.dataframe(pd.DataFrame(medicoes[::-1][:200]), hide_index=True)
+    st.download_button(
+        "Exportar medições (JSON Lines)",
+        data='\n'.join(json.dumps(m, ensure_ascii=False, default=str) for m in medicoes) + '\n',
+        file_name='medicoes_desempenho.jsonl',
+        mime='application/x-ndjson',
+    )
 
-    # --- Aba 11: Explorador de Tabelas ---
-    with tabs[10]:
-        st.header("Explorador de Tabelas do Banco de Dados")
-        tabela_selecionada = st.selectbox("Selecione uma tabela para explorar", options=['Local', 'Partido', 'Fornecedor', 'Prestador', 'Documento', 'Despesa'])
-        if tabela_selecionada:
-            df_tabela = pd.read_sql_query(f"SELECT * FROM {tabela_selecionada}", conn)
-            st.dataframe(df_tabela)
-            st.info(f"Total de registros na tabela `{tabela_selecionada}`: {len(df_tabela)}")
-        else:
-            st.error("A conexão com o banco de dados falhou. A aplicação não pode ser exibida.")
\ No newline at end of file
+# Cada visão só executa sua consulta, seus filtros e seu gráfico quando está selecionada
+VISOES = {
+    "C1: Partidos e Fornecedores": consulta_1,
+    "C2: Prestadores por UF": consulta_2,
+    "C3: Despesa por Tipo Fornecedor": consulta_3,
+    "C4: Prestadores por Partido (BR)": consulta_4,
+    "C5: Top Municípios (Prestadores)": consulta_5,
+    "C6: Gasto Médio por Partido": consulta_6,
+    "C7: Contratos por Partido": consulta_7,
+    "C8: Maiores Despesas (Fornecedor)": consulta_8,
+    "C9: Despesas em MG (Janeiro)": consulta_9,
+    "C10: Top Municípios (Despesa)": consulta_10,
+    "Busca": buscar,
+    "Comparar Eleições": comparar_eleicoes,
+    "Explorar Tabelas": explorar_tabelas,
+}
+if PAINEL_DIAGNOSTICO:
+    VISOES["Diagnóstico"] = diagnostico
+
+# O Streamlit executa o script como __main__; os processos de leitura de dados.processar_em_paralelo
+# o importam como __mp_main__ e não devem carregar o banco nem montar a página
+if __name__ == '__main__':
+    configurar_avisos()
+    st.set_page_config(layout="wide")
+    if MOTOR_CONSULTAS not in MOTORES_CONSULTA:
+        st.error(f"Valor inválido na variável de ambiente MOTOR_CONSULTAS: '{MOTOR_CONSULTAS}'. Use {' ou '.join(MOTORES_CONSULTA)}.")
+        st.stop()
+    if PAINEL_DIAGNOSTICO is None:
+        st.error(f"Valor inválido na variável de ambiente PAINEL_DIAGNOSTICO: '{os.environ['PAINEL_DIAGNOSTICO']}'. Use {', '.join(VALORES_OPCAO)}.")
+        st.stop()
+
+    st.sidebar.title("Painel de Controle e Filtros")
+    cargas = obter_cargas()
+    ano = st.sidebar.selectbox("Eleição", options=list(cargas))
+    carga = cargas[ano]
+    carga.iniciar()
+    pool, versao = carga.atual()
+    # Só as entradas do cache que leem uma versão substituída são descartadas, de qualquer ano
+    versoes = [c.atual()[1] for c in cargas.values()]
+    obter_cache_consultas().definir_versoes(v for v in versoes if v is not None)
+    if MOTOR_CONSULTAS == 'parquet' and not colunar.disponivel():
+        st.warning("O motor Parquet exige o pacote pyarrow; as consultas usarão o SQLite.")
+
+    st.title(f"Análise Interativa de Prestações de Contas Eleitorais - {ano}")
+    st.markdown("Escolha uma das análises abaixo para explorar as despesas políticas sob diversas perspectivas. Use o **Painel de Controle** na barra lateral para aplicar filtros.")
+
+    estatisticas_cache = obter_cache_consultas().estatisticas()
+    st.sidebar.caption(
+        f"Cache de consultas: {estatisticas_cache['acertos']} acertos, {estatisticas_cache['falhas']} falhas, "
+        f"{estatisticas_cache['entradas']} entradas ({estatisticas_cache['bytes'] / (1 << 20):.1f} MB)"
+    )
+    with st.sidebar:
+        if carga.progresso is not None:
+            st.subheader(f"Carga dos dados de {ano}")
+            exibir_progresso(carga, versao)
+        elif carga.avisos.mensagens:
+            with st.expander("Mensagens da última carga dos dados"):
+                exibir_avisos(list(carga.avisos.mensagens))
+        # As linhas rejeitadas na validação não entram em nenhuma análise; o total fica sempre visível
+        validacao = (dados.ler_manifesto(dados.ARQUIVO_DB.format(ano=ano)) or {}).get('validacao') or {}
+        if validacao.get('excluidas'):
+            st.caption(
+                f"{validacao['excluidas']:,} linhas do arquivo de {ano} ficaram fora das análises por dados "
+                "ausentes, inválidos ou repetidos (tabela Quarentena)."
+            )
+
+    if pool is not None:
+        visao_selecionada = st.radio("Análise", options=list(VISOES), horizontal=True, label_visibility="collapsed")
+        # Cada execução do script agrupa as medições de uma interação do usuário
+        st.session_state['execucao_medicao'] = st.session_state.get('execucao_medicao', 0) + 1
+        st.session_state['visao_medicao'] = visao_selecionada
+        with medir('visao', ano=ano), pool.conexao() as conn:
+            VISOES[visao_selecionada](conn, ano)
+    elif carga.progresso is not None:
+        st.info(f"Os dados de {ano} estão sendo carregados pela primeira vez; as análises aparecem assim que a carga terminar.")
+    else:
+        st.error("A conexão com o banco de dados falhou. A aplicação não pode ser exibida.")
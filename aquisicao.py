@@ -0,0 +1,191 @@
+"""Aquisição do arquivo de dados: caminho local, URL file://, http(s):// ou do Google Drive.
+
+Downloads HTTP são gravados num arquivo .part e, se interrompidos, retomados de onde pararam com
+um pedido Range, inclusive numa execução seguinte. O arquivo obtido pode ser o CSV do TSE ou o
+.zip em que o TSE o distribui; do .zip, o CSV é lido em fluxo, sem ser extraído para o disco.
+Como dados.py, não depende do Streamlit e registra o andamento no logger do módulo.
+"""
+import hashlib
+import http.client
+import logging
+import os
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import zipfile
+from contextlib import contextmanager
+
+import gdown
+
+log = logging.getLogger(__name__)
+
+# Tamanho de cada leitura da resposta HTTP e do arquivo no cálculo do hash
+TAMANHO_PEDACO = 1 << 20
+# Tentativas de download; cada uma retoma o arquivo parcial deixado pela anterior
+TENTATIVAS = 3
+# Tempo máximo (em segundos) de espera por uma resposta da origem
+TEMPO_LIMITE = 60
+# Hosts servidos pelo gdown, que trata a página de confirmação dos arquivos grandes do Drive
+HOSTS_GDOWN = {'drive.google.com', 'docs.google.com'}
+# CSV lido de dentro do .zip do TSE, que traz um arquivo por UF e um com o Brasil inteiro
+MEMBRO_ZIP = re.compile(r'_BRASIL\.csv$', re.IGNORECASE)
+
+class ErroAquisicao(Exception):
+    """Falha ao obter ou conferir o arquivo de dados."""
+
+def _tipo(origem):
+    """Classifica a origem em 'local', 'gdown' ou 'http' e devolve o caminho ou a URL a usar."""
+    partes = urllib.parse.urlsplit(origem)
+    if partes.scheme == 'file':
+        return 'local', urllib.request.url2pathname(partes.path)
+    if partes.scheme in ('http', 'https'):
+        return ('gdown' if partes.hostname in HOSTS_GDOWN else 'http'), origem
+    return 'local', origem
+
+def consultar(origem):
+    """Identifica a versão da origem sem baixá-la (ETag e tamanho); None se ela não responder.
+
+    Num arquivo local, a data de modificação e o tamanho fazem o papel da ETag.
+    """
+    tipo, alvo = _tipo(origem)
+    if tipo == 'local':
+        try:
+            info = os.stat(alvo)
+        except OSError:
+            return None
+        return {'etag': f"{info.st_mtime_ns}-{info.st_size}", 'tamanho': info.st_size}
+    try:
+        with urllib.request.urlopen(urllib.request.Request(alvo, method='HEAD'), timeout=TEMPO_LIMITE) as resposta:
+            tamanho = resposta.headers.get('Content-Length')
+            return {'etag': resposta.headers.get('ETag'), 'tamanho': int(tamanho) if tamanho else None}
+    except Exception:
+        return None
+
+def destino_para(origem, destino):
+    """Arquivo em que a origem é gravada: destino, com a extensão .zip se a origem for um .zip."""
+    if urllib.parse.urlsplit(origem).path.lower().endswith('.zip'):
+        return os.path.splitext(destino)[0] + '.zip'
+    return destino
+
+def obter(origem, destino):
+    """Disponibiliza a origem como um arquivo local e devolve o caminho dele.
+
+    Arquivos locais são usados onde estão, sem cópia. Levanta ErroAquisicao se o download falhar.
+    """
+    tipo, alvo = _tipo(origem)
+    if tipo == 'local':
+        if not os.path.isfile(alvo):
+            raise ErroAquisicao(f"arquivo não encontrado: {alvo}")
+        return alvo
+    destino = destino_para(origem, destino)
+    inicio = time.perf_counter()
+    log.info("Iniciando o download do arquivo de dados. Isso pode levar um momento.")
+    if tipo == 'gdown':
+        if not gdown.download(alvo, destino, quiet=True, resume=True) or not os.path.exists(destino):
+            raise ErroAquisicao(f"falha ao baixar {origem}")
+    else:
+        baixar_http(alvo, destino)
+    log.info(f"Arquivo de dados baixado: {os.path.getsize(destino) / (1 << 20):,.1f} MB em {time.perf_counter() - inicio:.1f} s")
+    return destino
+
+def baixar_http(url, destino):
+    """Baixa a URL em destino + '.part', retomando o arquivo parcial, e o renomeia para destino ao final.
+
+    A ETag da resposta fica ao lado do arquivo parcial e vai no If-Range dos pedidos seguintes: se o
+    arquivo mudou na origem, ela responde com o conteúdo inteiro e o download recomeça do zero.
+    """
+    parcial = destino + '.part'
+    arquivo_etag = parcial + '.etag'
+    for tentativa in range(1, TENTATIVAS + 1):
+        inicio = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+        pedido = urllib.request.Request(url)
+        if inicio:
+            pedido.add_header('Range', f"bytes={inicio}-")
+            if os.path.exists(arquivo_etag):
+                with open(arquivo_etag, encoding='utf-8') as arquivo:
+                    pedido.add_header('If-Range', arquivo.read())
+        try:
+            with urllib.request.urlopen(pedido, timeout=TEMPO_LIMITE) as resposta:
+                retomado = resposta.status == 206
+                total = _tamanho_total(resposta, inicio if retomado else 0)
+                if inicio:
+                    log.info(
+                        f"Download retomado a partir de {inicio / (1 << 20):,.1f} MB" if retomado
+                        else "A origem não aceitou retomar o download; recomeçando do início"
+                    )
+                etag = resposta.headers.get('ETag')
+                if etag:
+                    with open(arquivo_etag, 'w', encoding='utf-8') as arquivo:
+                        arquivo.write(etag)
+                with open(parcial, 'ab' if retomado else 'wb') as arquivo:
+                    for pedaco in iter(lambda: resposta.read(TAMANHO_PEDACO), b''):
+                        arquivo.write(pedaco)
+            recebido = os.path.getsize(parcial)
+            if total is not None and recebido != total:
+                raise ErroAquisicao(f"download incompleto: {recebido} de {total} bytes")
+            os.replace(parcial, destino)
+            if os.path.exists(arquivo_etag):
+                os.remove(arquivo_etag)
+            return
+        except urllib.error.HTTPError as e:
+            if e.code != 416:
+                raise ErroAquisicao(f"a origem respondeu {e.code} {e.reason}") from e
+            os.remove(parcial)  # Range inválido: o arquivo parcial não corresponde mais à origem
+            erro = e
+        except (OSError, http.client.HTTPException, ErroAquisicao) as e:
+            erro = e
+        log.warning(f"Download interrompido (tentativa {tentativa} de {TENTATIVAS}): {erro}")
+    raise ErroAquisicao(f"download não concluído após {TENTATIVAS} tentativas: {erro}")
+
+def _tamanho_total(resposta, inicio):
+    """Tamanho final esperado do arquivo, a partir do Content-Range ou do Content-Length."""
+    faixa = resposta.headers.get('Content-Range')
+    if faixa and '/' in faixa and not faixa.endswith('/*'):
+        return int(faixa.rsplit('/', 1)[1])
+    tamanho = resposta.headers.get('Content-Length')
+    return inicio + int(tamanho) if tamanho else None
+
+def calcular_hash(caminho, tamanho_bloco=TAMANHO_PEDACO):
+    """Calcula o SHA-256 de um arquivo lendo-o em blocos."""
+    sha = hashlib.sha256()
+    with open(caminho, 'rb') as arquivo:
+        for bloco in iter(lambda: arquivo.read(tamanho_bloco), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def verificar(caminho, sha256_esperado=None):
+    """Calcula o SHA-256 do arquivo e o confere com o esperado, se informado, antes da ingestão."""
+    sha256 = calcular_hash(caminho)
+    if sha256_esperado and sha256 != sha256_esperado.strip().lower():
+        raise ErroAquisicao(f"SHA-256 de {caminho} é {sha256}, diferente do esperado {sha256_esperado}")
+    if compactado(caminho):
+        _membro_csv(caminho)  # Confere já aqui que o .zip traz o CSV esperado
+    return sha256
+
+def compactado(caminho):
+    """Indica se o arquivo obtido é um .zip."""
+    return zipfile.is_zipfile(caminho)
+
+def _membro_csv(caminho):
+    """Nome do CSV a ler de dentro do .zip: o do Brasil inteiro ou o único CSV do arquivo."""
+    with zipfile.ZipFile(caminho) as arquivo_zip:
+        csvs = [nome for nome in arquivo_zip.namelist() if nome.lower().endswith('.csv')]
+    membros = [nome for nome in csvs if MEMBRO_ZIP.search(nome)] or csvs
+    if len(membros) != 1:
+        raise ErroAquisicao(f"o arquivo {caminho} não tem um único CSV a carregar: {membros}")
+    return membros[0]
+
+@contextmanager
+def abrir_csv(caminho):
+    """Abre o CSV para leitura binária em fluxo, direto do .zip quando o arquivo é compactado.
+
+    O zipfile confere o CRC de cada membro ao terminar de lê-lo.
+    """
+    if not compactado(caminho):
+        with open(caminho, 'rb') as arquivo:
+            yield arquivo
+        return
+    with zipfile.ZipFile(caminho) as arquivo_zip, arquivo_zip.open(_membro_csv(caminho)) as membro:
+        yield membro
@@ -0,0 +1,357 @@
+"""Benchmark reprodutível da ingestão e das consultas, sobre dados sintéticos no formato do TSE.
+
+Gera arquivos `despesa_anual` com as mesmas colunas, codificação (ISO-8859-1), separador `;`,
+aspas e marcadores `#NULO#` do arquivo original, com cardinalidades próximas das reais
+(municípios, partidos, diretórios e fornecedores concentrados em poucos grandes contratados).
+Para cada escala, mede em um processo separado as etapas da ingestão e cada consulta do painel
+(SQL e agregação em pandas separadas), e acrescenta uma linha JSON ao arquivo de resultados.
+
+    python benchmark.py --linhas 100000 1000000 --repeticoes 5
+    python benchmark.py --comparar resultados_benchmark.jsonl
+"""
+import argparse
+import concurrent.futures
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sqlite3
+import subprocess
+import time
+
+import numpy as np
+import pandas as pd
+
+import colunar
+import dados
+
+# Diretório dos CSVs e bancos gerados (reaproveitados entre execuções com a mesma escala e semente)
+DIRETORIO_BENCHMARK = 'benchmark_dados'
+# Arquivo de resultados, uma linha JSON por escala medida
+ARQUIVO_RESULTADOS = 'resultados_benchmark.jsonl'
+# Linhas geradas por vez na escrita do CSV sintético
+TAMANHO_BLOCO_GERACAO = 500_000
+
+# Colunas na ordem do arquivo do TSE; as três primeiras não são usadas pelo painel, mas são lidas
+COLUNAS_CSV = [
+    'DT_GERACAO', 'HH_GERACAO', 'AA_EXERCICIO',
+    'CD_MUNICIPIO', 'NM_MUNICIPIO', 'SG_UF', 'SG_PARTIDO', 'NM_PARTIDO', 'DS_TP_ESFERA_PARTIDARIA',
+    'NR_CNPJ_PRESTADOR_CONTA', 'NR_CPF_CNPJ_FORNECEDOR', 'NM_FORNECEDOR', 'DS_TP_FORNECEDOR',
+    'NR_DOCUMENTO', 'CD_TP_DOCUMENTO', 'DS_TP_DOCUMENTO', 'DT_PAGAMENTO', 'VR_PAGAMENTO',
+]
+UFS = [
+    'AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA',
+    'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO',
+]
+N_MUNICIPIOS = 5570
+N_PARTIDOS = 29
+TIPOS_DOCUMENTO = ['Nota Fiscal', 'Recibo', 'Fatura', 'Boleto', 'Contrato']
+
+# Agregações em pandas feitas pelo painel sobre o resultado do SQL, medidas à parte
+AGREGACOES = {
+    'C1': dados.top_fornecedores,
+    'C2': lambda df: dados.prestadores_por_partido(df[df['SG_UF'] == 'SP']),
+}
+
+def _digitos(numeros, n):
+    """Matriz (len(numeros), n) com os dígitos decimais de cada número."""
+    return (numeros[:, None] // 10 ** np.arange(n - 1, -1, -1)) % 10
+
+def _com_verificadores(base, n, pesos1, pesos2):
+    """Acrescenta os dois dígitos verificadores (módulo 11) a números-base de n dígitos."""
+    digitos = _digitos(base, n)
+    resto = (digitos * pesos1).sum(axis=1) % 11
+    dv1 = np.where(resto < 2, 0, 11 - resto)
+    digitos = np.column_stack([digitos, dv1])
+    resto = (digitos * pesos2).sum(axis=1) % 11
+    dv2 = np.where(resto < 2, 0, 11 - resto)
+    return base * 100 + dv1 * 10 + dv2
+
+def _distintos(rng, n, digitos):
+    """n números distintos de até `digitos` dígitos, embaralhados sem materializar todo o intervalo."""
+    # Multiplicar por um número primo com 10 é uma bijeção módulo 10**digitos
+    return (np.arange(n, dtype=np.int64) * 7_919_993 + int(rng.integers(10 ** digitos))) % 10 ** digitos
+
+def gerar_cnpjs(rng, n):
+    """Gera n CNPJs distintos com dígitos verificadores válidos, como texto de 14 dígitos."""
+    base = _distintos(rng, n, 8) * 10 ** 4 + 1  # filial 0001
+    pesos1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+    pesos2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+    return pd.Series(_com_verificadores(base, 12, pesos1, pesos2)).astype(str).str.zfill(14).to_numpy()
+
+def gerar_cpfs(rng, n):
+    """Gera n CPFs distintos com dígitos verificadores válidos, como texto de 11 dígitos."""
+    base = _distintos(rng, n, 9)
+    return pd.Series(_com_verificadores(base, 9, np.arange(10, 1, -1), np.arange(11, 1, -1))).astype(str).str.zfill(11).to_numpy()
+
+def gerar_csv(caminho, linhas, semente=0):
+    """Grava um CSV sintético de despesas com `linhas` registros, em blocos de memória limitada.
+
+    Diretórios partidários e fornecedores crescem com o número de linhas; os fornecedores seguem
+    uma distribuição de Zipf, como no arquivo real, em que poucos contratados concentram os pagamentos.
+    """
+    rng = np.random.default_rng(semente)
+    uf_municipio = rng.integers(0, len(UFS), N_MUNICIPIOS)
+    nomes_municipio = np.array([f"MUNICÍPIO {i} {UFS[uf]}" for i, uf in enumerate(uf_municipio)])
+    siglas = np.array([f"P{i:02d}" for i in range(N_PARTIDOS)])
+    nomes_partido = np.array([f"PARTIDO DA AÇÃO {i}" for i in range(N_PARTIDOS)])
+    # A esfera é do partido (a tabela Partido guarda uma por sigla), alternada para que todas tenham partidos
+    esfera = np.array(['Nacional', 'Estadual', 'Municipal'])[np.arange(N_PARTIDOS) % 3]
+
+    # Diretórios: um nacional por partido, um estadual por partido e UF, e os municipais
+    n_municipais = max(1, min(linhas // 20, N_PARTIDOS * N_MUNICIPIOS))
+    n_prestadores = N_PARTIDOS + N_PARTIDOS * len(UFS) + n_municipais
+    partido_prestador = np.concatenate([
+        np.arange(N_PARTIDOS), np.repeat(np.arange(N_PARTIDOS), len(UFS)), rng.integers(0, N_PARTIDOS, n_municipais)])
+    municipio_prestador = np.concatenate([
+        np.full(N_PARTIDOS + N_PARTIDOS * len(UFS), -1), rng.integers(0, N_MUNICIPIOS, n_municipais)])
+    uf_prestador = np.concatenate([
+        np.full(N_PARTIDOS, UFS.index('DF')), np.tile(np.arange(len(UFS)), N_PARTIDOS), uf_municipio[municipio_prestador[-n_municipais:]]])
+    cnpj_prestador = gerar_cnpjs(rng, n_prestadores)
+
+    n_fornecedores = max(1, linhas // 8)
+    pessoa_fisica = rng.random(n_fornecedores) < 0.3
+    documento_fornecedor = np.where(pessoa_fisica, '', gerar_cnpjs(rng, n_fornecedores))
+    documento_fornecedor[pessoa_fisica] = gerar_cpfs(rng, int(pessoa_fisica.sum()))
+    tipo_fornecedor = np.where(pessoa_fisica, 'PESSOA FÍSICA', 'PESSOA JURÍDICA')
+    nome_fornecedor = np.array([f"FORNECEDOR {i} LTDA" for i in range(n_fornecedores)], dtype=object)
+    nome_fornecedor[rng.random(n_fornecedores) < 0.01] = '#NULO#'
+    # Os fornecedores mais frequentes da distribuição de Zipf ficam espalhados entre os ids
+    ordem_fornecedores = rng.permutation(n_fornecedores)
+
+    escritas = 0
+    with open(caminho, 'w', encoding='ISO-8859-1', newline='') as arquivo:
+        while escritas < linhas:
+            n = min(TAMANHO_BLOCO_GERACAO, linhas - escritas)
+            prestador = rng.integers(0, n_prestadores, n)
+            fornecedor = ordem_fornecedores[(rng.zipf(1.3, n) - 1) % n_fornecedores]
+            municipio = municipio_prestador[prestador]
+            partido = partido_prestador[prestador]
+            tipo_documento = rng.integers(0, len(TIPOS_DOCUMENTO), n)
+            datas = np.datetime64('2024-01-01') + rng.integers(0, 366, n)
+            valores = np.round(rng.lognormal(7, 1.6, n), 2)
+            bloco = pd.DataFrame({
+                'DT_GERACAO': '15/01/2025', 'HH_GERACAO': '08:00:00', 'AA_EXERCICIO': '2024',
+                'CD_MUNICIPIO': np.where(municipio < 0, -1, municipio + 1000),
+                'NM_MUNICIPIO': np.where(municipio < 0, '#NULO#', nomes_municipio[municipio]),
+                'SG_UF': np.array(UFS)[uf_prestador[prestador]],
+                'SG_PARTIDO': siglas[partido],
+                'NM_PARTIDO': nomes_partido[partido],
+                'DS_TP_ESFERA_PARTIDARIA': esfera[partido],
+                'NR_CNPJ_PRESTADOR_CONTA': cnpj_prestador[prestador],
+                'NR_CPF_CNPJ_FORNECEDOR': documento_fornecedor[fornecedor],
+                'NM_FORNECEDOR': nome_fornecedor[fornecedor],
+                'DS_TP_FORNECEDOR': tipo_fornecedor[fornecedor],
+                'NR_DOCUMENTO': rng.integers(1, 10 ** 6, n).astype(str),
+                'CD_TP_DOCUMENTO': tipo_documento + 1,
+                'DS_TP_DOCUMENTO': np.array(TIPOS_DOCUMENTO)[tipo_documento],
+                'DT_PAGAMENTO': pd.to_datetime(datas).strftime('%d/%m/%Y'),
+                'VR_PAGAMENTO': pd.Series(valores).map('{:.2f}'.format).str.replace('.', ',', regex=False),
+            }, columns=COLUNAS_CSV)
+            bloco.to_csv(arquivo, sep=';', index=False, header=escritas == 0, quoting=csv.QUOTE_ALL)
+            escritas += n
+
+def obter_csv(diretorio, linhas, semente):
+    """Caminho do CSV sintético da escala, gerando-o apenas se ainda não existir."""
+    os.makedirs(diretorio, exist_ok=True)
+    caminho = os.path.join(diretorio, f"despesa_anual_{linhas}_s{semente}.csv")
+    if not os.path.exists(caminho):
+        gerar_csv(caminho + '.tmp', linhas, semente)
+        os.replace(caminho + '.tmp', caminho)
+    return caminho
+
+def cronometrar_blocos(blocos, tempos):
+    """Repassa os blocos acumulando em tempos['leitura'] o tempo gasto para obtê-los."""
+    blocos = iter(blocos)
+    while True:
+        inicio = time.perf_counter()
+        try:
+            bloco = next(blocos)
+        except StopIteration:
+            return
+        finally:
+            tempos['leitura'] += time.perf_counter() - inicio
+        yield bloco
+
+def resumir_latencias(amostras):
+    """Percentis e extremos de uma lista de latências em segundos, convertidos para milissegundos."""
+    ms = np.array(amostras) * 1000
+    return {
+        'p50_ms': float(np.percentile(ms, 50)), 'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)), 'min_ms': float(ms.min()), 'max_ms': float(ms.max()),
+    }
+
+def medir_consultas(executar, repeticoes):
+    """Mede cada consulta de PARAMETROS_VERIFICACAO: a primeira execução à parte e as repetições seguintes.
+
+    Uma consulta sem resultado não mede nada de útil (nem a agregação em pandas) e interrompe o benchmark.
+    """
+    resultados = {}
+    for nome, parametros in dados.PARAMETROS_VERIFICACAO.items():
+        inicio = time.perf_counter()
+        df = executar(nome, parametros)
+        primeira = time.perf_counter() - inicio
+        if df.empty:
+            raise RuntimeError(f"A consulta {nome} não retornou linhas com os parâmetros {parametros}; confira os dados sintéticos.")
+        amostras = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            df = executar(nome, parametros)
+            amostras.append(time.perf_counter() - inicio)
+        resultado = {'linhas': len(df), 'primeira_ms': primeira * 1000, **resumir_latencias(amostras)}
+        if nome in AGREGACOES:
+            amostras = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                AGREGACOES[nome](df)
+                amostras.append(time.perf_counter() - inicio)
+            resultado['agregacao'] = resumir_latencias(amostras)
+        resultados[nome] = resultado
+    return resultados
+
+def medir_escala(diretorio, linhas, semente, repeticoes, motores, tamanho_bloco, processos):
+    """Gera (ou reaproveita) o CSV da escala, mede a ingestão e as consultas e retorna o registro."""
+    inicio = time.perf_counter()
+    caminho_csv = obter_csv(diretorio, linhas, semente)
+    geracao = time.perf_counter() - inicio
+    caminho_db = os.path.join(diretorio, f"despesa_anual_{linhas}_s{semente}.db")
+    if os.path.exists(caminho_db):
+        os.remove(caminho_db)
+
+    etapas = {}
+    def registrar(nome, duracao, linhas_etapa=None):
+        etapas[nome] = {'segundos': duracao, 'pico_memoria_mb': dados.pico_memoria_mb()}
+        if linhas_etapa is not None:
+            etapas[nome]['linhas_por_segundo'] = linhas_etapa / max(duracao, 1e-9)
+
+    conn = sqlite3.connect(caminho_db)
+    try:
+        dados.criar_tabelas(conn)
+        tempos = {'leitura': 0.0}
+        inicio = time.perf_counter()
+        if processos > 1:
+            blocos = dados.processar_em_paralelo(caminho_csv, processos)
+        else:
+            blocos = dados.processar_em_blocos(caminho_csv, tamanho_bloco)
+        contagens = dados.inserir_dados_em_blocos(conn, cronometrar_blocos(blocos, tempos))
+        total = time.perf_counter() - inicio
+        if contagens is None:
+            raise RuntimeError("A carga do banco sintético falhou; veja o log de dados.")
+        # Com processos de leitura, 'leitura' é só a espera pelos blocos que não se sobrepôs à carga
+        registrar('ingestao', total, linhas)
+        registrar('leitura', tempos['leitura'], linhas)
+        registrar('carga', total - tempos['leitura'], linhas)
+        inicio = time.perf_counter()
+        dados.atualizar_resumos(conn)
+        registrar('resumos', time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        dados.atualizar_busca(conn)
+        registrar('busca', time.perf_counter() - inicio)
+
+        consultas = {}
+        if 'sqlite' in motores:
+            def executar_sqlite(nome, parametros):
+                sql = dados.montar_consulta(nome, len(parametros) - dados.CONSULTAS[nome].count('?'))
+                return pd.read_sql_query(sql, conn, params=list(parametros))
+            consultas['sqlite'] = medir_consultas(executar_sqlite, repeticoes)
+        if 'parquet' in motores and colunar.disponivel():
+            diretorio_parquet = os.path.join(diretorio, f"parquet_{linhas}_s{semente}")
+            inicio = time.perf_counter()
+            colunar.exportar_parquet(conn, diretorio_parquet, 'benchmark')
+            registrar('exportacao_parquet', time.perf_counter() - inicio, contagens['Despesa'])
+            conjuntos = colunar.abrir_conjuntos(diretorio_parquet)
+            consultas['parquet'] = medir_consultas(lambda nome, parametros: colunar.executar(conjuntos, nome, parametros), repeticoes)
+    finally:
+        conn.close()
+
+    return {
+        'linhas': linhas,
+        'semente': semente,
+        'tamanho_bloco': tamanho_bloco,
+        'processos': processos,
+        'repeticoes': repeticoes,
+        'geracao_csv_s': geracao,
+        'tamanho_csv_mb': os.path.getsize(caminho_csv) / (1 << 20),
+        'tamanho_db_mb': os.path.getsize(caminho_db) / (1 << 20),
+        'contagens': contagens,
+        'etapas': etapas,
+        'consultas': consultas,
+        'pico_memoria_mb': dados.pico_memoria_mb(),
+    }
+
+def descrever_ambiente():
+    """Versões e máquina da execução, para que resultados de execuções diferentes sejam comparáveis."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'sqlite': sqlite3.sqlite_version,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def executar_benchmark(escalas, repeticoes, motores, semente, diretorio, saida, tamanho_bloco, processos):
+    """Mede cada escala em um processo novo, para que o pico de memória de uma não contamine a outra."""
+    execucao = {'execucao': time.strftime('%Y-%m-%dT%H:%M:%S'), 'ambiente': descrever_ambiente()}
+    contexto = multiprocessing.get_context('spawn')
+    for linhas in escalas:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=contexto) as processo:
+            resultado = processo.submit(medir_escala, diretorio, linhas, semente, repeticoes, motores, tamanho_bloco, processos).result()
+        with open(saida, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps({**execucao, **resultado}, ensure_ascii=False) + '\n')
+        etapas = resultado['etapas']
+        print(f"{linhas:>12,} linhas: leitura {etapas['leitura']['linhas_por_segundo']:,.0f} linhas/s, "
+              f"carga {etapas['carga']['linhas_por_segundo']:,.0f} linhas/s, pico {resultado['pico_memoria_mb'] or 0:,.0f} MB")
+        for motor, consultas in resultado['consultas'].items():
+            print(f"{'':>14}{motor}: " + ", ".join(f"{nome} {r['p50_ms']:.1f} ms" for nome, r in consultas.items()))
+
+def comparar(saida):
+    """Compara, para cada escala, a última execução registrada com a anterior (razão nova/antiga)."""
+    with open(saida, encoding='utf-8') as arquivo:
+        registros = [json.loads(linha) for linha in arquivo if linha.strip()]
+    por_escala = {}
+    for registro in registros:
+        por_escala.setdefault((registro['linhas'], registro['semente']), []).append(registro)
+    for (linhas, _), historico in sorted(por_escala.items()):
+        if len(historico) < 2:
+            continue
+        antigo, novo = historico[-2], historico[-1]
+        print(f"{linhas:,} linhas: {antigo['execucao']} ({antigo['ambiente']['commit']}) -> {novo['execucao']} ({novo['ambiente']['commit']})")
+        for etapa, medida in novo['etapas'].items():
+            if etapa in antigo['etapas']:
+                print(f"  {etapa:<20} {antigo['etapas'][etapa]['segundos']:>9.2f} s -> {medida['segundos']:>9.2f} s  x{medida['segundos'] / max(antigo['etapas'][etapa]['segundos'], 1e-9):.2f}")
+        for motor, consultas in novo['consultas'].items():
+            for nome, medida in consultas.items():
+                anterior = antigo['consultas'].get(motor, {}).get(nome)
+                if anterior:
+                    print(f"  {motor}/{nome:<13} {anterior['p50_ms']:>9.1f} ms -> {medida['p50_ms']:>9.1f} ms  x{medida['p50_ms'] / max(anterior['p50_ms'], 1e-9):.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da ingestão e das consultas do painel com dados sintéticos.")
+    parser.add_argument('--linhas', type=int, nargs='+', default=[100_000], help="escalas a medir (linhas do CSV)")
+    parser.add_argument('--repeticoes', type=int, default=5, help="execuções de cada consulta após a primeira")
+    parser.add_argument('--motores', nargs='+', choices=['sqlite', 'parquet'], default=['sqlite'])
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--tamanho-bloco', type=int, default=dados.TAMANHO_BLOCO, help="linhas por bloco na leitura")
+    parser.add_argument('--processos', type=int, default=1, help="processos de leitura do CSV (1 lê em blocos no próprio processo)")
+    parser.add_argument('--diretorio', default=DIRETORIO_BENCHMARK)
+    parser.add_argument('--saida', default=ARQUIVO_RESULTADOS)
+    parser.add_argument('--comparar', metavar='ARQUIVO', help="apenas compara as duas últimas execuções de cada escala")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    if args.comparar:
+        comparar(args.comparar)
+        return
+    if 'parquet' in args.motores and not colunar.disponivel():
+        parser.error("o motor parquet exige o pacote pyarrow")
+    executar_benchmark(args.linhas, args.repeticoes, args.motores, args.semente, args.diretorio, args.saida, args.tamanho_bloco, args.processos)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+"""Motor colunar opcional: as tabelas carregadas no SQLite exportadas como Parquet particionado.
+
+As despesas são gravadas já unidas às dimensões (prestador, partido, município e fornecedor),
+particionadas por SG_UF e mês de pagamento e com as colunas de texto codificadas em dicionário.
+Cada consulta do painel tem aqui uma versão equivalente que lê só as partições e colunas de que
+precisa, com os filtros empurrados para a leitura do Parquet.
+"""
+import os
+import shutil
+from datetime import date
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Linhas exportadas do SQLite por vez
+TAMANHO_BLOCO_EXPORTACAO = 500_000
+
+SQL_DESPESAS = """
+    SELECT Pr.NR_CNPJ_PRESTADOR_CONTA, F.NR_CPF_CNPJ_FORNECEDOR, D.DT_PAGAMENTO, D.VR_PAGAMENTO,
+           Pr.SG_PARTIDO, P.NM_PARTIDO, P.DS_TP_ESFERA_PARTIDARIA,
+           Pr.CD_MUNICIPIO, L.NM_MUNICIPIO, L.SG_UF,
+           F.NM_FORNECEDOR, F.DS_TP_FORNECEDOR,
+           substr(D.DT_PAGAMENTO, 1, 7) AS ANO_MES
+    FROM Despesa D
+        JOIN Prestador Pr ON Pr.ID_PRESTADOR = D.ID_PRESTADOR
+        LEFT JOIN Partido P ON P.SG_PARTIDO = Pr.SG_PARTIDO
+        LEFT JOIN Local L ON L.CD_MUNICIPIO = Pr.CD_MUNICIPIO
+        JOIN Fornecedor F ON F.ID_FORNECEDOR = D.ID_FORNECEDOR
+"""
+SQL_PRESTADORES = """
+    SELECT Pr.NR_CNPJ_PRESTADOR_CONTA, Pr.SG_PARTIDO, P.NM_PARTIDO, Pr.CD_MUNICIPIO, L.NM_MUNICIPIO, L.SG_UF
+    FROM Prestador Pr
+        LEFT JOIN Partido P ON P.SG_PARTIDO = Pr.SG_PARTIDO
+        LEFT JOIN Local L ON L.CD_MUNICIPIO = Pr.CD_MUNICIPIO
+"""
+# Conjunto -> (consulta de exportação, colunas de partição)
+CONJUNTOS = {
+    'despesas': (SQL_DESPESAS, ['SG_UF', 'ANO_MES']),
+    'prestadores': (SQL_PRESTADORES, ['SG_UF']),
+}
+ARQUIVO_VERSAO = 'VERSAO'
+
+def disponivel():
+    """Indica se o pyarrow está instalado."""
+    return pa is not None
+
+def _para_arrow(df):
+    """Converte um bloco exportado em tabela Arrow com datas nativas.
+
+    Os textos são gravados como texto simples: o Parquet já os codifica em dicionário por grupo de
+    linhas, só com os valores presentes em cada partição. Um dicionário do Arrow seria copiado
+    inteiro (com todos os valores do bloco) para cada arquivo de partição.
+    """
+    if 'DT_PAGAMENTO' in df:
+        df['DT_PAGAMENTO'] = pd.to_datetime(df['DT_PAGAMENTO']).dt.date
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+def _esquema_particao(colunas):
+    """Particionamento no estilo hive (coluna=valor) com as chaves lidas como texto."""
+    return ds.partitioning(pa.schema([(coluna, pa.string()) for coluna in colunas]), flavor='hive')
+
+def exportar_parquet(conn, diretorio, versao, tamanho_bloco=TAMANHO_BLOCO_EXPORTACAO):
+    """Exporta os conjuntos colunares a partir do banco SQLite, substituindo o diretório de uma vez."""
+    temporario = diretorio + '.tmp'
+    shutil.rmtree(temporario, ignore_errors=True)
+    for nome, (sql, particoes) in CONJUNTOS.items():
+        for i, bloco in enumerate(pd.read_sql_query(sql, conn, chunksize=tamanho_bloco)):
+            pq.write_to_dataset(
+                _para_arrow(bloco), os.path.join(temporario, nome),
+                partitioning=_esquema_particao(particoes),
+                basename_template=f"parte-{i}-{{i}}.parquet",
+                min_rows_per_group=tamanho_bloco,
+            )
+    with open(os.path.join(temporario, ARQUIVO_VERSAO), 'w', encoding='utf-8') as arquivo:
+        arquivo.write(versao)
+    shutil.rmtree(diretorio, ignore_errors=True)
+    os.replace(temporario, diretorio)
+
+def versao_exportada(diretorio):
+    """Versão do conjunto de dados gravada no diretório Parquet, ou None se não houver exportação."""
+    try:
+        with open(os.path.join(diretorio, ARQUIVO_VERSAO), encoding='utf-8') as arquivo:
+            return arquivo.read()
+    except OSError:
+        return None
+
+def abrir_conjuntos(diretorio):
+    """Abre os conjuntos Parquet particionados, sem ler os dados; os textos são lidos como dicionários."""
+    conjuntos = {}
+    for nome, (_, particoes) in CONJUNTOS.items():
+        caminho = os.path.join(diretorio, nome)
+        esquema = ds.dataset(caminho, format='parquet', partitioning=_esquema_particao(particoes)).schema
+        textos = [campo.name for campo in esquema if (pa.types.is_string(campo.type) or pa.types.is_large_string(campo.type)) and campo.name not in particoes]
+        formato = ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=textos))
+        conjuntos[nome] = ds.dataset(caminho, format=formato, partitioning=_esquema_particao(particoes))
+    return conjuntos
+
+def _para_pandas(tabela):
+    """Converte o resultado para pandas com textos comuns no lugar dos dicionários."""
+    colunas = [pc.cast(coluna, pa.string()) if pa.types.is_dictionary(coluna.type) else coluna for coluna in tabela.columns]
+    return pa.table(colunas, names=tabela.column_names).to_pandas()
+
+def _ordenar(tabela, coluna, limite=None):
+    """Ordena de forma decrescente pela coluna e mantém as primeiras linhas, se houver limite."""
+    tabela = tabela.sort_by([(coluna, 'descending')])
+    return tabela.slice(0, limite) if limite is not None else tabela
+
+def _agregar(tabela, chave, coluna, funcao, nome):
+    """Agrupa por uma coluna e renomeia o agregado para o nome usado pela consulta SQL equivalente."""
+    # Cada grupo de linhas traz o próprio dicionário; o agrupamento exige um único por coluna
+    resultado = tabela.unify_dictionaries().group_by(chave).aggregate([(coluna, funcao)])
+    return resultado.rename_columns([nome if c == f"{coluna}_{funcao}" else c for c in resultado.column_names])
+
+def _filtro_periodo(inicio, fim):
+    """Filtro de datas que também poda as partições de mês fora do intervalo."""
+    inicio, fim = date.fromisoformat(inicio), date.fromisoformat(fim)
+    return (
+        (ds.field('ANO_MES') >= inicio.isoformat()[:7]) & (ds.field('ANO_MES') <= fim.isoformat()[:7])
+        & (ds.field('DT_PAGAMENTO') >= pa.scalar(inicio, pa.date32()))
+        & (ds.field('DT_PAGAMENTO') <= pa.scalar(fim, pa.date32()))
+    )
+
+def consulta_c1(conjuntos, minimo, maximo):
+    """Pagamentos de partidos nacionais dentro da faixa de valor."""
+    return conjuntos['despesas'].to_table(
+        columns=['NM_FORNECEDOR', 'VR_PAGAMENTO'],
+        filter=(ds.field('DS_TP_ESFERA_PARTIDARIA') == 'Nacional')
+        & (ds.field('VR_PAGAMENTO') >= minimo) & (ds.field('VR_PAGAMENTO') <= maximo),
+    )
+
+def consulta_c2(conjuntos):
+    """Partido e UF de cada prestador."""
+    return conjuntos['prestadores'].to_table(
+        columns=['NM_PARTIDO', 'SG_UF'],
+        filter=ds.field('SG_PARTIDO').is_valid() & ds.field('CD_MUNICIPIO').is_valid(),
+    )
+
+def consulta_c3_geral(conjuntos):
+    """Total pago por tipo de fornecedor."""
+    tabela = conjuntos['despesas'].to_table(columns=['DS_TP_FORNECEDOR', 'VR_PAGAMENTO'])
+    return _agregar(tabela, 'DS_TP_FORNECEDOR', 'VR_PAGAMENTO', 'sum', 'VR_TOTAL')
+
+def consulta_c3(conjuntos, tipo):
+    """Dez fornecedores do tipo escolhido que mais receberam."""
+    tabela = conjuntos['despesas'].to_table(columns=['NM_FORNECEDOR', 'VR_PAGAMENTO'], filter=ds.field('DS_TP_FORNECEDOR') == tipo)
+    return _ordenar(_agregar(tabela, 'NM_FORNECEDOR', 'VR_PAGAMENTO', 'sum', 'Total_Recebido'), 'Total_Recebido', 10)
+
+def consulta_c4(conjuntos, *ufs):
+    """Prestadores por partido nos estados escolhidos; só as partições desses estados são lidas."""
+    tabela = conjuntos['prestadores'].to_table(
+        columns=['SG_PARTIDO', 'NR_CNPJ_PRESTADOR_CONTA'],
+        filter=ds.field('SG_UF').isin(list(ufs)) & ds.field('SG_PARTIDO').is_valid(),
+    )
+    return _ordenar(_agregar(tabela, 'SG_PARTIDO', 'NR_CNPJ_PRESTADOR_CONTA', 'count', 'Numero_Prestadores'), 'Numero_Prestadores')
+
+def consulta_c5(conjuntos, limite):
+    """Municípios com mais prestadores."""
+    tabela = conjuntos['prestadores'].to_table(columns=['NM_MUNICIPIO', 'NR_CNPJ_PRESTADOR_CONTA'], filter=ds.field('CD_MUNICIPIO').is_valid())
+    return _ordenar(_agregar(tabela, 'NM_MUNICIPIO', 'NR_CNPJ_PRESTADOR_CONTA', 'count', 'n'), 'n', limite)
+
+def consulta_c6(conjuntos, *params):
+    """Valor médio pago por partido nos estados e período escolhidos."""
+    *ufs, inicio, fim = params
+    tabela = conjuntos['despesas'].to_table(
+        columns=['SG_PARTIDO', 'VR_PAGAMENTO'],
+        filter=ds.field('SG_UF').isin(ufs) & _filtro_periodo(inicio, fim) & ds.field('SG_PARTIDO').is_valid(),
+    )
+    return _ordenar(_agregar(tabela, 'SG_PARTIDO', 'VR_PAGAMENTO', 'mean', 'Media_Gastos'), 'Media_Gastos')
+
+def consulta_c7(conjuntos, limite):
+    """Partidos com mais contratos."""
+    tabela = conjuntos['despesas'].to_table(columns=['SG_PARTIDO', 'NR_CPF_CNPJ_FORNECEDOR'])
+    return _ordenar(_agregar(tabela, 'SG_PARTIDO', 'NR_CPF_CNPJ_FORNECEDOR', 'count', 'n'), 'n', limite)
+
+def consulta_c8(conjuntos, ano, limite):
+    """Fornecedores que mais receberam no ano."""
+    tabela = conjuntos['despesas'].to_table(columns=['NM_FORNECEDOR', 'VR_PAGAMENTO'], filter=_filtro_periodo(f'{ano}-01-01', f'{ano}-12-31'))
+    return _ordenar(_agregar(tabela, 'NM_FORNECEDOR', 'VR_PAGAMENTO', 'sum', 'Total'), 'Total', limite)
+
+def consulta_c9(conjuntos, uf, inicio, fim):
+    """Total de despesas por partido no estado e período escolhidos."""
+    tabela = conjuntos['despesas'].to_table(
+        columns=['NM_PARTIDO', 'VR_PAGAMENTO'],
+        filter=(ds.field('SG_UF') == uf) & _filtro_periodo(inicio, fim) & ds.field('SG_PARTIDO').is_valid(),
+    )
+    return _ordenar(_agregar(tabela, 'NM_PARTIDO', 'VR_PAGAMENTO', 'sum', 'Total_Despesas'), 'Total_Despesas')
+
+def consulta_c10(conjuntos, ano, limite):
+    """Municípios com maior total de despesas no ano."""
+    tabela = conjuntos['despesas'].to_table(
+        columns=['NM_MUNICIPIO', 'VR_PAGAMENTO'],
+        filter=_filtro_periodo(f'{ano}-01-01', f'{ano}-12-31') & ds.field('CD_MUNICIPIO').is_valid(),
+    )
+    return _ordenar(_agregar(tabela, 'NM_MUNICIPIO', 'VR_PAGAMENTO', 'sum', 'Total'), 'Total', limite)
+
+# Mesmos nomes e parâmetros das consultas SQL do painel
+CONSULTAS = {
+    'C1': consulta_c1,
+    'C2': consulta_c2,
+    'C3_geral': consulta_c3_geral,
+    'C3': consulta_c3,
+    'C4': consulta_c4,
+    'C5': consulta_c5,
+    'C6': consulta_c6,
+    'C7': consulta_c7,
+    'C8': consulta_c8,
+    'C9': consulta_c9,
+    'C10': consulta_c10,
+}
+
+def executar(conjuntos, nome, params=()):
+    """Executa uma consulta do painel sobre os conjuntos Parquet e devolve um DataFrame."""
+    return _para_pandas(CONSULTAS[nome](conjuntos, *params))
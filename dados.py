@@ -0,0 +1,993 @@
+"""Camada de dados do painel: leitura do CSV do TSE, carga no SQLite e as consultas das análises.
+
+Não depende do Streamlit, para ser usada também fora do painel (pelo benchmark, por exemplo).
+Mensagens de progresso e erros da carga vão para o logger do módulo; o painel as exibe na página.
+"""
+import concurrent.futures
+import io
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import pathlib
+import re
+import sqlite3
+import sys
+import time
+import warnings
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+log = logging.getLogger(__name__)
+
+# Versão do schema (tabelas de criar_tabelas, INDICES e RESUMOS); alterá-la força a reconstrução do banco
+VERSAO_SCHEMA = 7
+# Banco de cada ano, usado pelo painel e pelos relatórios em lote; cada versão carregada ganha um
+# arquivo próprio ao lado dele, indicado pelo manifesto (caminho_banco)
+ARQUIVO_DB = 'database_{ano}.db'
+# Linhas lidas por bloco na ingestão em partes; None lê o arquivo inteiro de uma vez
+TAMANHO_BLOCO = 200_000
+# Processos que leem e limpam o CSV em paralelo, cada um numa faixa de bytes do arquivo; 1 lê no próprio processo
+PROCESSOS_LEITURA = os.cpu_count() or 1
+# Tamanho (em MB) de cada faixa do arquivo entregue a um processo de leitura
+TAMANHO_FAIXA_MB = 16
+
+# Tabelas na ordem de dependência das chaves estrangeiras: (colunas, chave de deduplicação)
+TABELAS = {
+    'Local': (['CD_MUNICIPIO', 'NM_MUNICIPIO', 'SG_UF'], ['CD_MUNICIPIO']),
+    'Partido': (['SG_PARTIDO', 'NM_PARTIDO', 'DS_TP_ESFERA_PARTIDARIA'], ['SG_PARTIDO']),
+    'Fornecedor': (['ID_FORNECEDOR', 'NR_CPF_CNPJ_FORNECEDOR', 'NM_FORNECEDOR', 'DS_TP_FORNECEDOR'], ['NR_CPF_CNPJ_FORNECEDOR']),
+    'Prestador': (['ID_PRESTADOR', 'NR_CNPJ_PRESTADOR_CONTA', 'CD_MUNICIPIO', 'SG_PARTIDO', 'SG_UF_CONTA'], ['NR_CNPJ_PRESTADOR_CONTA']),
+    'Documento': (['ID_PRESTADOR', 'NR_DOCUMENTO', 'CD_TP_DOCUMENTO', 'DS_TP_DOCUMENTO'], ['ID_PRESTADOR', 'NR_DOCUMENTO']),
+    'Despesa': (['ID_PRESTADOR', 'ID_FORNECEDOR', 'DT_PAGAMENTO', 'NR_DOCUMENTO', 'VR_PAGAMENTO'], ['ID_PRESTADOR', 'ID_FORNECEDOR', 'DT_PAGAMENTO', 'NR_DOCUMENTO']),
+}
+# Chaves substitutas inteiras: tabela -> (coluna do id, CPF/CNPJ que ele representa nas demais tabelas)
+CHAVES_SUBSTITUTAS = {
+    'Prestador': ('ID_PRESTADOR', 'NR_CNPJ_PRESTADOR_CONTA'),
+    'Fornecedor': ('ID_FORNECEDOR', 'NR_CPF_CNPJ_FORNECEDOR'),
+}
+# UF da prestação de contas, lida de SG_UF no CSV e guardada em Prestador com outro nome para não
+# entrar nos NATURAL JOIN com Local; diretórios nacionais e estaduais não têm município, mas têm UF
+COLUNA_UF_CONTA = 'SG_UF_CONTA'
+# Tabelas de dimensão, deduplicadas por chave simples durante a ingestão em blocos
+DIMENSOES = ['Local', 'Partido', 'Fornecedor', 'Prestador']
+
+# Motivos de rejeição da validação, em ordem de prioridade: cada linha rejeitada fica fora das
+# tabelas e vai para a Quarentena com o primeiro motivo que se aplica a ela
+MOTIVOS_REJEICAO = {
+    'linha_malformada': 'Número de campos diferente do cabeçalho',
+    'prestador_ausente': 'CNPJ do prestador ausente',
+    'fornecedor_ausente': 'CPF/CNPJ do fornecedor ausente',
+    'data_ausente': 'Data de pagamento ausente',
+    'data_invalida': 'Data de pagamento fora do formato DD/MM/AAAA',
+    'valor_ausente': 'Valor do pagamento ausente',
+    'duplicada': 'Pagamento repetido (mesmo prestador, fornecedor, data e documento)',
+}
+# Alertas de qualidade: a linha é carregada normalmente e uma cópia vai para a Quarentena com o
+# motivo, pois um dígito verificador errado não indica que o pagamento não aconteceu
+MOTIVOS_ALERTA = {
+    'prestador_invalido': 'CNPJ do prestador com dígitos verificadores inválidos (carregado)',
+    'fornecedor_invalido': 'CPF/CNPJ do fornecedor com dígitos verificadores inválidos (carregado)',
+}
+# Colunas do CSV que identificam um pagamento, equivalentes à chave primária de Despesa
+CHAVE_PAGAMENTO = ['NR_CNPJ_PRESTADOR_CONTA', 'NR_CPF_CNPJ_FORNECEDOR', 'DT_PAGAMENTO', 'NR_DOCUMENTO']
+# Pesos do primeiro e do segundo dígito verificador (módulo 11) de CPF e CNPJ
+PESOS_CPF = (np.arange(10, 1, -1), np.arange(11, 1, -1))
+PESOS_CNPJ = (np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]), np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]))
+# Pagamentos atípicos: fora da média ± LIMIAR_ATIPICO desvios-padrão do log10 do valor, calculados por
+# partido e UF, nos grupos com pelo menos MINIMO_GRUPO_ATIPICO pagamentos positivos
+LIMIAR_ATIPICO = 4.0
+MINIMO_GRUPO_ATIPICO = 30
+
+# PRAGMAs da carga inicial: sem journal nem fsync (um banco incompleto não tem manifesto e é
+# reconstruído), cache de 128 MB e arquivos temporários em disco para manter a memória limitada
+PRAGMAS_CARGA = {'journal_mode': 'OFF', 'synchronous': 'OFF', 'cache_size': -131072, 'temp_store': 'FILE'}
+# Valores restaurados ao fim da carga; o modo WAL fica gravado no arquivo e deixa as conexões de
+# leitura da aplicação consultarem o banco sem bloquear umas às outras
+PRAGMAS_PADRAO = {'journal_mode': 'WAL', 'synchronous': 'FULL', 'cache_size': -2000, 'temp_store': 'DEFAULT'}
+# PRAGMAs das conexões de leitura: apenas consultas, arquivo mapeado em memória (256 MB) para ler
+# as páginas sem cópia para o cache do SQLite, e 16 MB de cache por conexão
+PRAGMAS_LEITURA = {'query_only': 'ON', 'mmap_size': 256 << 20, 'cache_size': -16384}
+# Índices secundários, criados depois da carga inicial: nome -> tabela (colunas). Os de Despesa
+# cobrem as colunas lidas pelas consultas de agregação, que assim não precisam visitar a tabela
+INDICES = {
+    'ix_local_uf': 'Local (SG_UF, NM_MUNICIPIO)',
+    'ix_partido_esfera': 'Partido (DS_TP_ESFERA_PARTIDARIA)',
+    'ix_fornecedor_tipo': 'Fornecedor (DS_TP_FORNECEDOR, NM_FORNECEDOR)',
+    'ix_prestador_municipio': 'Prestador (CD_MUNICIPIO, SG_PARTIDO)',
+    'ix_prestador_partido': 'Prestador (SG_PARTIDO, CD_MUNICIPIO)',
+    'ix_despesa_valor': 'Despesa (VR_PAGAMENTO, ID_PRESTADOR, ID_FORNECEDOR)',
+    'ix_despesa_data': 'Despesa (DT_PAGAMENTO, ID_PRESTADOR, VR_PAGAMENTO)',
+    'ix_despesa_prestador_data': 'Despesa (ID_PRESTADOR, DT_PAGAMENTO, VR_PAGAMENTO)',
+    'ix_despesa_fornecedor_data': 'Despesa (ID_FORNECEDOR, DT_PAGAMENTO, VR_PAGAMENTO)',
+}
+
+# Tabelas de resumo recalculadas ao fim de cada carga: nome -> (SELECT de origem, colunas indexadas)
+RESUMOS = {
+    # LEFT JOIN: despesas de prestadores sem município (diretórios nacionais e estaduais) ficam com SG_UF nulo; C7 as conta, C6 e C9 filtram por UF
+    'Resumo_Diario': ("""
+        SELECT D.DT_PAGAMENTO, P.SG_PARTIDO, L.SG_UF, SUM(D.VR_PAGAMENTO) AS VR_TOTAL, COUNT(*) AS N_DESPESAS
+        FROM Despesa D NATURAL JOIN Prestador P NATURAL LEFT JOIN Local L
+        GROUP BY D.DT_PAGAMENTO, P.SG_PARTIDO, L.SG_UF
+    """, 'SG_UF, DT_PAGAMENTO'),
+    'Resumo_Fornecedor': ("""
+        SELECT substr(D.DT_PAGAMENTO, 1, 4) AS ANO, F.DS_TP_FORNECEDOR, F.NM_FORNECEDOR, SUM(D.VR_PAGAMENTO) AS VR_TOTAL
+        FROM Despesa D NATURAL JOIN Fornecedor F
+        GROUP BY ANO, F.DS_TP_FORNECEDOR, F.NM_FORNECEDOR
+    """, 'DS_TP_FORNECEDOR, ANO'),
+    'Resumo_Municipio': ("""
+        SELECT substr(D.DT_PAGAMENTO, 1, 4) AS ANO, L.NM_MUNICIPIO, SUM(D.VR_PAGAMENTO) AS VR_TOTAL
+        FROM Despesa D NATURAL JOIN Prestador P NATURAL JOIN Local L
+        GROUP BY ANO, L.NM_MUNICIPIO
+    """, 'ANO, VR_TOTAL'),
+    'Resumo_Prestadores_Municipio': ("""
+        SELECT L.NM_MUNICIPIO, COUNT(Pr.NR_CNPJ_PRESTADOR_CONTA) AS N_PRESTADORES
+        FROM Prestador Pr NATURAL JOIN Local L
+        GROUP BY L.NM_MUNICIPIO
+    """, 'N_PRESTADORES'),
+}
+
+# Índice de busca textual (FTS5) sobre fornecedores e municípios, recriado ao fim de cada carga.
+# A busca ignora acentos, e os prefixos de 2 e 3 caracteres ficam pré-indexados
+SQL_INDICE_BUSCA = """
+    CREATE VIRTUAL TABLE Busca USING fts5(
+        TIPO UNINDEXED, ID UNINDEXED, SG_UF UNINDEXED, NOME, DOCUMENTO,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+"""
+# Conteúdo do índice de busca: tipo -> SELECT de (TIPO, ID, SG_UF, NOME, DOCUMENTO)
+FONTES_BUSCA = {
+    'fornecedor': "SELECT 'fornecedor', ID_FORNECEDOR, NULL, NM_FORNECEDOR, NR_CPF_CNPJ_FORNECEDOR FROM Fornecedor",
+    'municipio': "SELECT 'municipio', CD_MUNICIPIO, SG_UF, NM_MUNICIPIO, NULL FROM Local",
+}
+# Resultados da busca, do mais ao menos relevante (bm25); recebe a expressão de termos_busca e o limite
+SQL_BUSCA = "SELECT TIPO, ID, SG_UF, NOME, DOCUMENTO FROM Busca WHERE Busca MATCH ? ORDER BY rank LIMIT ?"
+LIMITE_BUSCA = 20
+# Detalhamento de um resultado da busca: total pago por partido e mês, a partir do id do
+# fornecedor (ix_despesa_fornecedor_data) ou do código do município (ix_prestador_municipio).
+# O CROSS JOIN fixa Despesa como tabela externa, para o fornecedor ser buscado pelo índice
+DETALHES_BUSCA = {
+    'fornecedor': """
+        SELECT Pr.SG_PARTIDO, substr(D.DT_PAGAMENTO, 1, 7) AS MES, SUM(D.VR_PAGAMENTO) AS VR_TOTAL, COUNT(*) AS N_DESPESAS
+        FROM Despesa D CROSS JOIN Prestador Pr ON Pr.ID_PRESTADOR = D.ID_PRESTADOR
+        WHERE D.ID_FORNECEDOR = ?
+        GROUP BY Pr.SG_PARTIDO, MES
+        ORDER BY MES, Pr.SG_PARTIDO
+    """,
+    'municipio': """
+        SELECT Pr.SG_PARTIDO, substr(D.DT_PAGAMENTO, 1, 7) AS MES, SUM(D.VR_PAGAMENTO) AS VR_TOTAL, COUNT(*) AS N_DESPESAS
+        FROM Prestador Pr JOIN Despesa D ON D.ID_PRESTADOR = Pr.ID_PRESTADOR
+        WHERE Pr.CD_MUNICIPIO = ?
+        GROUP BY Pr.SG_PARTIDO, MES
+        ORDER BY MES, Pr.SG_PARTIDO
+    """,
+}
+
+# SQL das consultas de cada aba, lidas das tabelas de resumo sempre que possível; {ufs} recebe os placeholders da lista de estados selecionados.
+# C8 e C10 recebem o ano como texto, como na coluna ANO dos resumos
+CONSULTAS = {
+    'C1': """
+    SELECT 
+        f.NM_FORNECEDOR, 
+        dp.VR_PAGAMENTO 
+    FROM 
+        Partido p 
+        NATURAL JOIN Prestador pr 
+        NATURAL JOIN Despesa dp 
+        NATURAL JOIN Fornecedor f 
+    WHERE 
+        p.DS_TP_ESFERA_PARTIDARIA = 'Nacional' 
+        AND dp.VR_PAGAMENTO BETWEEN ? AND ?
+    """,
+    'C2': "SELECT P.NM_PARTIDO, L.SG_UF FROM Prestador Pr NATURAL JOIN Partido P NATURAL JOIN Local L",
+    'C3_geral': "SELECT DS_TP_FORNECEDOR, SUM(VR_TOTAL) AS VR_TOTAL FROM Resumo_Fornecedor GROUP BY DS_TP_FORNECEDOR",
+    'C3': """
+        SELECT 
+            NM_FORNECEDOR, 
+            SUM(VR_TOTAL) as Total_Recebido
+        FROM 
+            Resumo_Fornecedor
+        WHERE 
+            DS_TP_FORNECEDOR = ?
+        GROUP BY 
+            NM_FORNECEDOR
+        ORDER BY 
+            Total_Recebido DESC
+        LIMIT 10
+    """,
+    'C4': """
+            SELECT 
+                P.SG_PARTIDO, 
+                COUNT(Pr.NR_CNPJ_PRESTADOR_CONTA) AS Numero_Prestadores 
+            FROM 
+                Prestador Pr 
+                NATURAL JOIN Partido P 
+                NATURAL JOIN Local L
+            WHERE 
+                L.SG_UF IN ({ufs})
+            GROUP BY 
+                P.SG_PARTIDO 
+            ORDER BY 
+                Numero_Prestadores DESC
+        """,
+    'C5': "SELECT NM_MUNICIPIO, N_PRESTADORES AS n FROM Resumo_Prestadores_Municipio ORDER BY n DESC LIMIT ?",
+    'C6': """
+            SELECT 
+                PT.SG_PARTIDO, 
+                SUM(R.VR_TOTAL) / SUM(R.N_DESPESAS) AS Media_Gastos 
+            FROM 
+                Resumo_Diario R 
+                NATURAL JOIN Partido PT
+            WHERE 
+                R.SG_UF IN ({ufs}) 
+                AND R.DT_PAGAMENTO BETWEEN ? AND ?
+            GROUP BY 
+                PT.SG_PARTIDO 
+            ORDER BY 
+                Media_Gastos DESC
+        """,
+    'C7': "SELECT SG_PARTIDO, SUM(N_DESPESAS) AS n FROM Resumo_Diario GROUP BY SG_PARTIDO ORDER BY n DESC LIMIT ?",
+    'C8': "SELECT NM_FORNECEDOR, SUM(VR_TOTAL) AS Total FROM Resumo_Fornecedor WHERE ANO = ? GROUP BY NM_FORNECEDOR ORDER BY Total DESC LIMIT ?",
+    'C9': """
+            SELECT 
+                Pt.NM_PARTIDO, 
+                SUM(R.VR_TOTAL) AS Total_Despesas
+            FROM 
+                Resumo_Diario R 
+                NATURAL JOIN Partido Pt
+            WHERE 
+                R.SG_UF = ? 
+                AND R.DT_PAGAMENTO BETWEEN ? AND ?
+            GROUP BY 
+                Pt.NM_PARTIDO
+            ORDER BY 
+                Total_Despesas DESC
+        """,
+    'C10': "SELECT NM_MUNICIPIO, VR_TOTAL AS Total FROM Resumo_Municipio WHERE ANO = ? ORDER BY Total DESC LIMIT ?",
+}
+# Comparação entre eleições: uma parte por ano, lida do Resumo_Diario do banco daquele ano ({esquema}),
+# unidas por UNION ALL; cada parte recebe o ano como parâmetro e {coluna} é a coluna de agrupamento
+COMPARACAO_ANOS = "SELECT ? AS ANO, {coluna}, SUM(VR_TOTAL) AS VR_TOTAL, SUM(N_DESPESAS) AS N_DESPESAS FROM {esquema}.Resumo_Diario GROUP BY {coluna}"
+# Colunas do Resumo_Diario pelas quais a comparação entre eleições pode agrupar
+COLUNAS_COMPARACAO = {'Partido': 'SG_PARTIDO', 'UF': 'SG_UF'}
+# Parâmetros representativos usados na verificação dos planos de consulta
+PARAMETROS_VERIFICACAO = {
+    'C1': [10000, 50000],
+    'C2': [],
+    'C3_geral': [],
+    'C3': ['PESSOA JURÍDICA'],
+    'C4': ['SP', 'MG'],
+    'C5': [10],
+    'C6': ['SP', 'MG', '2024-01-01', '2024-12-31'],
+    'C7': [10],
+    'C8': ['2024', 10],
+    'C9': ['MG', '2024-01-01', '2024-01-31'],
+    'C10': ['2024', 5],
+}
+
+def contar_registros(conn):
+    """Conta os registros de cada tabela do schema."""
+    return {tabela: conn.execute(f"SELECT COUNT(*) FROM {tabela}").fetchone()[0] for tabela in TABELAS}
+
+# Tipos fixos das colunas lidas, para que todos os blocos de uma leitura em partes tenham o mesmo formato.
+# Textos repetidos e CPF/CNPJ são lidos direto como categorias (códigos inteiros + dicionário)
+TIPOS_CSV = {
+    'NR_CPF_CNPJ_FORNECEDOR': 'category', 'NR_CNPJ_PRESTADOR_CONTA': 'category', 'NR_DOCUMENTO': str,
+    'CD_TP_DOCUMENTO': 'Int16', 'CD_MUNICIPIO': 'Int32',
+    'NM_MUNICIPIO': 'category', 'SG_UF': 'category', 'SG_PARTIDO': 'category', 'NM_PARTIDO': 'category',
+    'DS_TP_ESFERA_PARTIDARIA': 'category', 'NM_FORNECEDOR': 'category', 'DS_TP_FORNECEDOR': 'category',
+    'DS_TP_DOCUMENTO': 'category', 'VR_PAGAMENTO': float, 'DT_PAGAMENTO': str,
+}
+# Colunas da tabela Quarentena: o motivo da rejeição, um detalhe opcional e as colunas lidas do CSV
+COLUNAS_QUARENTENA = ['MOTIVO', 'DETALHE', *TIPOS_CSV]
+
+def ler_csv(caminho_csv, **kwargs):
+    """Abre o CSV do TSE com a codificação, separador e marcadores de nulo do arquivo original.
+
+    Linhas malformadas são descartadas com um ParserWarning, registrado por registrar_linhas_malformadas.
+    """
+    return pd.read_csv(
+        caminho_csv, encoding='ISO-8859-1', sep=';', decimal=',', on_bad_lines='warn',
+        dtype=TIPOS_CSV, na_values=["#NULO#"], **kwargs
+    )
+
+def limpar_dataframe(df):
+    """Normaliza município e datas de pagamento; a vírgula decimal dos valores já é tratada na leitura.
+
+    As datas ficam como datetime64 e só viram texto na gravação no SQLite (ver registros). O texto
+    das datas que não puderam ser convertidas fica em df.attrs['datas_invalidas'], para a quarentena.
+    """
+    df['CD_MUNICIPIO'] = df['CD_MUNICIPIO'].replace(-1, None)
+    datas = df['DT_PAGAMENTO'].str.strip()
+    df['DT_PAGAMENTO'] = pd.to_datetime(datas, format='%d/%m/%Y', errors='coerce')
+    invalidas = df['DT_PAGAMENTO'].isna() & datas.notna()
+    if invalidas.any():
+        df.attrs['datas_invalidas'] = datas[invalidas].to_dict()
+    return df
+
+@contextmanager
+def registrar_linhas_malformadas(malformadas):
+    """Acrescenta a malformadas as linhas descartadas pelo leitor do CSV durante o bloco with.
+
+    Outros avisos emitidos no trecho são repassados normalmente.
+    """
+    with warnings.catch_warnings(record=True) as avisos:
+        warnings.simplefilter('always', pd.errors.ParserWarning)
+        yield
+    for aviso in avisos:
+        linhas = [linha for linha in str(aviso.message).splitlines() if linha.startswith('Skipping line')]
+        if issubclass(aviso.category, pd.errors.ParserWarning) and linhas:
+            malformadas.extend(linhas)
+        else:
+            warnings.warn_explicit(aviso.message, aviso.category, aviso.filename, aviso.lineno)
+
+@contextmanager
+def abrir_fluxo(caminho_csv):
+    """Abre o CSV para leitura binária, ou repassa o fluxo binário já aberto (de abrir_csv, por exemplo)."""
+    if isinstance(caminho_csv, (str, os.PathLike)):
+        with open(caminho_csv, 'rb') as fluxo:
+            yield fluxo
+    else:
+        yield caminho_csv
+
+def ler_cabecalho(fluxo):
+    """Lê a linha de cabeçalho do fluxo e devolve os nomes das colunas."""
+    return list(ler_csv(io.BytesIO(fluxo.readline()), nrows=0).columns)
+
+def contar_campos(conteudo):
+    """Conta os campos de cada registro de um trecho de bytes do CSV, com NumPy, sem decodificar o texto.
+
+    Separadores e quebras de linha entre aspas não contam (aspas duplicadas dentro de um campo se anulam).
+    Retorna o número de campos e a linha de cada registro no trecho, a partir de 1, sem os registros
+    vazios, que o leitor ignora.
+    """
+    octetos = np.frombuffer(conteudo, dtype=np.uint8)
+    entre_aspas = np.logical_xor.accumulate(octetos == ord('"'))
+    quebras = np.flatnonzero(octetos == ord('\n'))
+    fins = quebras[~entre_aspas[quebras]]
+    if len(octetos) and octetos[-1] != ord('\n'):
+        fins = np.append(fins, len(octetos))
+    inicios = np.concatenate([[0], fins + 1])[:len(fins)]
+    separadores = np.flatnonzero((octetos == ord(';')) & ~entre_aspas)
+    campos = np.searchsorted(separadores, fins) - np.searchsorted(separadores, inicios) + 1
+    linhas = np.searchsorted(quebras, inicios) + 1
+    # Vazio é o registro sem nenhum caractere, ou só com o \r de um fim de linha \r\n
+    vazios = fins - inicios <= (octetos[inicios] == ord('\r'))
+    return campos[~vazios], linhas[~vazios]
+
+def ler_bloco(conteudo, colunas, deslocamento=0, prefixo=''):
+    """Lê e limpa um trecho de bytes do CSV sem cabeçalho, que começa e termina em fim de registro.
+
+    As linhas com campos a mais, descartadas pelo leitor, seguem em attrs['linhas_malformadas']; as com
+    campos a menos, que o leitor completaria com nulos, ficam em attrs['linhas_curtas'] (índice -> detalhe)
+    para a quarentena. deslocamento é o número de linhas do arquivo antes do trecho e prefixo antecede
+    as mensagens quando ele é desconhecido.
+    """
+    malformadas = []
+    with registrar_linhas_malformadas(malformadas):
+        bloco = ler_csv(io.BytesIO(conteudo), header=None, names=colunas)
+    # Uma linha com campos a menos sempre deixa a última coluna nula; sem nulos nela, não há o que contar
+    if bloco[colunas[-1]].isna().any():
+        campos, linhas = contar_campos(conteudo)
+        lidas = campos <= len(colunas)
+        if lidas.sum() == len(bloco):
+            curtas = np.flatnonzero(campos[lidas] < len(colunas))
+            bloco.attrs['linhas_curtas'] = {
+                bloco.index[i]: f"{prefixo}Linha {linhas[lidas][i] + deslocamento}: esperados {len(colunas)} campos, lidos {campos[lidas][i]}"
+                for i in curtas
+            }
+        else:
+            log.warning(f"{prefixo}Não foi possível conferir o número de campos de cada linha do bloco")
+    bloco = limpar_dataframe(bloco)
+    bloco.attrs['linhas_malformadas'] = [
+        prefixo + re.sub(r'(?<=^Skipping line )\d+', lambda numero: str(int(numero[0]) + deslocamento), linha)
+        for linha in malformadas
+    ]
+    return bloco
+
+def processar_dataframe(caminho_csv):
+    """Lê e limpa o arquivo CSV, retornando um DataFrame."""
+    try:
+        with abrir_fluxo(caminho_csv) as fluxo:
+            colunas = ler_cabecalho(fluxo)
+            return ler_bloco(fluxo.read(), colunas, deslocamento=1)
+    except Exception as e:
+        log.error(f"Erro ao processar o arquivo CSV: {e}")
+        return None
+
+def processar_em_blocos(caminho_csv, tamanho_bloco=TAMANHO_BLOCO):
+    """Lê e limpa o arquivo CSV em blocos de tamanho fixo, mantendo a memória limitada.
+
+    Cada bloco é lido como bytes, linha a linha, para que ler_bloco confira o número de campos de cada registro.
+    """
+    with abrir_fluxo(caminho_csv) as fluxo:
+        colunas = ler_cabecalho(fluxo)
+        deslocamento = 1
+        while linhas := list(itertools.islice(fluxo, tamanho_bloco)):
+            conteudo, lidas = b''.join(linhas), len(linhas)
+            # Um campo entre aspas com quebra de linha pode continuar depois da última linha do bloco
+            aspas = conteudo.count(b'"')
+            while aspas % 2 and (linha := fluxo.readline()):
+                conteudo, lidas, aspas = conteudo + linha, lidas + 1, aspas + linha.count(b'"')
+            yield ler_bloco(conteudo, colunas, deslocamento)
+            deslocamento += lidas
+
+def dividir_em_faixas(caminho_csv, tamanho_faixa):
+    """Divide o arquivo, após o cabeçalho, em faixas de bytes que começam e terminam em fim de linha."""
+    faixas = []
+    with open(caminho_csv, 'rb') as arquivo:
+        arquivo.readline()
+        inicio, tamanho = arquivo.tell(), os.path.getsize(caminho_csv)
+        while inicio < tamanho:
+            arquivo.seek(min(inicio + tamanho_faixa, tamanho))
+            arquivo.readline()  # avança até o fim do registro em que a faixa caiu
+            faixas.append((inicio, arquivo.tell()))
+            inicio = arquivo.tell()
+    return faixas
+
+def ler_faixa(caminho_csv, inicio, fim, colunas):
+    """Lê e limpa uma faixa de bytes do CSV; executada nos processos de leitura."""
+    with open(caminho_csv, 'rb') as arquivo:
+        arquivo.seek(inicio)
+        conteudo = arquivo.read(fim - inicio)
+    # Os números de linha contam a partir do início da faixa
+    return ler_bloco(conteudo, colunas, prefixo=f"Faixa a partir do byte {inicio}: ")
+
+def processar_em_paralelo(caminho_csv, processos=PROCESSOS_LEITURA, tamanho_faixa_mb=TAMANHO_FAIXA_MB):
+    """Lê e limpa o CSV em vários processos, devolvendo os blocos na ordem do arquivo.
+
+    A ordem preserva a regra de deduplicação da carga (prevalece a primeira ocorrência). No máximo
+    processos + 1 faixas ficam em andamento ou aguardando a inserção, o que limita a memória quando
+    a gravação no banco é mais lenta que a leitura.
+    """
+    colunas = list(ler_csv(caminho_csv, nrows=0).columns)
+    faixas = dividir_em_faixas(caminho_csv, tamanho_faixa_mb << 20)
+    executor = concurrent.futures.ProcessPoolExecutor(processos, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        pendentes = deque()
+        for inicio, fim in faixas:
+            pendentes.append(executor.submit(ler_faixa, caminho_csv, inicio, fim, colunas))
+            if len(pendentes) > processos:
+                yield pendentes.popleft().result()
+        while pendentes:
+            yield pendentes.popleft().result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+def pico_memoria_mb():
+    """Pico de memória residente do processo em MB, ou None onde o módulo resource não existe."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1 << 20) if sys.platform == 'darwin' else pico / 1024
+
+def criar_tabelas(conn):
+    """Cria o schema do banco de dados SQLite."""
+    with conn:
+        conn.execute("PRAGMA foreign_keys = ON;")
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS Local ( CD_MUNICIPIO INTEGER PRIMARY KEY, NM_MUNICIPIO TEXT, SG_UF TEXT );
+            CREATE TABLE IF NOT EXISTS Partido ( SG_PARTIDO TEXT PRIMARY KEY, NM_PARTIDO TEXT, DS_TP_ESFERA_PARTIDARIA TEXT );
+            CREATE TABLE IF NOT EXISTS Prestador ( ID_PRESTADOR INTEGER PRIMARY KEY, NR_CNPJ_PRESTADOR_CONTA TEXT NOT NULL UNIQUE, CD_MUNICIPIO INTEGER, SG_PARTIDO TEXT, SG_UF_CONTA TEXT, FOREIGN KEY (CD_MUNICIPIO) REFERENCES Local(CD_MUNICIPIO), FOREIGN KEY (SG_PARTIDO) REFERENCES Partido(SG_PARTIDO) );
+            CREATE TABLE IF NOT EXISTS Fornecedor ( ID_FORNECEDOR INTEGER PRIMARY KEY, NR_CPF_CNPJ_FORNECEDOR TEXT NOT NULL UNIQUE, NM_FORNECEDOR TEXT, DS_TP_FORNECEDOR TEXT );
+            CREATE TABLE IF NOT EXISTS Documento ( ID_PRESTADOR INTEGER NOT NULL, NR_DOCUMENTO TEXT NOT NULL, CD_TP_DOCUMENTO INTEGER, DS_TP_DOCUMENTO TEXT, PRIMARY KEY (ID_PRESTADOR, NR_DOCUMENTO), FOREIGN KEY (ID_PRESTADOR) REFERENCES Prestador(ID_PRESTADOR) );
+            CREATE TABLE IF NOT EXISTS Despesa ( ID_PRESTADOR INTEGER NOT NULL, ID_FORNECEDOR INTEGER NOT NULL, DT_PAGAMENTO DATE NOT NULL, NR_DOCUMENTO TEXT NOT NULL DEFAULT '', VR_PAGAMENTO REAL NOT NULL, PRIMARY KEY (ID_PRESTADOR, ID_FORNECEDOR, DT_PAGAMENTO, NR_DOCUMENTO), FOREIGN KEY (ID_PRESTADOR) REFERENCES Prestador(ID_PRESTADOR), FOREIGN KEY (ID_FORNECEDOR) REFERENCES Fornecedor(ID_FORNECEDOR) );
+            CREATE TABLE IF NOT EXISTS Quarentena ( MOTIVO TEXT NOT NULL, DETALHE TEXT, NR_CNPJ_PRESTADOR_CONTA TEXT, NR_CPF_CNPJ_FORNECEDOR TEXT, NM_FORNECEDOR TEXT, DS_TP_FORNECEDOR TEXT, NR_DOCUMENTO TEXT, CD_TP_DOCUMENTO INTEGER, DS_TP_DOCUMENTO TEXT, CD_MUNICIPIO INTEGER, NM_MUNICIPIO TEXT, SG_UF TEXT, SG_PARTIDO TEXT, NM_PARTIDO TEXT, DS_TP_ESFERA_PARTIDARIA TEXT, DT_PAGAMENTO DATE, VR_PAGAMENTO REAL );
+            CREATE TABLE IF NOT EXISTS Limite_Valor ( SG_PARTIDO TEXT NOT NULL, SG_UF TEXT NOT NULL, N_PAGAMENTOS INTEGER, VR_MINIMO REAL, VR_MAXIMO REAL, PRIMARY KEY (SG_PARTIDO, SG_UF) );
+            CREATE VIEW IF NOT EXISTS Despesa_Atipica AS
+                SELECT D.*, P.SG_PARTIDO, P.SG_UF_CONTA AS SG_UF, V.VR_MINIMO, V.VR_MAXIMO
+                FROM Despesa D
+                JOIN Prestador P ON P.ID_PRESTADOR = D.ID_PRESTADOR
+                JOIN Limite_Valor V ON V.SG_PARTIDO = P.SG_PARTIDO AND V.SG_UF = P.SG_UF_CONTA
+                WHERE D.VR_PAGAMENTO > 0 AND (D.VR_PAGAMENTO < V.VR_MINIMO OR D.VR_PAGAMENTO > V.VR_MAXIMO);
+        ''')
+
+def projetar_tabelas(df):
+    """Separa o DataFrame limpo nas projeções de cada tabela, já sem chaves nulas ou duplicadas.
+
+    As linhas de Despesa chegam conferidas por validar_bloco; o documento ausente vira texto vazio,
+    para que a chave primária não tenha nulos.
+    """
+    return {
+        'Local': df[TABELAS['Local'][0]].drop_duplicates('CD_MUNICIPIO').dropna(subset=['CD_MUNICIPIO']),
+        'Partido': df[TABELAS['Partido'][0]].drop_duplicates('SG_PARTIDO').dropna(subset=['SG_PARTIDO']),
+        'Fornecedor': df[TABELAS['Fornecedor'][0]].drop_duplicates('NR_CPF_CNPJ_FORNECEDOR').dropna(subset=['NR_CPF_CNPJ_FORNECEDOR']),
+        'Prestador': df[[*TABELAS['Prestador'][0][:-1], 'SG_UF']].rename(columns={'SG_UF': COLUNA_UF_CONTA})
+            .drop_duplicates('NR_CNPJ_PRESTADOR_CONTA').dropna(subset=['NR_CNPJ_PRESTADOR_CONTA']),
+        'Documento': df[TABELAS['Documento'][0]].dropna(subset=['NR_DOCUMENTO', 'ID_PRESTADOR']).drop_duplicates(['ID_PRESTADOR', 'NR_DOCUMENTO']),
+        'Despesa': df[TABELAS['Despesa'][0]].assign(NR_DOCUMENTO=df['NR_DOCUMENTO'].fillna('')),
+    }
+
+def registros(dados):
+    """Converte um DataFrame em tuplas de tipos nativos do Python, com None no lugar de valores ausentes.
+
+    Datas viram texto no formato AAAA-MM-DD, o mesmo usado nas comparações das consultas.
+    """
+    datas = {}
+    for coluna in dados.select_dtypes('datetime').columns:
+        dias = dados[coluna].to_numpy().astype('datetime64[D]')
+        datas[coluna] = np.where(np.isnat(dias), None, np.datetime_as_string(dias))
+    if datas:
+        dados = dados.assign(**datas)
+    return dados.astype(object).where(dados.notna(), None).itertuples(index=False, name=None)
+
+def _verificadores_validos(digitos, pesos1, pesos2):
+    """Confere os dois dígitos verificadores (módulo 11) de cada linha de uma matriz de dígitos.
+
+    Sequências de um só dígito repetido, que passam na conta, são consideradas inválidas.
+    """
+    base = digitos[:, :-2]
+    resto = base @ pesos1 % 11
+    dv1 = np.where(resto < 2, 0, 11 - resto)
+    resto = (base @ pesos2[:-1] + dv1 * pesos2[-1]) % 11
+    dv2 = np.where(resto < 2, 0, 11 - resto)
+    repetidos = (digitos == digitos[:, :1]).all(axis=1)
+    return (digitos[:, -2] == dv1) & (digitos[:, -1] == dv2) & ~repetidos
+
+def documentos_validos(documentos):
+    """Máscara dos CPFs/CNPJs com dígitos verificadores válidos, conferidos todos de uma vez com NumPy.
+
+    A pontuação é ignorada e os zeros à esquerda, perdidos quando o número é exportado como valor
+    numérico, são restaurados: até 11 dígitos vale como CPF ou CNPJ; de 12 a 14, só como CNPJ.
+    """
+    numeros = pd.Series(documentos, dtype=str).str.replace(r'[^0-9]', '', regex=True)
+    tamanhos = numeros.str.len().to_numpy()
+    candidatos = (tamanhos > 0) & (tamanhos <= 14)
+    texto = ''.join(numeros.where(candidatos, '0').str.zfill(14))
+    digitos = (np.frombuffer(texto.encode('ascii'), dtype=np.uint8).reshape(-1, 14) - ord('0')).astype(np.int64)
+    cnpj = _verificadores_validos(digitos, *PESOS_CNPJ)
+    cpf = _verificadores_validos(digitos[:, 3:], *PESOS_CPF) & (tamanhos <= 11)
+    return candidatos & (cnpj | cpf)
+
+def _documentos_validos_coluna(coluna):
+    """Aplica documentos_validos às categorias da coluna, e não a cada linha; nulos são inválidos."""
+    coluna = coluna.astype('category')
+    validos = np.append(documentos_validos(coluna.cat.categories), False)
+    return validos[coluna.cat.codes.to_numpy()]
+
+def validar_bloco(bloco):
+    """Separa as linhas válidas do bloco das rejeitadas, numa única passada vetorizada.
+
+    Retorna as linhas válidas, inclusive as com alerta de MOTIVOS_ALERTA; as linhas para a tabela
+    Quarentena, com MOTIVO e DETALHE (as rejeitadas, as malformadas descartadas na leitura e uma
+    cópia das com alerta); e, por partido e UF, a contagem, a soma e a soma dos quadrados do log10
+    dos valores positivos, acumuladas para os limites de valor atípico.
+    """
+    malformadas = bloco.attrs.pop('linhas_malformadas', [])
+    linhas_curtas = bloco.attrs.pop('linhas_curtas', {})
+    datas_invalidas = bloco.attrs.pop('datas_invalidas', {})
+    data_invalida = bloco.index.isin(list(datas_invalidas))
+    # A linha curta vem antes das demais condições: seus campos ausentes não são nulos de verdade
+    condicoes = {
+        'linha_malformada': bloco.index.isin(list(linhas_curtas)),
+        'prestador_ausente': bloco['NR_CNPJ_PRESTADOR_CONTA'].isna().to_numpy(),
+        'fornecedor_ausente': bloco['NR_CPF_CNPJ_FORNECEDOR'].isna().to_numpy(),
+        'data_ausente': bloco['DT_PAGAMENTO'].isna().to_numpy() & ~data_invalida,
+        'data_invalida': data_invalida,
+        'valor_ausente': bloco['VR_PAGAMENTO'].isna().to_numpy(),
+    }
+    rejeitada = np.logical_or.reduce(list(condicoes.values()))
+    # Entre as linhas restantes, prevalece a primeira ocorrência de cada pagamento
+    condicoes['duplicada'] = np.zeros(len(bloco), dtype=bool)
+    condicoes['duplicada'][~rejeitada] = bloco.loc[~rejeitada, CHAVE_PAGAMENTO].duplicated().to_numpy()
+    rejeitada |= condicoes['duplicada']
+    condicoes['prestador_invalido'] = ~rejeitada & ~_documentos_validos_coluna(bloco['NR_CNPJ_PRESTADOR_CONTA'])
+    condicoes['fornecedor_invalido'] = ~rejeitada & ~_documentos_validos_coluna(bloco['NR_CPF_CNPJ_FORNECEDOR'])
+    quarentena = rejeitada | condicoes['prestador_invalido'] | condicoes['fornecedor_invalido']
+    motivos = np.select(list(condicoes.values()), list(condicoes), default='')[quarentena]
+
+    rejeitadas = bloco.loc[quarentena, COLUNAS_QUARENTENA[2:]].assign(
+        MOTIVO=motivos,
+        DETALHE=np.select(
+            [motivos == 'data_invalida', motivos == 'linha_malformada'],
+            [bloco.index[quarentena].map(datas_invalidas), bloco.index[quarentena].map(linhas_curtas)],
+            default=None,
+        ),
+    )
+    if malformadas:
+        rejeitadas = pd.concat([pd.DataFrame({'MOTIVO': 'linha_malformada', 'DETALHE': malformadas}), rejeitadas])
+
+    validas = bloco[~rejeitada].copy()
+    # Agrupadas pela UF da prestação de contas, que existe também para quem não tem município
+    positivas = validas[(validas['VR_PAGAMENTO'] > 0).to_numpy()]
+    log_valor = np.log10(positivas['VR_PAGAMENTO'].to_numpy())
+    estatisticas = pd.DataFrame({
+        'SG_PARTIDO': positivas['SG_PARTIDO'].astype(object).to_numpy(),
+        'SG_UF': positivas['SG_UF'].astype(object).to_numpy(),
+        'N': 1,
+        'SOMA': log_valor,
+        'SOMA_QUADRADOS': log_valor ** 2,
+    }).groupby(['SG_PARTIDO', 'SG_UF']).sum()
+    return validas, rejeitadas, estatisticas
+
+def inserir_quarentena(conn, rejeitadas):
+    """Grava na tabela Quarentena as linhas rejeitadas e as com alerta de um bloco."""
+    conn.executemany(
+        f"INSERT INTO Quarentena ({', '.join(COLUNAS_QUARENTENA)}) VALUES ({', '.join('?' for _ in COLUNAS_QUARENTENA)})",
+        registros(rejeitadas.reindex(columns=COLUNAS_QUARENTENA))
+    )
+
+def gravar_limites_valor(conn, estatisticas):
+    """Grava em Limite_Valor a faixa de valores típicos dos grupos de partido e UF com pagamentos suficientes.
+
+    A faixa é a média ± LIMIAR_ATIPICO desvios-padrão do log10 do valor, convertida de volta para reais.
+    """
+    conn.execute("DELETE FROM Limite_Valor")
+    if estatisticas is None:
+        return 0
+    grupos = estatisticas[estatisticas['N'] >= MINIMO_GRUPO_ATIPICO]
+    media = grupos['SOMA'] / grupos['N']
+    desvio = np.sqrt(np.maximum(grupos['SOMA_QUADRADOS'] / grupos['N'] - media ** 2, 0))
+    limites = pd.DataFrame({
+        'N_PAGAMENTOS': grupos['N'].astype('int64'),
+        'VR_MINIMO': 10 ** (media - LIMIAR_ATIPICO * desvio),
+        'VR_MAXIMO': 10 ** (media + LIMIAR_ATIPICO * desvio),
+    }).reset_index()
+    conn.executemany(
+        "INSERT INTO Limite_Valor (SG_PARTIDO, SG_UF, N_PAGAMENTOS, VR_MINIMO, VR_MAXIMO) VALUES (?, ?, ?, ?, ?)",
+        registros(limites)
+    )
+    return len(limites)
+
+def resumir_validacao(conn):
+    """Linhas em quarentena por motivo, total de linhas deixadas fora das tabelas e número de pagamentos atípicos."""
+    quarentena = dict(conn.execute("SELECT MOTIVO, COUNT(*) FROM Quarentena GROUP BY MOTIVO"))
+    return {
+        'quarentena': {motivo: quarentena[motivo] for motivo in {**MOTIVOS_REJEICAO, **MOTIVOS_ALERTA} if motivo in quarentena},
+        'excluidas': sum(n for motivo, n in quarentena.items() if motivo in MOTIVOS_REJEICAO),
+        'atipicas': conn.execute("SELECT COUNT(*) FROM Despesa_Atipica").fetchone()[0],
+    }
+
+def carregar_chaves_substitutas(conn):
+    """Lê do banco o id já atribuído a cada CPF/CNPJ, para que os ids se mantenham entre cargas."""
+    return {
+        tabela: dict(conn.execute(f"SELECT {coluna_chave}, {coluna_id} FROM {tabela}"))
+        for tabela, (coluna_id, coluna_chave) in CHAVES_SUBSTITUTAS.items()
+    }
+
+def atribuir_chaves_substitutas(bloco, ids):
+    """Acrescenta ao bloco as colunas de id inteiro, criando ids novos para CPF/CNPJ ainda não vistos."""
+    for tabela, (coluna_id, coluna_chave) in CHAVES_SUBSTITUTAS.items():
+        mapa = ids[tabela]
+        proximo = max(mapa.values(), default=0) + 1
+        novas = [chave for chave in bloco[coluna_chave].dropna().unique() if chave not in mapa]
+        mapa.update(zip(novas, range(proximo, proximo + len(novas))))
+        bloco[coluna_id] = bloco[coluna_chave].map(mapa).astype('Int64')
+    return bloco
+
+def aplicar_pragmas(conn, pragmas):
+    """Aplica um conjunto de PRAGMAs do SQLite; precisa ser chamada fora de transação."""
+    for nome, valor in pragmas.items():
+        conn.execute(f"PRAGMA {nome} = {valor}")
+
+def conectar_leitura(caminho):
+    """Abre uma conexão somente leitura com o banco, que pode ser usada por qualquer thread."""
+    conn = sqlite3.connect(f"{pathlib.Path(caminho).absolute().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+    aplicar_pragmas(conn, PRAGMAS_LEITURA)
+    return conn
+
+def arquivos_banco(conn):
+    """Arquivos dos bancos abertos na conexão, o principal primeiro e depois os anexados."""
+    return tuple(os.path.realpath(arquivo) for _, _, arquivo in conn.execute("PRAGMA database_list") if arquivo)
+
+@contextmanager
+def anexar_bancos(conn, caminhos):
+    """Anexa à conexão, somente leitura e durante o bloco, os bancos de caminhos (ano -> arquivo).
+
+    Devolve o esquema em que cada ano pode ser lido; o banco principal da conexão continua como
+    'main', sem ser anexado de novo. Ao final do bloco, os bancos anexados são desanexados.
+    """
+    principal = arquivos_banco(conn)[0]
+    esquemas, anexados = {}, []
+    try:
+        for ano, caminho in caminhos.items():
+            if os.path.realpath(caminho) == principal:
+                esquemas[ano] = 'main'
+                continue
+            esquema = f"ano_{int(ano)}"
+            conn.execute(f"ATTACH DATABASE ? AS {esquema}", (f"{pathlib.Path(caminho).absolute().as_uri()}?mode=ro",))
+            anexados.append(esquema)
+            esquemas[ano] = esquema
+        yield esquemas
+    finally:
+        for esquema in anexados:
+            conn.execute(f"DETACH DATABASE {esquema}")
+
+def caminho_manifesto(db_file):
+    """Retorna o caminho do manifesto de carga gravado ao lado do banco pelo painel."""
+    return f"{os.path.splitext(db_file)[0]}.manifest.json"
+
+def ler_manifesto(db_file):
+    """Lê o manifesto de carga do banco, ou None se não existir ou estiver corrompido."""
+    try:
+        with open(caminho_manifesto(db_file), encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+def gravar_manifesto(db_file, manifesto):
+    """Grava o manifesto de forma atômica para nunca deixar um arquivo pela metade."""
+    destino = caminho_manifesto(db_file)
+    with open(destino + '.tmp', 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=2, ensure_ascii=False)
+    os.replace(destino + '.tmp', destino)
+
+def caminho_banco(db_file, manifesto=None):
+    """Arquivo com a versão atual do banco, indicada pelo manifesto, ou None se não houver."""
+    manifesto = ler_manifesto(db_file) if manifesto is None else manifesto
+    if manifesto is None or 'arquivo' not in manifesto:
+        return None
+    return os.path.join(os.path.dirname(db_file), manifesto['arquivo'])
+
+def criar_indices(conn):
+    """Cria os índices secundários e atualiza as estatísticas usadas pelo planejador de consultas."""
+    for nome, definicao in INDICES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {nome} ON {definicao}")
+    conn.execute("ANALYZE")
+
+def chaves_ordenacao(conn, tabela):
+    """Chave de paginação de cada coluna pela qual o explorador pode ordenar a tabela: coluna -> colunas.
+
+    A chave são as colunas do menor índice que começa pela coluna, seguidas do rowid, que é a ordem
+    em que o índice guarda as linhas: cada página é lida na ordem do índice, sem ordenação à parte.
+    Só valem índices cujas demais colunas são NOT NULL, porque a comparação de row values não ordena
+    NULL; a primeira coluna pode ter nulos (ver app.consultas_pagina). Uma INTEGER PRIMARY KEY é o
+    próprio rowid e dispensa índice.
+    """
+    info = {coluna: (tipo, notnull, pk) for _, coluna, tipo, notnull, _, pk in conn.execute(f"PRAGMA table_info({tabela})")}
+    chaves = {}
+    primaria = [coluna for coluna, (_, _, pk) in info.items() if pk]
+    if len(primaria) == 1 and info[primaria[0]][0].upper() == 'INTEGER':
+        chaves[primaria[0]] = [primaria[0]]
+    for _, indice, _, _, parcial in conn.execute(f"PRAGMA index_list({tabela})").fetchall():
+        colunas = [coluna for _, _, coluna in conn.execute(f"PRAGMA index_info({indice})")]
+        if parcial or not all(info[coluna][1] for coluna in colunas[1:]):
+            continue
+        if colunas[0] not in chaves or len(colunas) + 1 < len(chaves[colunas[0]]):
+            chaves[colunas[0]] = colunas + ['rowid']
+    return {coluna: chaves[coluna] for coluna in TABELAS[tabela][0] if coluna in chaves}
+
+def criar_estagio(conn, tabela):
+    """Cria a tabela temporária que recebe a nova versão de uma tabela antes da sincronização."""
+    colunas, chave = TABELAS[tabela]
+    estagio = f"estagio_{tabela}"
+    conn.execute(f"DROP TABLE IF EXISTS temp.{estagio}")
+    conn.execute(f"CREATE TEMP TABLE {estagio} AS SELECT {', '.join(colunas)} FROM main.{tabela} WHERE 0")
+    conn.execute(f"CREATE UNIQUE INDEX temp.ix_{estagio} ON {estagio} ({', '.join(chave)})")
+
+def inserir_lote(conn, destino, tabela, dados):
+    """Insere um lote via executemany; chaves repetidas são ignoradas, prevalecendo a primeira ocorrência."""
+    colunas, _ = TABELAS[tabela]
+    conn.executemany(
+        f"INSERT OR IGNORE INTO {destino} ({', '.join(colunas)}) VALUES ({', '.join('?' for _ in colunas)})",
+        registros(dados)
+    )
+
+def inserir_despesas(conn, destino, dados):
+    """Insere um lote de Despesa e retorna a máscara das linhas ignoradas por repetirem um pagamento já gravado.
+
+    O lote não tem chaves repetidas (ver validar_bloco); só quando alguma linha é ignorada as chaves
+    gravadas pelo lote são relidas, pelo rowid, para identificar as que ficaram de fora.
+    """
+    _, chave = TABELAS['Despesa']
+    ultimo = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {destino}").fetchone()[0]
+    antes = conn.total_changes
+    inserir_lote(conn, destino, 'Despesa', dados)
+    if conn.total_changes - antes == len(dados):
+        return np.zeros(len(dados), dtype=bool)
+    gravadas = set(conn.execute(f"SELECT {', '.join(chave)} FROM {destino} WHERE rowid > ?", (ultimo,)))
+    return np.array([linha not in gravadas for linha in registros(dados[chave])], dtype=bool)
+
+def aplicar_estagio(conn, tabela):
+    """Aplica na tabela definitiva apenas as linhas do estágio que são novas ou foram alteradas."""
+    colunas, chave = TABELAS[tabela]
+    lista_colunas = ', '.join(colunas)
+    atributos = [c for c in colunas if c not in chave]
+    antes = conn.total_changes
+    conn.execute(f"""
+        INSERT INTO main.{tabela} ({lista_colunas})
+        SELECT {lista_colunas} FROM estagio_{tabela} WHERE true
+        ON CONFLICT ({', '.join(chave)}) DO UPDATE SET
+            {', '.join(f'{c} = excluded.{c}' for c in atributos)}
+        WHERE {' OR '.join(f'{c} IS NOT excluded.{c}' for c in atributos)}
+    """)
+    return conn.total_changes - antes
+
+def remover_ausentes(conn, tabela):
+    """Remove da tabela definitiva as linhas que deixaram de existir no arquivo de origem."""
+    _, chave = TABELAS[tabela]
+    estagio = f"estagio_{tabela}"
+    condicao = ' AND '.join(f"e.{c} = main.{tabela}.{c}" for c in chave)
+    cursor = conn.execute(f"DELETE FROM main.{tabela} WHERE NOT EXISTS (SELECT 1 FROM {estagio} e WHERE {condicao})")
+    conn.execute(f"DROP TABLE {estagio}")
+    return cursor.rowcount
+
+def sincronizar_estagios(conn):
+    """Aplica os estágios já carregados e remove as linhas ausentes, informando o total de cada tabela."""
+    alteradas = {tabela: aplicar_estagio(conn, tabela) for tabela in TABELAS}
+    # Remoções seguem a ordem inversa para respeitar as chaves estrangeiras
+    removidas = {tabela: remover_ausentes(conn, tabela) for tabela in reversed(TABELAS)}
+    log.info("Carga incremental: " + ", ".join(f"{t} +{alteradas[t]}/-{removidas[t]}" for t in TABELAS))
+
+def inserir_dados(conn, df):
+    """Insere os dados do DataFrame nas tabelas do banco de dados."""
+    return inserir_dados_em_blocos(conn, [df])
+
+def inserir_dados_em_blocos(conn, blocos, progresso=None):
+    """Carrega as tabelas a partir de uma sequência de blocos limpos, sem reunir o arquivo em memória.
+
+    Com o banco vazio, os lotes vão direto para as tabelas de criar_tabelas sob os PRAGMAs de carga,
+    com as chaves estrangeiras conferidas e os índices secundários criados só ao final. Com o banco
+    já populado, os lotes passam pelos estágios e apenas as diferenças são aplicadas.
+
+    Cada bloco passa antes por validar_bloco: as linhas rejeitadas vão para a tabela Quarentena com o
+    motivo, e as somas dos valores por partido e UF, acumuladas bloco a bloco, definem ao final os
+    limites de Limite_Valor usados pela visão Despesa_Atipica.
+
+    As tabelas de dimensão (Local, Partido, Fornecedor, Prestador) guardam o conjunto de chaves já
+    vistas e só enviam ao banco as chaves novas de cada bloco; Documento e Despesa são deduplicadas
+    pela chave primária da tabela de destino, que fica no SQLite e não na memória, e os pagamentos
+    repetidos de um bloco para outro também vão para a quarentena. Prestadores e fornecedores
+    recebem ids inteiros estáveis, usados no lugar do CPF/CNPJ em Documento e Despesa.
+
+    Se informado, progresso é chamado após cada bloco com o total de linhas lidas e o de linhas
+    enviadas a cada tabela até ali.
+    """
+    carga_inicial = not any(contar_registros(conn).values())
+    vistas = {tabela: set() for tabela in DIMENSOES}
+    ids = carregar_chaves_substitutas(conn)
+    linhas = 0
+    linhas_tabela = {tabela: 0 for tabela in TABELAS}
+    tempo_tabela = {tabela: 0.0 for tabela in TABELAS}
+    quarentena = {}
+    valores = None
+    inicio = time.perf_counter()
+    try:
+        if carga_inicial:
+            aplicar_pragmas(conn, PRAGMAS_CARGA)
+            conn.execute("PRAGMA foreign_keys = OFF")
+        with conn:
+            conn.execute("DELETE FROM Quarentena")
+            if not carga_inicial:
+                for tabela in TABELAS:
+                    criar_estagio(conn, tabela)
+            for bloco in blocos:
+                linhas += len(bloco)
+                bloco, rejeitadas, estatisticas = validar_bloco(bloco)
+                valores = estatisticas if valores is None else valores.add(estatisticas, fill_value=0)
+                bloco = atribuir_chaves_substitutas(bloco, ids)
+                for tabela, dados in projetar_tabelas(bloco).items():
+                    if tabela in vistas:
+                        chave = dados[TABELAS[tabela][1][0]]
+                        dados = dados[~chave.isin(vistas[tabela])]
+                        vistas[tabela].update(dados[TABELAS[tabela][1][0]])
+                    destino = tabela if carga_inicial else f"estagio_{tabela}"
+                    inicio_lote = time.perf_counter()
+                    if tabela == 'Despesa':
+                        repetidas = dados.index[inserir_despesas(conn, destino, dados)]
+                        rejeitadas = pd.concat([rejeitadas, bloco.loc[repetidas, COLUNAS_QUARENTENA[2:]].assign(MOTIVO='duplicada')])
+                    else:
+                        inserir_lote(conn, destino, tabela, dados)
+                    tempo_tabela[tabela] += time.perf_counter() - inicio_lote
+                    linhas_tabela[tabela] += len(dados)
+                inserir_quarentena(conn, rejeitadas)
+                for motivo, n in rejeitadas['MOTIVO'].value_counts().items():
+                    quarentena[motivo] = quarentena.get(motivo, 0) + n
+                if progresso is not None:
+                    progresso(linhas, linhas_tabela)
+            grupos = gravar_limites_valor(conn, valores)
+            if carga_inicial:
+                violacoes = conn.execute("PRAGMA foreign_key_check").fetchmany(5)
+                if violacoes:
+                    raise sqlite3.IntegrityError(f"Chaves estrangeiras inválidas após a carga: {violacoes}")
+                inicio_indices = time.perf_counter()
+                criar_indices(conn)
+                log.info(f"Índices secundários criados em {time.perf_counter() - inicio_indices:.1f} s")
+            else:
+                sincronizar_estagios(conn)
+        duracao = time.perf_counter() - inicio
+        pico = pico_memoria_mb()
+        log.info(
+            f"Ingestão em blocos: {linhas:,} linhas em {duracao:.1f} s ({linhas / max(duracao, 1e-9):,.0f} linhas/s)"
+            + (f", pico de memória {pico:,.0f} MB" if pico is not None else "")
+        )
+        log.info("Inserção por tabela: " + ", ".join(
+            f"{t} {linhas_tabela[t]:,} linhas ({linhas_tabela[t] / max(tempo_tabela[t], 1e-9):,.0f} linhas/s)" for t in TABELAS
+        ))
+        log.info(
+            f"Validação: {sum(quarentena.values()):,} linhas em quarentena"
+            + "".join(f", {motivo} {quarentena[motivo]:,}" for motivo in {**MOTIVOS_REJEICAO, **MOTIVOS_ALERTA} if motivo in quarentena)
+            + f"; limites de valor atípico para {grupos:,} grupos de partido e UF"
+        )
+        return contar_registros(conn)
+    except Exception as e:
+        log.error(f"Erro ao inserir dados no banco de dados: {e}")
+        return None
+    finally:
+        if carga_inicial:
+            aplicar_pragmas(conn, PRAGMAS_PADRAO)
+            conn.execute("PRAGMA foreign_keys = ON")
+
+def atualizar_resumos(conn):
+    """Recria as tabelas de resumo a partir das tabelas já carregadas, numa única transação."""
+    inicio = time.perf_counter()
+    with conn:
+        for nome, (select, colunas) in RESUMOS.items():
+            conn.execute(f"DROP TABLE IF EXISTS {nome}")
+            conn.execute(f"CREATE TABLE {nome} AS {select}")
+            conn.execute(f"CREATE INDEX ix_{nome.lower()} ON {nome} ({colunas})")
+        conn.execute("ANALYZE")
+    log.info(f"Tabelas de resumo atualizadas em {time.perf_counter() - inicio:.1f} s")
+
+def atualizar_busca(conn):
+    """Recria o índice de busca textual; retorna False se o SQLite não tiver o módulo FTS5."""
+    inicio = time.perf_counter()
+    try:
+        with conn:
+            conn.execute("DROP TABLE IF EXISTS Busca")
+            conn.execute(SQL_INDICE_BUSCA)
+            for select in FONTES_BUSCA.values():
+                conn.execute(f"INSERT INTO Busca (TIPO, ID, SG_UF, NOME, DOCUMENTO) {select}")
+            conn.execute("INSERT INTO Busca (Busca) VALUES ('optimize')")
+    except sqlite3.OperationalError as e:
+        log.warning(f"Índice de busca não criado; a busca ficará indisponível: {e}")
+        return False
+    log.info(f"Índice de busca atualizado em {time.perf_counter() - inicio:.1f} s")
+    return True
+
+def termos_busca(texto):
+    """Converte o texto digitado numa expressão FTS5 em que cada palavra é um prefixo obrigatório.
+
+    Um CPF/CNPJ digitado com pontuação vira um único termo com os dígitos. Retorna None se não
+    houver o que buscar.
+    """
+    digitos = re.sub(r'[\s./-]', '', texto)
+    palavras = [digitos] if digitos.isdigit() else re.findall(r'\w+', texto)
+    return ' '.join(f'"{palavra}"*' for palavra in palavras) or None
+
+def montar_consulta(nome, n_ufs=0):
+    """Retorna o SQL de uma consulta com um placeholder para cada estado selecionado."""
+    return CONSULTAS[nome].format(ufs=', '.join('?' for _ in range(n_ufs)))
+
+def montar_comparacao(esquemas, coluna):
+    """Retorna o SQL da comparação entre eleições, com uma parte para o esquema de cada ano."""
+    return "\nUNION ALL\n".join(COMPARACAO_ANOS.format(esquema=esquema, coluna=coluna) for esquema in esquemas)
+
+def verificar_planos(conn):
+    """Executa EXPLAIN QUERY PLAN em cada consulta e retorna as que varrem a tabela Despesa inteira.
+
+    Em Despesa só são aceitas a busca por índice (SEARCH) e a varredura de um índice de cobertura.
+    Rejeitam-se a varredura da tabela ou de um índice que não cobre a consulta e a busca por salto
+    (ANY(...)), que percorre o índice quase inteiro; todas indicam um índice faltando em INDICES.
+    """
+    violacoes = {}
+    consultas = [
+        (nome, montar_consulta(nome, n_ufs=len(parametros) - CONSULTAS[nome].count('?')), parametros)
+        for nome, parametros in PARAMETROS_VERIFICACAO.items()
+    ] + [(f"Busca_{tipo}", sql, [1]) for tipo, sql in DETALHES_BUSCA.items()]
+    for nome, sql, parametros in consultas:
+        apelidos = {'Despesa'} | set(re.findall(r'Despesa\s+(\w+)', sql))
+        for _, _, _, detalhe in conn.execute("EXPLAIN QUERY PLAN " + sql, parametros):
+            partes = detalhe.split()
+            if len(partes) < 2 or partes[1] not in apelidos:
+                continue
+            if partes[0] == 'SCAN' and 'USING COVERING INDEX' not in detalhe or partes[0] == 'SEARCH' and '(ANY(' in detalhe:
+                violacoes[nome] = detalhe
+    return violacoes
+
+def top_fornecedores(df, n=10):
+    """Agregação da Consulta 1: os n fornecedores com maior soma de pagamentos na faixa de valor."""
+    return df.groupby("NM_FORNECEDOR")["VR_PAGAMENTO"].sum().nlargest(n).reset_index()
+
+def prestadores_por_partido(df):
+    """Agregação da Consulta 2: número de prestadores de cada partido, do maior para o menor."""
+    return df.groupby("NM_PARTIDO").size().reset_index(name='Numero_Prestadores').sort_values('Numero_Prestadores', ascending=False)
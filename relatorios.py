@@ -0,0 +1,306 @@
+"""Relatórios em lote das consultas do painel, sem o Streamlit.
+
+Avalia as consultas C1 a C10 sobre uma grade de parâmetros (por exemplo, cada UF em cada mês para
+C6 e C9) em vários processos, cada um com sua conexão somente leitura com o banco. Para cada
+combinação, grava a tabela do resultado (Parquet ou CSV) e o gráfico já montado (JSON do Plotly),
+e registra em indice.jsonl os parâmetros, os arquivos, as linhas e o tempo de cada uma. Os
+gráficos são os mesmos das abas do painel, que usa as funções figura_* deste módulo.
+
+    python relatorios.py --ano 2024
+    python relatorios.py --ano 2024 --consultas C6 C9 --processos 8 --formato csv
+"""
+import argparse
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import re
+import time
+
+import pandas as pd
+import plotly.express as px
+
+import colunar
+import dados
+
+# Diretório em que cada execução grava os relatórios de um ano (em <diretório>/<ano>)
+DIRETORIO_RELATORIOS = 'relatorios'
+# Processos que avaliam a grade de parâmetros, cada um com sua conexão somente leitura
+PROCESSOS_RELATORIO = os.cpu_count() or 1
+# Caracteres mantidos nos nomes dos arquivos gerados a partir dos parâmetros
+TAMANHO_NOME_ARQUIVO = 60
+
+log = logging.getLogger(__name__)
+
+def _data(texto):
+    """Data 'AAAA-MM-DD' no formato exibido nos títulos dos gráficos."""
+    return pd.Timestamp(texto).strftime('%d/%m/%Y')
+
+def figura_c1(df, minimo, maximo):
+    """Gráfico da Consulta 1, sobre o resultado de dados.top_fornecedores."""
+    fig = px.bar(
+        df,
+        y="NM_FORNECEDOR",
+        x="VR_PAGAMENTO",
+        orientation='h',
+        title=f"Top 10 Fornecedores com Pagamentos entre R${minimo:,.2f} e R${maximo:,.2f}",
+        labels={'VR_PAGAMENTO': 'Montante Total (R$)', 'NM_FORNECEDOR': 'Fornecedor'},
+        text_auto='.2s'
+    )
+    fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+    return fig
+
+def figura_c2(df, estado):
+    """Gráfico da Consulta 2, sobre o resultado de dados.prestadores_por_partido."""
+    return px.bar(df, x='NM_PARTIDO', y='Numero_Prestadores', title=f"Número de Prestadores por Partido em {estado}", labels={'NM_PARTIDO': 'Partido', 'Numero_Prestadores': 'Número de Prestadores'})
+
+def figura_c3_geral(df):
+    """Gráfico da visão geral da Consulta 3."""
+    return px.pie(df, names='DS_TP_FORNECEDOR', values='VR_TOTAL', title="Distribuição de Pagamentos por Tipo de Fornecedor", hole=.3)
+
+def figura_c3(df, tipo):
+    """Gráfico do detalhe da Consulta 3 para um tipo de fornecedor."""
+    fig = px.bar(
+        df,
+        x='Total_Recebido',
+        y='NM_FORNECEDOR',
+        orientation='h',
+        title=f"Top 10 Fornecedores ({tipo}) por Valor Recebido",
+        labels={'NM_FORNECEDOR': 'Fornecedor', 'Total_Recebido': 'Total Recebido (R$)'},
+        text_auto='.2s'
+    )
+    fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+    return fig
+
+def figura_c4(df, regiao):
+    """Gráfico da Consulta 4; regiao descreve os estados selecionados no título."""
+    return px.bar(
+        df,
+        x='SG_PARTIDO',
+        y='Numero_Prestadores',
+        title=f"Número de Prestadores por Partido ({regiao})",
+        labels={'SG_PARTIDO': 'Partido', 'Numero_Prestadores': 'Número de Prestadores'}
+    )
+
+def figura_c5(df, limite):
+    """Gráfico da Consulta 5."""
+    fig = px.bar(df, x='n', y='NM_MUNICIPIO', orientation='h', title=f'Top {limite} Municípios com Mais Prestadores', labels={'NM_MUNICIPIO': 'Município', 'n': 'Número de Prestadores'})
+    fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+    return fig
+
+def figura_c6(df, estados, inicio, fim):
+    """Gráfico da Consulta 6 para os estados e o período ('AAAA-MM-DD') escolhidos."""
+    regiao = estados[0] if len(estados) == 1 else f"{len(estados)} Estados"
+    return px.bar(
+        df,
+        x='SG_PARTIDO',
+        y='Media_Gastos',
+        title=f"Média de Gastos por Partido ({regiao}, {_data(inicio)} a {_data(fim)})",
+        labels={'SG_PARTIDO': 'Partido', 'Media_Gastos': 'Média de Gastos (R$)'},
+        text_auto='.2s'
+    )
+
+def figura_c7(df, limite):
+    """Gráfico da Consulta 7."""
+    fig = px.bar(df, x='n', y='SG_PARTIDO', orientation='h', title=f"Top {limite} Partidos com Mais Contratos", labels={'SG_PARTIDO': 'Partido', 'n': 'Quantidade de Contratos'})
+    fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+    return fig
+
+def figura_c8(df, ano, limite):
+    """Gráfico da Consulta 8."""
+    fig = px.bar(df, x='Total', y='NM_FORNECEDOR', orientation='h', title=f"Top {limite} Maiores Despesas por Fornecedor ({ano})", labels={'NM_FORNECEDOR': 'Fornecedor', 'Total': 'Despesa Total (R$)'}, text_auto='.2s')
+    fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+    return fig
+
+def figura_c9(df, estado, inicio, fim):
+    """Gráfico da Consulta 9 para o estado e o período ('AAAA-MM-DD') escolhidos."""
+    fig = px.bar(
+        df,
+        x='Total_Despesas',
+        y='NM_PARTIDO',
+        orientation='h',
+        title=f"Total de Despesas em {estado} ({_data(inicio)} a {_data(fim)})",
+        labels={'NM_PARTIDO': 'Partido', 'Total_Despesas': 'Total de Despesas (R$)'}
+    )
+    fig.update_layout(yaxis={'categoryorder': 'total ascending'})
+    return fig
+
+def figura_c10(df, ano, limite):
+    """Gráfico da Consulta 10."""
+    return px.pie(df, values='Total', names='NM_MUNICIPIO', title=f'Distribuição de Despesas entre os Top {limite} Municípios ({ano})')
+
+def relatorio_c1(consultar, minimo, maximo):
+    """Consulta 1: os 10 fornecedores de partidos nacionais que mais receberam na faixa de valor."""
+    df = consultar('C1', [minimo, maximo])
+    # Sem pagamentos na faixa, a coluna de valores vem sem tipo numérico e a agregação falharia, como no painel
+    tabela = dados.top_fornecedores(df) if not df.empty else pd.DataFrame({'NM_FORNECEDOR': [], 'VR_PAGAMENTO': []})
+    return tabela, figura_c1(tabela, minimo, maximo)
+
+def relatorio_c2(consultar, estado):
+    """Consulta 2: prestadores por partido no estado."""
+    df = consultar('C2', [])
+    tabela = dados.prestadores_por_partido(df[df['SG_UF'] == estado])
+    return tabela, figura_c2(tabela, estado)
+
+def relatorio_c4(consultar, *estados):
+    """Consulta 4: prestadores por partido nos estados."""
+    tabela = consultar('C4', list(estados))
+    return tabela, figura_c4(tabela, estados[0] if len(estados) == 1 else f"{len(estados)} estados")
+
+def relatorio_c6(consultar, *parametros):
+    """Consulta 6: valor médio de pagamento por partido nos estados e no período (os dois últimos parâmetros)."""
+    tabela = consultar('C6', list(parametros))
+    return tabela, figura_c6(tabela, parametros[:-2], *parametros[-2:])
+
+def relatorio_direto(nome, figura):
+    """Relatório de uma consulta cujo resultado vai direto para o gráfico, com os mesmos parâmetros."""
+    def relatorio(consultar, *parametros):
+        tabela = consultar(nome, list(parametros))
+        return tabela, figura(tabela, *parametros)
+    return relatorio
+
+# Relatório de cada consulta: (consultar, *parâmetros) -> (tabela, figura), em que
+# consultar(nome, parâmetros) executa uma consulta de dados.CONSULTAS
+RELATORIOS = {
+    'C1': relatorio_c1,
+    'C2': relatorio_c2,
+    'C3_geral': relatorio_direto('C3_geral', figura_c3_geral),
+    'C3': relatorio_direto('C3', figura_c3),
+    'C4': relatorio_c4,
+    'C5': relatorio_direto('C5', figura_c5),
+    'C6': relatorio_c6,
+    'C7': relatorio_direto('C7', figura_c7),
+    'C8': relatorio_direto('C8', figura_c8),
+    'C9': relatorio_direto('C9', figura_c9),
+    'C10': relatorio_direto('C10', figura_c10),
+}
+# Grade de parâmetros de cada consulta, a partir das UFs, dos meses ((início, fim) de cada mês com
+# pagamentos) e do ano do banco; as consultas sem filtro geográfico ou temporal usam os padrões do painel
+GRADES = {
+    'C1': lambda ufs, meses, ano: [[10000, 50000]],
+    'C2': lambda ufs, meses, ano: [[uf] for uf in ufs],
+    'C3_geral': lambda ufs, meses, ano: [[]],
+    'C3': lambda ufs, meses, ano: [['PESSOA JURÍDICA'], ['PESSOA FÍSICA']],
+    'C4': lambda ufs, meses, ano: [ufs] + [[uf] for uf in ufs],
+    'C5': lambda ufs, meses, ano: [[10]],
+    'C6': lambda ufs, meses, ano: [[uf, inicio, fim] for uf in ufs for inicio, fim in meses],
+    'C7': lambda ufs, meses, ano: [[10]],
+    'C8': lambda ufs, meses, ano: [[str(ano), 10]],
+    'C9': lambda ufs, meses, ano: [[uf, inicio, fim] for uf in ufs for inicio, fim in meses],
+    'C10': lambda ufs, meses, ano: [[str(ano), 5]],
+}
+
+# Conexão somente leitura de cada processo do relatório, aberta por iniciar_processo
+_conexao = None
+
+def montar_grade(conn, consultas, ano):
+    """Lista as tarefas do relatório, (consulta, parâmetros), com todas as combinações da grade de cada consulta."""
+    ufs = [uf for (uf,) in conn.execute("SELECT DISTINCT SG_UF FROM Local WHERE SG_UF IS NOT NULL ORDER BY SG_UF")]
+    meses = [
+        (periodo.start_time.strftime('%Y-%m-%d'), periodo.end_time.strftime('%Y-%m-%d'))
+        for periodo in pd.PeriodIndex(
+            [mes for (mes,) in conn.execute("SELECT DISTINCT substr(DT_PAGAMENTO, 1, 7) FROM Resumo_Diario WHERE DT_PAGAMENTO IS NOT NULL ORDER BY 1")],
+            freq='M',
+        )
+    ]
+    return [(nome, parametros) for nome in consultas for parametros in GRADES[nome](ufs, meses, ano)]
+
+def iniciar_processo(caminho):
+    """Abre a conexão somente leitura do processo com a versão do banco do relatório."""
+    global _conexao
+    _conexao = dados.conectar_leitura(caminho)
+
+def consultar(nome, parametros):
+    """Executa uma consulta de dados.CONSULTAS na conexão do processo."""
+    sql = dados.montar_consulta(nome, len(parametros) - dados.CONSULTAS[nome].count('?'))
+    return pd.read_sql_query(sql, _conexao, params=list(parametros))
+
+def nome_arquivo(indice, nome, parametros):
+    """Nome dos arquivos de uma tarefa: a ordem na grade seguida dos parâmetros, abreviados."""
+    descricao = re.sub(r'[^\w-]+', '_', '_'.join(str(p) for p in parametros))[:TAMANHO_NOME_ARQUIVO]
+    return f"{nome}_{indice:04d}_{descricao}".rstrip('_')
+
+def executar_tarefa(indice, nome, parametros, diretorio, formato):
+    """Gera o relatório de uma combinação da grade e grava a tabela e o gráfico; devolve o registro do índice."""
+    inicio = time.perf_counter()
+    registro = {'indice': indice, 'consulta': nome, 'parametros': parametros}
+    try:
+        tabela, figura = RELATORIOS[nome](consultar, *parametros)
+        base = os.path.join(diretorio, nome, nome_arquivo(indice, nome, parametros))
+        if formato == 'parquet':
+            tabela.to_parquet(base + '.parquet', index=False)
+        else:
+            tabela.to_csv(base + '.csv', index=False, encoding='utf-8')
+        with open(base + '.json', 'w', encoding='utf-8') as arquivo:
+            arquivo.write(figura.to_json())
+        registro.update(tabela=os.path.relpath(f"{base}.{formato}", diretorio), figura=os.path.relpath(base + '.json', diretorio), linhas=len(tabela))
+    except Exception as e:
+        registro['erro'] = f"{type(e).__name__}: {e}"
+    registro['segundos'] = time.perf_counter() - inicio
+    return registro
+
+def gerar_relatorio(caminho, ano, consultas, diretorio, formato, processos=PROCESSOS_RELATORIO):
+    """Avalia a grade de cada consulta em processos paralelos e grava os arquivos e o índice em diretorio.
+
+    Todos os processos leem a mesma versão do banco (caminho), mesmo que o painel publique outra
+    durante o relatório. Uma combinação que falha fica registrada no índice com o erro, sem
+    interromper as demais. Retorna os registros do índice, na ordem da grade.
+    """
+    conn = dados.conectar_leitura(caminho)
+    try:
+        tarefas = montar_grade(conn, consultas, ano)
+    finally:
+        conn.close()
+    for nome in consultas:
+        os.makedirs(os.path.join(diretorio, nome), exist_ok=True)
+    log.info(f"{len(tarefas)} combinações de parâmetros em {processos} processos")
+
+    registros = []
+    with concurrent.futures.ProcessPoolExecutor(
+        processos, mp_context=multiprocessing.get_context('spawn'), initializer=iniciar_processo, initargs=(caminho,)
+    ) as executor:
+        pendentes = [executor.submit(executar_tarefa, indice, nome, parametros, diretorio, formato) for indice, (nome, parametros) in enumerate(tarefas)]
+        for pendente in concurrent.futures.as_completed(pendentes):
+            registro = pendente.result()
+            registros.append(registro)
+            if 'erro' in registro:
+                log.warning(f"{registro['consulta']} {registro['parametros']}: {registro['erro']}")
+    registros.sort(key=lambda registro: registro['indice'])
+
+    execucao = {'execucao': time.strftime('%Y-%m-%dT%H:%M:%S'), 'ano': ano, 'banco': os.path.basename(caminho)}
+    with open(os.path.join(diretorio, 'indice.jsonl'), 'w', encoding='utf-8') as arquivo:
+        for registro in registros:
+            arquivo.write(json.dumps({**execucao, **registro}, ensure_ascii=False) + '\n')
+    return registros
+
+def resolver_banco(banco):
+    """Versão atual do banco do painel, indicada pelo manifesto, ou o próprio arquivo se não houver manifesto."""
+    return dados.caminho_banco(banco) or banco
+
+def main():
+    parser = argparse.ArgumentParser(description="Relatórios em lote das consultas do painel, com tabelas e gráficos.")
+    parser.add_argument('--ano', type=int, required=True, help="ano da eleição")
+    parser.add_argument('--banco', help="banco do painel ou arquivo SQLite (padrão: o banco do ano, como no painel)")
+    parser.add_argument('--consultas', nargs='+', choices=list(RELATORIOS), default=list(RELATORIOS))
+    parser.add_argument('--processos', type=int, default=PROCESSOS_RELATORIO)
+    parser.add_argument('--formato', choices=['parquet', 'csv'], default='parquet' if colunar.disponivel() else 'csv', help="formato das tabelas")
+    parser.add_argument('--saida', help=f"diretório dos arquivos (padrão: {DIRETORIO_RELATORIOS}/<ano>)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    if args.formato == 'parquet' and not colunar.disponivel():
+        parser.error("o formato parquet exige o pacote pyarrow")
+    caminho = resolver_banco(args.banco or dados.ARQUIVO_DB.format(ano=args.ano))
+    if not os.path.exists(caminho):
+        parser.error(f"banco não encontrado: {caminho}")
+    diretorio = args.saida or os.path.join(DIRETORIO_RELATORIOS, str(args.ano))
+
+    inicio = time.perf_counter()
+    registros = gerar_relatorio(caminho, args.ano, args.consultas, diretorio, args.formato, args.processos)
+    resumo = pd.DataFrame(registros).groupby('consulta', sort=False).agg(combinacoes=('indice', 'size'), linhas=('linhas', 'sum'), segundos=('segundos', 'sum'))
+    print(resumo.to_string())
+    falhas = sum('erro' in registro for registro in registros)
+    print(f"{len(registros)} combinações em {time.perf_counter() - inicio:.1f} s ({falhas} com erro); índice em {os.path.join(diretorio, 'indice.jsonl')}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Dados de teste: um CSV sintético no formato do TSE, gerado por benchmark.gerar_csv, e a carga dele no SQLite."""
+import sqlite3
+
+import pytest
+
+import benchmark
+import dados
+
+# Linhas do CSV sintético; com TAMANHO_BLOCO_TESTE, a leitura em partes gera vários blocos
+LINHAS_TESTE = 20_000
+TAMANHO_BLOCO_TESTE = 6_000
+
+def carregar(caminho_db, blocos):
+    """Cria o schema em caminho_db e carrega os blocos, como a carga do painel; retorna a conexão."""
+    conn = sqlite3.connect(caminho_db)
+    conn.execute("PRAGMA foreign_keys = ON")
+    dados.criar_tabelas(conn)
+    assert dados.inserir_dados_em_blocos(conn, blocos) is not None
+    return conn
+
+def conteudo(conn):
+    """Linhas de cada tabela, com os ids substitutos trocados pelo CPF/CNPJ que representam.
+
+    Bancos carregados de formas diferentes podem numerar prestadores e fornecedores em outra ordem;
+    assim eles são comparados pelo que guardam.
+    """
+    substitutos = {coluna: (tabela, natural) for tabela, (coluna, natural) in dados.CHAVES_SUBSTITUTAS.items()}
+    resultado = {}
+    for tabela, (colunas, _) in dados.TABELAS.items():
+        expressoes = [
+            f"(SELECT {substitutos[c][1]} FROM {substitutos[c][0]} S WHERE S.{c} = T.{c})" if c in substitutos else c
+            for c in colunas if substitutos.get(c, (None,))[0] != tabela
+        ]
+        ordem = ', '.join(str(i + 1) for i in range(len(expressoes)))
+        resultado[tabela] = conn.execute(f"SELECT {', '.join(expressoes)} FROM {tabela} T ORDER BY {ordem}").fetchall()
+    return resultado
+
+@pytest.fixture(scope='session')
+def csv_sintetico(tmp_path_factory):
+    """Caminho do CSV sintético, gerado uma vez por sessão de testes."""
+    caminho = tmp_path_factory.mktemp('csv') / 'despesa_anual_2024_BRASIL.csv'
+    benchmark.gerar_csv(str(caminho), LINHAS_TESTE, semente=1)
+    return str(caminho)
+
+@pytest.fixture(scope='session')
+def banco(csv_sintetico, tmp_path_factory):
+    """Banco carregado do CSV sintético em blocos, com as tabelas de resumo."""
+    conn = carregar(str(tmp_path_factory.mktemp('banco') / 'database_2024.db'),
+                    dados.processar_em_blocos(csv_sintetico, TAMANHO_BLOCO_TESTE))
+    dados.atualizar_resumos(conn)
+    yield conn
+    conn.close()
@@ -0,0 +1,121 @@
+"""Aquisição do arquivo de dados por HTTP: retomada com Range e If-Range, membro do .zip e conferência do SHA-256."""
+import hashlib
+import http.server
+import io
+import logging
+import os
+import threading
+import zipfile
+
+import pytest
+
+import aquisicao
+
+class Origem(http.server.BaseHTTPRequestHandler):
+    """Servidor de arquivos com ETag e Range, que pode cortar a conexão no meio das primeiras respostas.
+
+    Os arquivos, os cortes pendentes e os pedidos recebidos ficam em atributos do servidor.
+    """
+    def _etag(self, conteudo):
+        return f'"{hashlib.sha256(conteudo).hexdigest()[:16]}"'
+
+    def do_HEAD(self):
+        conteudo = self.server.arquivos[self.path]
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(conteudo)))
+        self.send_header('ETag', self._etag(conteudo))
+        self.end_headers()
+
+    def do_GET(self):
+        conteudo = self.server.arquivos[self.path]
+        etag, faixa = self._etag(conteudo), self.headers.get('Range')
+        inicio = 0
+        # Como um servidor HTTP, só atende ao Range se o If-Range ainda corresponder ao arquivo
+        if faixa and self.headers.get('If-Range', etag) == etag:
+            inicio = int(faixa.removeprefix('bytes=').split('-')[0])
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {inicio}-{len(conteudo) - 1}/{len(conteudo)}")
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(conteudo) - inicio))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.server.pedidos.append({'range': faixa, 'if_range': self.headers.get('If-Range'), 'inicio': inicio})
+        if self.server.cortes:
+            # Entrega só um terço do restante e encerra a conexão, como uma queda de rede
+            self.server.cortes -= 1
+            self.wfile.write(conteudo[inicio:inicio + (len(conteudo) - inicio) // 3])
+            return
+        self.wfile.write(conteudo[inicio:])
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def origem():
+    """Servidor HTTP local numa porta livre; os testes publicam os arquivos em origem.arquivos."""
+    servidor = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Origem)
+    servidor.arquivos, servidor.pedidos, servidor.cortes = {}, [], 0
+    servidor.url = f"http://127.0.0.1:{servidor.server_address[1]}"
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+def test_retoma_download_interrompido(origem, tmp_path, caplog):
+    conteudo = os.urandom(300_000)
+    origem.arquivos['/despesa.csv'] = conteudo
+    origem.cortes = 1
+    caplog.set_level(logging.INFO, logger=aquisicao.log.name)
+    caminho = aquisicao.obter(f"{origem.url}/despesa.csv", str(tmp_path / 'dados.csv'))
+
+    with open(caminho, 'rb') as arquivo:
+        assert arquivo.read() == conteudo
+    # A segunda tentativa pede só o que faltou, com a ETag da primeira no If-Range
+    primeiro, segundo = origem.pedidos
+    assert primeiro['range'] is None
+    assert segundo['range'] == f"bytes={len(conteudo) // 3}-" and segundo['inicio'] == len(conteudo) // 3
+    assert segundo['if_range'] == aquisicao.consultar(f"{origem.url}/despesa.csv")['etag']
+    assert any('Download retomado' in mensagem for mensagem in caplog.messages)
+    assert os.listdir(tmp_path) == ['dados.csv']
+
+def test_recomeca_quando_a_origem_muda(origem, tmp_path, caplog):
+    destino = str(tmp_path / 'dados.csv')
+    # Arquivo parcial de uma execução anterior, de uma versão que a origem não serve mais
+    with open(destino + '.part', 'wb') as arquivo:
+        arquivo.write(b'versao antiga' * 1000)
+    with open(destino + '.part.etag', 'w', encoding='utf-8') as arquivo:
+        arquivo.write('"versao-antiga"')
+    conteudo = os.urandom(100_000)
+    origem.arquivos['/despesa.csv'] = conteudo
+    caplog.set_level(logging.INFO, logger=aquisicao.log.name)
+    aquisicao.obter(f"{origem.url}/despesa.csv", destino)
+
+    with open(destino, 'rb') as arquivo:
+        assert arquivo.read() == conteudo
+    assert origem.pedidos == [{'range': 'bytes=13000-', 'if_range': '"versao-antiga"', 'inicio': 0}]
+    assert any('recomeçando do início' in mensagem for mensagem in caplog.messages)
+
+def test_le_o_csv_do_brasil_dentro_do_zip(origem, tmp_path):
+    compactado = io.BytesIO()
+    with zipfile.ZipFile(compactado, 'w', zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for uf in ['AC', 'BRASIL', 'SP']:
+            arquivo_zip.writestr(f"despesa_anual_2024_{uf}.csv", f'"SG_UF"\n"{uf}"\n'.encode('ISO-8859-1'))
+        arquivo_zip.writestr('leiame.pdf', b'%PDF')
+    origem.arquivos['/despesa_anual_2024.zip'] = compactado.getvalue()
+    caminho = aquisicao.obter(f"{origem.url}/despesa_anual_2024.zip", str(tmp_path / 'dados.csv'))
+
+    assert caminho == str(tmp_path / 'dados.zip') and aquisicao.compactado(caminho)
+    aquisicao.verificar(caminho)
+    with aquisicao.abrir_csv(caminho) as fluxo:
+        assert fluxo.read() == b'"SG_UF"\n"BRASIL"\n'
+
+def test_rejeita_sha256_divergente(origem, tmp_path):
+    conteudo = b'"SG_UF"\n"SP"\n'
+    origem.arquivos['/despesa.csv'] = conteudo
+    caminho = aquisicao.obter(f"{origem.url}/despesa.csv", str(tmp_path / 'dados.csv'))
+
+    esperado = hashlib.sha256(conteudo).hexdigest()
+    assert aquisicao.verificar(caminho, esperado.upper()) == esperado
+    with pytest.raises(aquisicao.ErroAquisicao, match='diferente do esperado'):
+        aquisicao.verificar(caminho, 'ab' * 32)
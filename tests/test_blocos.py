@@ -0,0 +1,45 @@
+"""Ingestão em blocos: tamanho dos blocos e memória limitada, independente do tamanho do arquivo."""
+import sqlite3
+import tracemalloc
+
+import dados
+from conftest import LINHAS_TESTE
+
+# Linhas por bloco nas medições de memória, bem menos que as do CSV sintético
+TAMANHO_BLOCO_MEMORIA = 1_000
+
+def pico_carga(caminho_csv, caminho_db, em_blocos):
+    """Pico de memória alocada pelo Python (tracemalloc), em bytes, para carregar o CSV num banco novo."""
+    conn = sqlite3.connect(caminho_db)
+    dados.criar_tabelas(conn)
+    tracemalloc.start()
+    try:
+        if em_blocos:
+            assert dados.inserir_dados_em_blocos(conn, dados.processar_em_blocos(caminho_csv, TAMANHO_BLOCO_MEMORIA)) is not None
+        else:
+            assert dados.inserir_dados(conn, dados.processar_dataframe(caminho_csv)) is not None
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        conn.close()
+
+def test_blocos_de_tamanho_fixo(csv_sintetico):
+    blocos = dados.processar_em_blocos(csv_sintetico, TAMANHO_BLOCO_MEMORIA)
+    # O gerador só lê o arquivo à medida que os blocos são pedidos
+    assert len(next(blocos)) == TAMANHO_BLOCO_MEMORIA
+    tamanhos = [len(bloco) for bloco in blocos]
+    assert max(tamanhos) <= TAMANHO_BLOCO_MEMORIA
+    assert sum(tamanhos) + TAMANHO_BLOCO_MEMORIA == LINHAS_TESTE
+
+def test_memoria_limitada(csv_sintetico, tmp_path):
+    metade = str(tmp_path / 'metade.csv')
+    with open(csv_sintetico, 'rb') as origem, open(metade, 'wb') as destino:
+        destino.writelines(linha for _, linha in zip(range(LINHAS_TESTE // 2 + 1), origem))
+
+    blocos_metade = pico_carga(metade, str(tmp_path / 'blocos_metade.db'), em_blocos=True)
+    blocos = pico_carga(csv_sintetico, str(tmp_path / 'blocos.db'), em_blocos=True)
+    inteiro = pico_carga(csv_sintetico, str(tmp_path / 'inteiro.db'), em_blocos=False)
+    # Em blocos, o pico quase não cresce com o arquivo (só os conjuntos de chaves das dimensões crescem);
+    # lendo o arquivo inteiro, ele é várias vezes maior (as margens deixam folga para variações do pandas)
+    assert blocos < 1.5 * blocos_metade
+    assert blocos < inteiro / 3
@@ -0,0 +1,43 @@
+"""Paginação por chave do explorador de tabelas: cada página é lida na ordem de um índice, sem ordenação à parte."""
+import pytest
+
+import app
+import dados
+
+def chaves(conn):
+    """(tabela, coluna, chave) de cada ordenação oferecida pelo explorador, inclusive a ordem de carga."""
+    return [
+        (tabela, coluna, chave)
+        for tabela in dados.TABELAS
+        for coluna, chave in {'rowid': ['rowid'], **dados.chaves_ordenacao(conn, tabela)}.items()
+    ]
+
+def percorrer(conn, tabela, chave, decrescente, tamanho):
+    """Lê a tabela inteira página a página, como o explorador; retorna os rowids e os planos das consultas."""
+    colunas = ['_rowid'] + dados.TABELAS[tabela][0]
+    cursor, rowids, planos = None, [], []
+    while True:
+        pagina = []
+        for sql, params in app.consultas_pagina(tabela, chave, decrescente, None, cursor, tamanho):
+            planos.append(' '.join(linha[3] for linha in conn.execute("EXPLAIN QUERY PLAN " + sql, params)))
+            pagina += conn.execute(sql, params).fetchall()
+            if len(pagina) > tamanho:
+                break
+        rowids += [linha[0] for linha in pagina[:tamanho]]
+        if len(pagina) <= tamanho:
+            return rowids, planos
+        cursor = tuple(pagina[tamanho - 1][colunas.index(c if c != 'rowid' else '_rowid')] for c in chave)
+
+def test_ordenacoes_de_despesa(banco):
+    assert set(dados.chaves_ordenacao(banco, 'Despesa')) == {'ID_PRESTADOR', 'ID_FORNECEDOR', 'DT_PAGAMENTO', 'VR_PAGAMENTO'}
+
+@pytest.mark.parametrize('decrescente', [False, True])
+def test_paginas_na_ordem_do_indice(banco, decrescente):
+    direcao = 'DESC' if decrescente else 'ASC'
+    for tabela, coluna, chave in chaves(banco):
+        rowids, planos = percorrer(banco, tabela, chave, decrescente, 997)
+        assert not [plano for plano in planos if 'TEMP B-TREE' in plano], (tabela, coluna)
+        valores = dict(banco.execute(f"SELECT rowid, {coluna} FROM {tabela}"))
+        esperado = [valor for _, valor in banco.execute(f"SELECT rowid, {coluna} FROM {tabela} ORDER BY {coluna} {direcao}")]
+        assert sorted(rowids) == sorted(valores), (tabela, coluna)
+        assert [valores[rowid] for rowid in rowids] == esperado, (tabela, coluna)
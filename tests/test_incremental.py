@@ -0,0 +1,37 @@
+"""Carga incremental: aplicar as diferenças de um novo arquivo deve dar o mesmo banco que reconstruí-lo."""
+import csv
+
+import numpy as np
+import pandas as pd
+
+import benchmark
+import dados
+from conftest import TAMANHO_BLOCO_TESTE, carregar, conteudo
+
+def modificar_csv(origem, destino):
+    """Grava uma nova versão do CSV com linhas removidas, valores e nomes alterados e pagamentos novos."""
+    df = pd.read_csv(origem, sep=';', encoding='ISO-8859-1', dtype=str, keep_default_na=False)
+    df = df.drop(index=df.index[::40])
+    df.loc[df.index[1::25], 'VR_PAGAMENTO'] = '1234,56'
+    maior = df['NR_CPF_CNPJ_FORNECEDOR'].value_counts().index[0]
+    df.loc[df['NR_CPF_CNPJ_FORNECEDOR'] == maior, 'NM_FORNECEDOR'] = 'FORNECEDOR RENOMEADO LTDA'
+    novas = df.iloc[5:105].copy()
+    novas['NR_DOCUMENTO'] = 'N' + novas['NR_DOCUMENTO']
+    novas['NR_CPF_CNPJ_FORNECEDOR'] = benchmark.gerar_cpfs(np.random.default_rng(99), 1)[0]
+    novas['NM_FORNECEDOR'] = 'FORNECEDOR NOVO'
+    pd.concat([df, novas]).to_csv(destino, sep=';', index=False, encoding='ISO-8859-1', quoting=csv.QUOTE_ALL)
+
+def test_incremental_igual_a_reconstrucao(csv_sintetico, tmp_path):
+    modificado = str(tmp_path / 'despesa_anual_2024_BRASIL.modificado.csv')
+    modificar_csv(csv_sintetico, modificado)
+
+    incremental = carregar(str(tmp_path / 'incremental.db'), dados.processar_em_blocos(csv_sintetico, TAMANHO_BLOCO_TESTE))
+    antes = conteudo(incremental)
+    assert dados.inserir_dados_em_blocos(incremental, dados.processar_em_blocos(modificado, TAMANHO_BLOCO_TESTE)) is not None
+    reconstruido = carregar(str(tmp_path / 'reconstruido.db'), dados.processar_em_blocos(modificado, TAMANHO_BLOCO_TESTE))
+
+    depois = conteudo(incremental)
+    assert depois != antes
+    assert depois == conteudo(reconstruido)
+    assert dados.resumir_validacao(incremental) == dados.resumir_validacao(reconstruido)
+    assert ('FORNECEDOR RENOMEADO LTDA',) in incremental.execute("SELECT NM_FORNECEDOR FROM Fornecedor").fetchall()
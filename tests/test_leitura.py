@@ -0,0 +1,14 @@
+"""Leitura do CSV: o arquivo inteiro, em blocos ou em faixas paralelas deve carregar as mesmas linhas."""
+import dados
+from conftest import carregar, conteudo
+
+def test_paralelo_igual_a_blocos(banco, csv_sintetico, tmp_path):
+    # Faixas de 1 MB: o CSV de teste (cerca de 4 MB) é dividido entre os processos em várias faixas
+    paralelo = carregar(str(tmp_path / 'paralelo.db'), dados.processar_em_paralelo(csv_sintetico, processos=2, tamanho_faixa_mb=1))
+    assert conteudo(paralelo) == conteudo(banco)
+    assert dados.resumir_validacao(paralelo) == dados.resumir_validacao(banco)
+
+def test_arquivo_inteiro_igual_a_blocos(banco, csv_sintetico, tmp_path):
+    inteiro = carregar(str(tmp_path / 'inteiro.db'), [dados.processar_dataframe(csv_sintetico)])
+    assert conteudo(inteiro) == conteudo(banco)
+    assert dados.resumir_validacao(inteiro) == dados.resumir_validacao(banco)
@@ -0,0 +1,16 @@
+"""Planos de execução das consultas do painel: nenhuma pode varrer a tabela Despesa."""
+import sqlite3
+
+import dados
+
+def test_consultas_usam_indices(banco):
+    assert dados.verificar_planos(banco) == {}
+
+def test_detecta_consulta_sem_indice(banco, tmp_path):
+    copia = sqlite3.connect(tmp_path / 'sem_indice.db')
+    banco.backup(copia)
+    copia.execute("DROP INDEX ix_despesa_fornecedor_data")
+    copia.execute("ANALYZE")
+    violacoes = dados.verificar_planos(copia)
+    copia.close()
+    assert 'Busca_fornecedor' in violacoes
@@ -0,0 +1,12 @@
+"""Relatórios em lote: uma combinação da grade sem resultado gera tabela e gráfico vazios, e não um erro."""
+import os
+
+import relatorios
+
+def test_c1_sem_pagamentos_na_faixa(banco, tmp_path, monkeypatch):
+    monkeypatch.setattr(relatorios, '_conexao', banco)
+    os.makedirs(tmp_path / 'C1')
+    registro = relatorios.executar_tarefa(0, 'C1', [10 ** 12, 10 ** 13], str(tmp_path), 'csv')
+    assert 'erro' not in registro
+    assert registro['linhas'] == 0
+    assert (tmp_path / registro['figura']).exists()
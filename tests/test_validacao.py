@@ -0,0 +1,76 @@
+"""Validação da carga: dígitos verificadores de CPF/CNPJ e motivos da quarentena em linhas com defeitos conhecidos."""
+import numpy as np
+import pytest
+
+import benchmark
+import dados
+from conftest import TAMANHO_BLOCO_TESTE, carregar
+
+def test_documentos_validos():
+    validos = ['00.000.000/0001-91', '191', '529.982.247-25', '33000167000101']
+    invalidos = ['11111111111', '00000000000', '', 'abc', '529.982.247-26', '123456789012345']
+    assert dados.documentos_validos(validos + invalidos).tolist() == [True] * len(validos) + [False] * len(invalidos)
+
+def test_documentos_gerados_validos():
+    rng = np.random.default_rng(0)
+    assert dados.documentos_validos(benchmark.gerar_cpfs(rng, 1000)).all()
+    assert dados.documentos_validos(benchmark.gerar_cnpjs(rng, 1000)).all()
+
+def inserir_defeitos(origem, destino):
+    """Grava uma cópia do CSV com uma linha de cada defeito; retorna o documento do pagamento atípico."""
+    with open(origem, encoding='ISO-8859-1') as arquivo:
+        cabecalho, *corpo = arquivo.read().splitlines()
+    colunas = [c.strip('"') for c in cabecalho.split(';')]
+    campos = [linha.split(';') for linha in corpo]
+
+    def copia(posicao, **valores):
+        linha = list(campos[posicao])
+        for coluna, valor in valores.items():
+            linha[colunas.index(coluna)] = valor
+        return ';'.join(linha)
+
+    # O pagamento atípico fica no maior grupo de partido e UF, que tem pagamentos para calcular a faixa
+    grupos = [(c[colunas.index('SG_PARTIDO')], c[colunas.index('SG_UF')]) for c in campos]
+    maior = max(set(grupos), key=grupos.count)
+    defeitos = [
+        corpo[10],                                                       # duplicada no bloco
+        corpo[40] + ';"extra"',                                          # linha_malformada (campo a mais)
+        ';'.join(campos[45][:-3]),                                       # linha_malformada (truncada)
+        copia(50, NR_CNPJ_PRESTADOR_CONTA='"#NULO#"'),                   # prestador_ausente
+        copia(60, DT_PAGAMENTO='"31/02/2024"'),                          # data_invalida
+        copia(70, DT_PAGAMENTO='#NULO#'),                                # data_ausente
+        copia(80, VR_PAGAMENTO='"#NULO#"', NR_DOCUMENTO='"N1"'),         # valor_ausente
+        copia(90, NR_CPF_CNPJ_FORNECEDOR='"52998224726"', NR_DOCUMENTO='"X1"'),  # fornecedor_invalido (carregada)
+        copia(grupos.index(maior), VR_PAGAMENTO='"99999999,99"', NR_DOCUMENTO='"ATIPICO"'),
+    ]
+    with open(destino, 'w', encoding='ISO-8859-1') as arquivo:
+        arquivo.write('\n'.join([cabecalho] + corpo[:100] + defeitos + corpo[100:] + [corpo[20]]) + '\n')  # duplicada entre blocos
+
+@pytest.mark.parametrize('leitura', ['blocos', 'paralelo', 'inteiro'])
+def test_motivos_quarentena(banco, csv_sintetico, tmp_path, leitura):
+    caminho = str(tmp_path / 'despesa_anual_2024_BRASIL.csv')
+    inserir_defeitos(csv_sintetico, caminho)
+    if leitura == 'blocos':
+        blocos = dados.processar_em_blocos(caminho, TAMANHO_BLOCO_TESTE)
+    elif leitura == 'paralelo':
+        blocos = dados.processar_em_paralelo(caminho, processos=2, tamanho_faixa_mb=1)
+    else:
+        blocos = [dados.processar_dataframe(caminho)]
+    conn = carregar(str(tmp_path / 'defeitos.db'), blocos)
+
+    validacao = dados.resumir_validacao(conn)
+    assert validacao['quarentena'] == {
+        'linha_malformada': 2, 'prestador_ausente': 1, 'data_ausente': 1, 'data_invalida': 1,
+        'valor_ausente': 1, 'duplicada': 2, 'fornecedor_invalido': 1,
+    }
+    assert validacao['excluidas'] == 8
+    # Só a linha com alerta e a do pagamento atípico entram em Despesa além das do CSV original
+    contar = "SELECT COUNT(*) FROM Despesa"
+    assert conn.execute(contar).fetchone()[0] == banco.execute(contar).fetchone()[0] + 2
+    assert conn.execute("SELECT DETALHE FROM Quarentena WHERE MOTIVO = 'data_invalida'").fetchone() == ('31/02/2024',)
+    # A linha truncada é a 104ª do arquivo; na leitura paralela, o número conta a partir do início da faixa
+    truncada = conn.execute("SELECT DETALHE FROM Quarentena WHERE DETALHE LIKE '%esperados%'").fetchall()
+    assert len(truncada) == 1 and truncada[0][0].endswith('esperados 18 campos, lidos 15')
+    if leitura != 'paralelo':
+        assert truncada == [('Linha 104: esperados 18 campos, lidos 15',)]
+    assert conn.execute("SELECT COUNT(*) FROM Despesa_Atipica WHERE NR_DOCUMENTO = 'ATIPICO'").fetchone() == (1,)